@@ -19,6 +19,17 @@ if "bpy" in locals():
     import imp
 
     imp.reload(compat)
+    # パッケージの再読み込みではサブモジュールが更新されないので、依存される順に読み込み直す
+    imp.reload(formats.errors)
+    imp.reload(formats.binary)
+    imp.reload(formats.mate)
+    imp.reload(formats.model)
+    imp.reload(formats.anm)
+    imp.reload(formats.tex)
+    imp.reload(formats.menu)
+    imp.reload(formats)
+    imp.reload(fileutil)
+    imp.reload(texcache)
     imp.reload(common)
     imp.reload(cm3d2_data)
 
@@ -65,6 +76,9 @@ if "bpy" in locals():
 
 else:
     from . import compat
+    from . import formats
+    from . import fileutil
+    from . import texcache
     from . import common
     from . import cm3d2_data
 
@@ -154,6 +168,8 @@ class AddonPreferences(bpy.types.AddonPreferences):
     default_tex_path1 = bpy.props.StringProperty(name="texファイル置き場", subtype='DIR_PATH', description="texファイルを探す時はここから探します")
     default_tex_path2 = bpy.props.StringProperty(name="texファイル置き場", subtype='DIR_PATH', description="texファイルを探す時はここから探します")
     default_tex_path3 = bpy.props.StringProperty(name="texファイル置き場", subtype='DIR_PATH', description="texファイルを探す時はここから探します")
+    tex_cache_size = bpy.props.IntProperty(name="tex Extract Cache Size (MB)", default=1024, min=64, soft_max=8192, description="PNGs taken out of .tex files are kept in the user config folder up to this size. The least recently used ones are removed first, except the ones loaded images still use")
+    is_pack_tex = bpy.props.BoolProperty(name="Pack tex Images", default=False, description="Load the image inside found .tex files straight into packed images instead of going through the extract cache")
 
     custom_normal_blend = bpy.props.FloatProperty(name="CM3D2用法線のブレンド率", default=0.5, min=0, max=1, soft_min=0, soft_max=1, step=3, precision=3)
     skip_shapekey = bpy.props.BoolProperty(name="無変更シェイプキーをスキップ", default=True, description="ベースと同じシェイプキーを出力しない")
@@ -277,6 +293,9 @@ class AddonPreferences(bpy.types.AddonPreferences):
         box.prop(self, 'default_tex_path1', icon='LAYER_ACTIVE', text="その2")
         box.prop(self, 'default_tex_path2', icon='LAYER_ACTIVE', text="その3")
         box.prop(self, 'default_tex_path3', icon='LAYER_ACTIVE', text="その4")
+        row = box.row()
+        row.prop(self, 'tex_cache_size', icon=compat.icon('FILE_FOLDER'))
+        row.prop(self, 'is_pack_tex', icon=compat.icon('PACKAGE'))
 
         box = self.layout.box()
         box.label(text="CM3D2用マテリアル新規作成時の初期値", icon='MATERIAL')
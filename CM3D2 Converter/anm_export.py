@@ -1,5 +1,4 @@
 import re
-import struct
 import math
 import unicodedata
 import time
@@ -8,6 +7,7 @@ import bmesh
 import mathutils
 from . import common
 from . import compat
+from .formats import anm
 from .translations.pgettext_functions import *
 from . import misc_DOPESHEET_MT_editor_menus
 
@@ -138,11 +138,11 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
             return {'CANCELLED'}
 
         try:
-            with file:
+            with file, common.CM3D2BinaryWriter(file) as writer:
                 if self.export_method == 'TEXT':
-                    self.write_animation_from_text(context, file)
+                    self.write_animation_from_text(context, writer)
                 else:
-                    self.write_animation(context, file)
+                    self.write_animation(context, writer)
         except common.CM3D2ExportException as e:
             self.report(type={'ERROR'}, message=str(e))
             return {'CANCELLED'}
@@ -414,7 +414,7 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
         
         return anm_data_raw
 
-    def write_animation(self, context, file):
+    def write_animation(self, context, writer):
         ob = context.active_object
         arm = ob.data
         pose = ob.pose
@@ -562,15 +562,11 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
 
         ''' Write data to the file '''
 
-        common.write_str(file, 'CM3D2_ANIM')
-        file.write(struct.pack('<i', self.version))
-
+        export_data = {}
         for bone in bones:
             if not anm_data.get(bone.name):
                 continue
 
-            file.write(struct.pack('<?', True))
-
             bone_names = [bone.name]
             current_bone = bone
             while bone_parents[current_bone.name]:
@@ -578,11 +574,11 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
                 current_bone = bone_parents[current_bone.name]
 
             bone_names.reverse()
-            common.write_str(file, "/".join(bone_names))
+            channels = {}
+            export_data[bone.name] = {'path': "/".join(bone_names), 'channels': channels}
             
             for channel_id, keyframes in sorted(anm_data[bone.name].items(), key=lambda x: x[0]):
-                file.write(struct.pack('<B', channel_id))
-                file.write(struct.pack('<i', len(keyframes)))
+                channel = channels[channel_id] = []
 
                 keyframes_list = sorted(keyframes.items(), key=lambda x: x[0])
                 for i in range(len(keyframes_list)):
@@ -590,14 +586,9 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
                     y, dydx_in, dydx_out = keyframes_list[i][1]
 
                     if len(keyframes_list) <= 1:
-                        file.write(struct.pack('<f', x))
-                        file.write(struct.pack('<f', y))
-                        file.write(struct.pack('<2f', 0.0, 0.0))
+                        channel.append({'frame': x, 'f0': y, 'f1': 0.0, 'f2': 0.0})
                         continue
 
-                    file.write(struct.pack('<f', x))
-                    file.write(struct.pack('<f', y))
-
                     if self.is_smooth_handle and self.export_method == 'ALL':
                         if i == 0:
                             prev_x = x - (keyframes_list[i + 1][0] - x)
@@ -622,15 +613,15 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
                         tan_in  = join_rad if x - prev_x <= time_step * 1.5 else prev_rad
                         tan_out = join_rad if next_x - x <= time_step * 1.5 else next_rad
                         
-                        file.write(struct.pack('<2f', tan_in, tan_out))
-                        #file.write(struct.pack('<2f', join_rad, join_rad))
-                        #file.write(struct.pack('<2f', prev_rad, next_rad))
+                        channel.append({'frame': x, 'f0': y, 'f1': tan_in, 'f2': tan_out})
+                        #channel.append({'frame': x, 'f0': y, 'f1': join_rad, 'f2': join_rad})
+                        #channel.append({'frame': x, 'f0': y, 'f1': prev_rad, 'f2': next_rad})
                     else:
-                        file.write(struct.pack('<2f', dydx_in, dydx_out))
+                        channel.append({'frame': x, 'f0': y, 'f1': dydx_in, 'f2': dydx_out})
 
-        file.write(struct.pack('<?', False))
+        anm.write_anm(writer, export_data, self.version)
 
-    def write_animation_from_text(self, context, file):
+    def write_animation_from_text(self, context, writer):
         txt = context.blend_data.texts.get("AnmData")
         if not txt:
             raise common.CM3D2ExportException("There is no 'AnmData' text file.")
@@ -638,25 +629,7 @@ class CNV_OT_export_cm3d2_anm(bpy.types.Operator):
         import json
         anm_data = json.loads(txt.as_string())
 
-        common.write_str(file, 'CM3D2_ANIM')
-        file.write(struct.pack('<i', self.version))
-
-        for base_bone_name, bone_data in anm_data.items():
-            path = bone_data['path']
-            file.write(struct.pack('<?', True))
-            common.write_str(file, path)
-
-            for channel_id, channel in bone_data['channels'].items():
-                file.write(struct.pack('<B', int(channel_id)))
-                channel_data_count = len(channel)
-                file.write(struct.pack('<i', channel_data_count))
-                for channel_data in channel:
-                    frame = channel_data['frame']
-                    data = ( channel_data['f0'], channel_data['f1'], channel_data['f2'] )
-                    file.write(struct.pack('<f' , frame))
-                    file.write(struct.pack('<3f', *data ))
-
-        file.write(struct.pack('<?', False))
+        anm.write_anm(writer, anm_data, self.version)
 
 
 
@@ -1,5 +1,4 @@
 import re
-import struct
 import math
 import unicodedata
 import time
@@ -9,6 +8,7 @@ import mathutils
 import os
 from . import common
 from . import compat
+from .formats import anm
 from .translations.pgettext_functions import *
 
 
@@ -83,47 +83,17 @@ class CNV_OT_import_cm3d2_anm(bpy.types.Operator):
         prefs.scale = self.scale
 
         try:
-            file = open(self.filepath, 'rb')
+            reader = common.CM3D2BinaryReader.open(self.filepath)
         except:
             self.report(type={'ERROR'}, message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", self.filepath))
             return {'CANCELLED'}
 
-        # ヘッダー
-        ext = common.read_str(file)
-        if ext != 'CM3D2_ANIM':
-            self.report(type={'ERROR'}, message="これはカスタムメイド3D2のモーションファイルではありません")
-            return {'CANCELLED'}
-        anm_version = struct.unpack('<i', file.read(4))[0]
-        first_channel_id = struct.unpack('<B', file.read(1))[0]
-        if first_channel_id != 1:
-            self.report(type={'ERROR'}, message=f_tip_("Unexpected first channel id = {id} (should be 1).", id=first_channel_id))
+        try:
+            with reader:
+                anm_data = anm.read_anm(reader)
+        except (common.CM3D2ImportException, common.CM3D2BinaryError, UnicodeDecodeError) as e:
+            self.report(type={'ERROR'}, message=str(e))
             return {'CANCELLED'}
-
-
-        anm_data = {}
-        for anim_data_index in range(9**9):
-            path = common.read_str(file)
-            
-            base_bone_name = path.split('/')[-1]
-            if base_bone_name not in anm_data:
-                anm_data[base_bone_name] = {'path': path}
-                anm_data[base_bone_name]['channels'] = {}
-
-            for channel_index in range(9**9):
-                channel_id = struct.unpack('<B', file.read(1))[0]
-                channel_id_str = channel_id
-                if channel_id <= 1:
-                    break
-                anm_data[base_bone_name]['channels'][channel_id_str] = []
-                channel_data_count = struct.unpack('<i', file.read(4))[0]
-                for channel_data_index in range(channel_data_count):
-                    frame = struct.unpack('<f', file.read(4))[0]
-                    data = struct.unpack('<3f', file.read(4 * 3))
-
-                    anm_data[base_bone_name]['channels'][channel_id_str].append({'frame': frame, 'f0': data[0], 'f1': data[1], 'f2': data[2]})
-
-            if channel_id == 0:
-                break
         
         if self.is_anm_data_text:
             if "AnmData" in context.blend_data.texts:
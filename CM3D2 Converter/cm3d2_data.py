@@ -1,11 +1,16 @@
 """CM3D2/COM3D2用のデータ構造を扱うデータクラス"""
 import bpy
 import copy
-import struct
+import mathutils
 from . import common
 from . import compat
+from .formats import model
+from .formats import set_translation_function
+from .formats.mate import Material, parse_text, parse_json
 from .translations.pgettext_functions import *
 
+set_translation_function(f_tip_)
+
 SHADER_NAMES_CM3D2 = [
     'CM3D2/Toony_Lighted',
     'CM3D2/Toony_Lighted_Hair',
@@ -451,185 +456,6 @@ class DataHandler:
 Handler = DataHandler.instance()
 
 
-class Material():
-    """マテリアルデータクラス"""
-    def __init__(self):
-        self.version = 1000
-        self.name1 = None
-        self.name2 = None
-        self.shader1 = None
-        self.shader2 = None
-
-        self.tex_list = []  # prop_name, (tex_name, tex_path, trans[2], scale[2])
-        self.col_list = []  # prop_name, col[4]
-        self.f_list = []  # prop_name, f
-        self.range_list = [] # prop_name, col[4]
-
-        self.custom_list = dict()
-
-    def sort(self):
-        self.tex_list = sorted(self.tex_list, key=lambda item: item[0])
-        self.col_list = sorted(self.col_list, key=lambda item: item[0])
-        self.f_list = sorted(self.f_list, key=lambda item: item[0])
-
-    @property
-    def name(self):
-        return self.name2 or self.name1
-
-    def read(self, reader, read_header=True):
-        if read_header:
-            header = common.read_str(reader)
-            if header != 'CM3D2_MATERIAL':
-                raise common.CM3D2ImportException(f_tip_("mateファイルではありません。ヘッダ:{}", header))
-            self.version = struct.unpack('<i', reader.read(4))[0]
-            self.name1 = common.read_str(reader)
-        self.name2 = common.read_str(reader)
-
-        self.shader1 = common.read_str(reader)
-        self.shader2 = common.read_str(reader)
-        
-        peeked = reader.peek()[0]
-        print(f"type({peeked}) = {type(peeked)}")
-        if self.version >= 2102 and (peeked in (0, 1)): # CR Edit Mode
-            cr_unknown_float_count = struct.unpack('<B', reader.read(1))[0]
-            for i in range(cr_unknown_float_count):
-                # CR TODO
-                self.custom_list[f'cr_unknown_float:{i:03d}'] = struct.unpack('<f', reader.read(4))
-
-        for i in range(99999):
-            prop_type = common.read_str(reader)
-            if prop_type == 'tex':
-                prop_name = common.read_str(reader)
-                sub_type = common.read_str(reader)
-                if sub_type == 'tex2d':
-                    tex_name = common.read_str(reader)
-                    tex_path = common.read_str(reader)
-                    offset = struct.unpack('<2f', reader.read(4 * 2))
-                    scale = struct.unpack('<2f', reader.read(4 * 2))
-                    tex_item = [prop_name, tex_name, tex_path, offset, scale]
-                else:
-                    tex_item = [prop_name]
-                self.tex_list.append(tex_item)
-
-            elif prop_type == 'col':
-                prop_name = common.read_str(reader)
-                col = struct.unpack('<4f', reader.read(4 * 4))
-                self.col_list.append([prop_name, col])
-
-            elif prop_type == 'f' or prop_type == 'range': # 'range' from CR Edit
-                prop_name = common.read_str(reader)
-                f = struct.unpack('<f', reader.read(4))[0]
-                self.f_list.append([prop_name, f])
-            
-            # CR TODO
-            elif prop_type == 'keyword':
-                prop_name = common.read_str(reader)
-                keyword_f = struct.unpack('<f', reader.read(4))[0]
-                print(keyword_f, type(keyword_f))
-                self.custom_list.setdefault('keyword', dict())[prop_name] = keyword_f #.append([prop_name, keyword_f])
-                
-            # CR TODO
-            elif prop_type == '_ALPHAPREMULTIPLY_ON':
-                alpha_bool = struct.unpack('<?', reader.read(1))[0]
-                self.custom_list['_ALPHAPREMULTIPLY_ON'] = alpha_bool
-
-            elif prop_type == 'end':
-                break
-            else:
-                raise common.CM3D2ImportException(f_tip_("Materialプロパティに未知の設定値タイプ({prop})が見つかりました。", prop=prop_type))
-
-    def write(self, writer, write_header=True):
-        if write_header:
-            common.write_str(writer, 'CM3D2_MATERIAL')
-            writer.write(struct.pack('<i', self.version))
-            common.write_str(writer, self.name1)
-
-        common.write_str(writer, self.name2)
-        common.write_str(writer, self.shader1)
-        common.write_str(writer, self.shader2)
-
-        for tex_item in self.tex_list:
-            common.write_str(writer, 'tex')
-            common.write_str(writer, tex_item[0])  # prop_name
-
-            if len(tex_item) < 2:
-                common.write_str(writer, 'null')
-            else:
-                common.write_str(writer, 'tex2d')
-                common.write_str(writer, tex_item[1])  # tex_name
-                common.write_str(writer, tex_item[2])  # tex_path
-                trans = tex_item[3]
-                writer.write(struct.pack('<2f', trans[0], trans[1]))
-                scale = tex_item[4]
-                writer.write(struct.pack('<2f', scale[0], scale[1]))
-
-        for col_item in self.col_list:
-            common.write_str(writer, 'col')
-            common.write_str(writer, col_item[0])  # prop_name
-
-            col = col_item[1]
-            writer.write(struct.pack('<4f', col[0], col[1], col[2], col[3]))
-
-        for f_item in self.f_list:
-            common.write_str(writer, 'f')
-            common.write_str(writer, f_item[0])  # prop_name
-
-            writer.write(struct.pack('<f', f_item[1]))
-
-        common.write_str(writer, 'end')
-
-    def to_text(self):
-        output_text = str(self.version) + "\n"
-        output_text += self.name1 + "\n"
-        output_text += self.name2 + "\n"
-        output_text += self.shader1 + "\n"
-        output_text += self.shader2 + "\n"
-        output_text += "\n"
-
-        for tex_item in self.tex_list:
-            output_text += 'tex\n'
-            output_text += "\t" + tex_item[0] + "\n"  # prop_name
-
-            if len(tex_item) < 2:
-                output_text += '\tnull\n'
-            else:
-                output_text += '\ttex2d\n'
-                output_text += "\t" + tex_item[1] + "\n"  # tex_name
-                output_text += "\t" + tex_item[2] + "\n"  # tex_path
-                trans = tex_item[3]
-                scale = tex_item[4]
-                output_text += "\t" + " ".join([str(trans[0]), str(trans[1]), str(scale[0]), str(scale[1])]) + "\n"
-
-        for col_item in self.col_list:
-            output_text += 'col\n'
-            output_text += "\t" + col_item[0] + "\n"  # prop_name
-            col = col_item[1]
-            output_text += "\t" + " ".join([str(col[0]), str(col[1]), str(col[2]), str(col[3])]) + "\n"  # prop_name
-
-        for f_item in self.f_list:
-            output_text += 'f\n'
-            output_text += "\t" + f_item[0] + "\n"  # prop_name
-            f = f_item[1]
-            output_text += "\t" + str(f) + "\n"
-
-        return output_text
-
-    def to_json(self):
-        import json
-        return json.dumps(self.__dict__, ensure_ascii=False, indent=2)
-
-    def from_dict(self, data):
-        self.name1 = data['name1']
-        self.name2 = data['name2']
-        self.version = data['version']
-        self.shader1 = data['shader1']
-        self.shader2 = data['shader2']
-
-        self.tex_list = data['tex_list']  # prop_name, (tex_name, tex_path, trans[2], scale[2])
-        self.col_list = data['col_list']  # prop_name, col[4]
-        self.f_list = data['f_list']  # prop_name, f
-
-
 class MaterialHandler:
 
     @classmethod
@@ -803,67 +629,17 @@ class MaterialHandler:
 
     @classmethod
     def parse_text(cls, text):
-        mat_data = Material()
-        lines = text.split('\n')
-
-        mat_data.version = int(lines[0])
-        mat_data.name1 = lines[1]
-        mat_data.name2 = lines[2]
-        mat_data.shader1 = lines[3]
-        mat_data.shader2 = lines[4]
-
-        line_seek = 5
-        while line_seek < len(lines):
-            node_type = common.line_trim(lines[line_seek])
-            if not node_type:
-                line_seek += 1
-                continue
-            if node_type == 'tex':
-                prop_name = common.line_trim(lines[line_seek + 1])
-                sub_type = common.line_trim(lines[line_seek + 2])
-                if sub_type == 'tex2d':
-                    line_seek += 3
-                    tex_name = common.line_trim(lines[line_seek])
-                    tex_path = common.line_trim(lines[line_seek + 1])
-                    tex_map = common.line_trim(lines[line_seek + 2]).split(' ')
-                    for map_datum in range(len(tex_map)):
-                        tex_map[map_datum] = float(tex_map[map_datum])
-                    mat_data.tex_list.append([prop_name, tex_name, tex_path, tex_map[:2], tex_map[2:]])
-                else:
-                    mat_data.tex_list.append([prop_name])
-
-                line_seek += 3
-
-            elif node_type == 'col':
-                prop_name = common.line_trim(lines[line_seek + 1])
-                tex_map = common.line_trim(lines[line_seek + 2]).split(' ')
-                for map_datum in range(len(tex_map)):
-                    tex_map[map_datum] = float(tex_map[map_datum])
-
-                mat_data.col_list.append([prop_name, tex_map[:]])
-                line_seek += 3
-
-            elif node_type == 'f':
-                prop_name = common.line_trim(lines[line_seek + 1])
-                val = float(common.line_trim(lines[line_seek + 2]))
-
-                mat_data.f_list.append([prop_name, val])
-                line_seek += 3
-            else:
-                raise Exception('未知の設定値タイプが見つかりました。')
-
-        return mat_data
+        return parse_text(text)
 
     @classmethod
     def parse_json(cls, text):
-        import json
-        mat_data = Material()
-        mat_data.from_dict(json.loads(text))
-
-        return mat_data
+        return parse_json(text)
 
     @classmethod
-    def apply_to(cls, override, mate, mat_data, replace_tex=True):
+    def apply_to(cls, override, mate, mat_data, replace_tex=True, tex_session=None):
+        if replace_tex and tex_session:
+            tex_session.resolve_all([tex_item[1] for tex_item in mat_data.tex_list if len(tex_item) > 1])
+
         mate['shader1'] = mat_data.shader1
         mate['shader2'] = mat_data.shader2
 
@@ -885,7 +661,7 @@ class MaterialHandler:
                 tex_name = tex_item[1]
                 tex_path = tex_item[2]
                 tex_map = tex_item[3] + tex_item[4]
-                common.create_tex(override, mate, prop_name, tex_name, tex_path, tex_path, tex_map, replace_tex)
+                common.create_tex(override, mate, prop_name, tex_name, tex_path, tex_path, tex_map, replace_tex, tex_session=tex_session)
 
         for col_item in mat_data.col_list:
             prop_name = col_item[0]
@@ -915,7 +691,13 @@ class MaterialHandler:
         align_nodes(mate)
 
     @classmethod
-    def apply_to_old(cls, override, mate, mat_data, replace_tex=True, decorate=True, skip_same_prop=True):
+    def apply_to_old(cls, override, mate, mat_data, replace_tex=True, decorate=True, skip_same_prop=True, tex_session=None):
+        if replace_tex:
+            # 見つからないテクスチャごとに再走査しないよう、まとめて検索する
+            if tex_session is None:
+                tex_session = common.TexLookupSession()
+            tex_session.resolve_all([item[1] for item in mat_data.tex_list if len(item) > 4])
+
         ob = override['active_object']
         me = ob.data
 
@@ -952,7 +734,7 @@ class MaterialHandler:
                 slot.offset = item[3]
                 slot.scale = item[4]
                 if replace_tex:
-                    if common.replace_cm3d2_tex(tex.image, reload_path=True) and prop_name == '_MainTex':
+                    if tex_session.replace(tex.image) and prop_name == '_MainTex':
                         for face in me.polygons:
                             if face.material_index == ob.active_material_index:
                                 me.uv_textures.active.data[face.index].image = tex.image
@@ -1028,6 +810,22 @@ class MaterialHandler:
         return slot
 
 
+class ModelReader(model.ModelReader):
+    """modelファイルをセクション単位で読み込むクラス (ボーンの座標や行列を mathutils の型で返す)"""
+
+    def _read_bones(self, reader):
+        bone_data = super()._read_bones(reader)
+        for bone in bone_data:
+            bone['co'] = mathutils.Vector(bone['co'])
+            bone['rot'] = mathutils.Quaternion(bone['rot'])
+        return bone_data
+
+    def _read_local_bones(self, reader):
+        local_bone_data = super()._read_local_bones(reader)
+        for bone in local_bone_data:
+            bone['matrix'] = mathutils.Matrix(bone['matrix'])
+        return local_bone_data
+
 def clear_nodes(nodes):
     for node in nodes:
         if node.type not in ['VALUE', 'RGB', 'TEX_IMAGE']:
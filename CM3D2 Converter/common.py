@@ -1,20 +1,27 @@
 import os
 import re
 import math
-import struct
+import collections
 import shutil
 import winreg
 import bpy
 import bmesh
 import mathutils
+import numpy as np
 from . import fileutil
+from . import texcache
+from .translations.pgettext_functions import f_tip_
 from . import compat
 from . import cm3d2_data
+# formats パッケージへ移動したものを再エクスポート
+from .formats import CM3D2ExportException, CM3D2ImportException
+from .formats.binary import CM3D2BinaryError, CM3D2BinaryReader, CM3D2BinaryWriter, read_str, write_str, pack_str
+from .formats.model import MODEL_WEIGHT_DTYPE, model_vertex_dtype, model_morph_dtype
+from .formats.tex import BASE_PATH_TEX, read_tex
 
 # アドオン情報
 bl_info = {}
 ADDON_NAME = "CM3D2 Converter"
-BASE_PATH_TEX = "Assets/texture/texture/"
 BRANCH = "bl_28"
 URL_REPOS = "https://github.com/luvoid/Blender-CM3D2-Converter/"
 URL_ATOM = URL_REPOS + "commits/" + BRANCH + ".atom"
@@ -23,6 +30,8 @@ KISS_ICON = None
 PREFS = None
 preview_collections = {}
 texpath_dict = {}
+tex_index = None
+tex_extract_cache = None
 
 
 re_png = re.compile(r"\.[Pp][Nn][Gg](\.\d{3})?$")
@@ -64,39 +73,253 @@ def line_trim(line, enable=True):
     return line.strip(' 　\t\r\n') if enable else line
 
 
-# CM3D2専用ファイル用の文字列書き込み
-def write_str(file, raw_str):
-    b_str = format(len(raw_str.encode('utf-8')), 'b')
-    for i in range(9):
-        if 7 < len(b_str):
-            file.write(struct.pack('<B', int("1" + b_str[-7:], 2)))
-            b_str = b_str[:-7]
-        else:
-            file.write(struct.pack('<B', int(b_str, 2)))
-            break
-    file.write(raw_str.encode('utf-8'))
-
-def pack_str(buffer, raw_str):
-    b_str = format(len(raw_str.encode('utf-8')), 'b')
-    for i in range(9):
-        if 7 < len(b_str):
-            buffer = buffer + struct.pack('<B', int("1" + b_str[-7:], 2))
-            b_str = b_str[:-7]
-        else:
-            buffer = buffer + struct.pack('<B', int(b_str, 2))
-            break
-    buffer = buffer + raw_str.encode('utf-8')
-    return buffer
 
+# 頂点座標と三角面の配列からメッシュを一括生成
+def mesh_from_arrays(me, co, faces, material_indices=None, use_smooth=True):
+    """Fill an empty mesh with foreach_set instead of from_pydata.
 
-# CM3D2専用ファイル用の文字列読み込み
-def read_str(file, total_b=""):
-    for i in range(9):
-        b_str = format(struct.unpack('<B', file.read(1))[0], '08b')
-        total_b = b_str[1:] + total_b
-        if b_str[0] == '0':
-            break
-    return file.read(int(total_b, 2)).decode('utf-8')
+    co is an (N, 3) vertex array, faces an (F, 3) vertex index array.
+    """
+    co = np.ascontiguousarray(co, dtype=np.float32).reshape(-1, 3)
+    loop_vertices = np.ascontiguousarray(faces, dtype=np.int32).ravel()
+    face_count = len(loop_vertices) // 3
+
+    me.vertices.add(len(co))
+    me.vertices.foreach_set('co', co.ravel())
+    me.loops.add(len(loop_vertices))
+    me.loops.foreach_set('vertex_index', loop_vertices)
+    me.polygons.add(face_count)
+    compat.set_polygon_loops(
+        me,
+        np.arange(0, len(loop_vertices), 3, dtype=np.int32),
+        np.full(face_count, 3, dtype=np.int32),
+    )
+    if material_indices is not None:
+        me.polygons.foreach_set('material_index', np.ascontiguousarray(material_indices, dtype=np.int32))
+    me.polygons.foreach_set('use_smooth', np.full(face_count, use_smooth, dtype=bool))
+    me.update(calc_edges=True)
+    return me
+
+
+# 頂点ごとの値をループごとに展開して一括で書き込む
+def set_loop_attribute(loop_data, attr, vertex_values, loop_vertices, vertex_indices=None):
+    """Expand per-vertex values to loops through loop_vertices and write them with foreach_set.
+
+    loop_data is a per-loop collection such as uv_layer.data or vertex_color.data.
+    When vertex_indices is given, vertex_values only holds those vertices and the
+    loops of every other vertex keep their current value.
+    """
+    loop_count = len(loop_data)
+    if not loop_count:
+        return
+    size = len(getattr(loop_data[0], attr))
+    vertex_values = np.asarray(vertex_values, dtype=np.float32)
+    vertex_values = vertex_values.reshape(len(vertex_values), -1)[:, :size]
+    loop_vertices = np.asarray(loop_vertices, dtype=np.int64)
+
+    if vertex_indices is None:
+        loop_values = vertex_values[loop_vertices]
+    else:
+        vertex_indices = np.asarray(vertex_indices, dtype=np.int64)
+        loop_values = np.empty((loop_count, size), dtype=np.float32)
+        loop_data.foreach_get(attr, loop_values.ravel())
+        vertex_count = max(loop_vertices.max(initial=-1), vertex_indices.max(initial=-1)) + 1
+        value_slots = np.full(vertex_count, -1, dtype=np.int64)
+        value_slots[vertex_indices] = np.arange(len(vertex_indices))
+        loop_slots = value_slots[loop_vertices]
+        is_set = loop_slots >= 0
+        loop_values[is_set] = vertex_values[loop_slots[is_set]]
+
+    loop_data.foreach_set(attr, np.ascontiguousarray(loop_values, dtype=np.float32).ravel())
+
+
+# メッシュをCM3D2の頂点 (頂点とUVの組) に分割する
+class VertexSplit:
+    """CM3D2 vertices of a mesh: one per distinct (vertex, UV) pair of its loops.
+
+    Output vertices are grouped by source vertex in index order, and the UVs of a
+    vertex are ordered by the first loop that uses them, in the order of
+    loop_ranks if given (see link_loop_ranks) or else of the loop indices.
+    Loose vertices produce none.
+
+    loop_indices   : output vertex of every mesh loop
+    vertices, uvs  : source vertex and UV of every output vertex
+    vertex_counts  : number of output vertices of every source vertex
+    vertex_starts  : first output vertex of every source vertex
+    """
+    def __init__(self, loop_vertices, loop_uvs, vertex_count, loop_ranks=None):
+        self.loop_vertices = np.asarray(loop_vertices, dtype=np.int32)
+        self.loop_uvs = np.asarray(loop_uvs, dtype=np.float32).reshape(-1, 2)
+        loop_count = len(self.loop_vertices)
+
+        # UVはビット列で比較する (-0.0 は 0.0 にそろえる)
+        keys = np.empty((loop_count, 3), dtype=np.int32)
+        keys[:, 0] = self.loop_vertices
+        keys[:, 1:] = (self.loop_uvs + np.float32(0.0)).view(np.int32)
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * 3))).ravel()
+        # ループを並べた順で最初に現れたものを各UVの代表にする
+        if loop_ranks is None:
+            loop_order = np.arange(loop_count)
+        else:
+            loop_order = np.argsort(loop_ranks, kind='stable')
+        _, firsts, sorted_inverse = np.unique(keys[loop_order], return_index=True, return_inverse=True)
+        inverse = np.empty(loop_count, dtype=np.int64)
+        inverse[loop_order] = sorted_inverse.ravel()
+        first_loops = loop_order[firsts]
+        order = np.lexsort((firsts, self.loop_vertices[first_loops]))
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        self.loop_indices = rank[inverse]
+        self.vertices = self.loop_vertices[first_loops[order]]
+        self.uvs = self.loop_uvs[first_loops[order]]
+        self.vertex_counts = np.bincount(self.vertices, minlength=vertex_count)
+        self.vertex_starts = np.cumsum(self.vertex_counts) - self.vertex_counts
+
+    @classmethod
+    def from_mesh(cls, me, uv_layer=None):
+        uv_layer = uv_layer or me.uv_layers.active
+        loop_count = len(me.loops)
+        loop_vertices = np.empty(loop_count, dtype=np.int32)
+        me.loops.foreach_get('vertex_index', loop_vertices)
+        loop_uvs = np.zeros((loop_count, 2), dtype=np.float32)
+        if uv_layer:
+            uv_layer.data.foreach_get('uv', loop_uvs.ravel())
+        return cls(loop_vertices, loop_uvs, len(me.vertices))
+
+    def reorder(self, order):
+        """出力頂点を order (新しい順番の旧番号) の順に並べ替える"""
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self.loop_indices = rank[self.loop_indices]
+        self.vertices = self.vertices[order]
+        self.uvs = self.uvs[order]
+        self.vertex_starts = None  # 元の頂点ごとにまとまっていないので無効
+        return rank
+
+    def __len__(self):
+        return len(self.vertices)
+
+
+# 頂点ごとのループを BMesh の link_loops の順番に並べる
+def link_loop_ranks(me, loop_vertices, loop_uvs):
+    """Rank of every loop of me for VertexSplit, matching BMesh's vert.link_loops.
+
+    Earlier versions ordered the UV copies of a vertex by link_loops, so using
+    these ranks keeps the vertex order of exported files unchanged. Only
+    vertices with more than one UV are looked up in a BMesh; every other loop
+    keeps its own index, and so does every loop if no vertex needs it.
+    """
+    loop_ranks = np.arange(len(loop_vertices))
+    vertex_counts = VertexSplit(loop_vertices, loop_uvs, len(me.vertices)).vertex_counts
+    split_vertices = np.flatnonzero(1 < vertex_counts).tolist()
+    if not split_vertices:
+        return loop_ranks
+
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(me)
+        # 面が読み込まれなかった場合はループ番号が合わないのでそのまま
+        if len(bm.faces) != len(me.polygons):
+            return loop_ranks
+        bm.verts.ensure_lookup_table()
+        for vert_index in split_vertices:
+            for rank, loop in enumerate(bm.verts[vert_index].link_loops):
+                loop_ranks[loop.index] = rank
+    finally:
+        bm.free()
+    return loop_ranks
+
+
+# 三角面の順番を頂点キャッシュ向けに並べ替える (Tipsify)
+def optimize_vertex_cache(tris, vert_count, cache_size=16):
+    """Reorder the (T, 3) triangles for a post-transform vertex cache and return them.
+
+    Tipsify, Sander et al. 2007: triangles are emitted around a fanning vertex,
+    and the next fanning vertex is the most recently cached one that its
+    remaining triangles will not push out of the cache.
+    """
+    tris = np.asarray(tris).reshape(-1, 3)
+    tri_count = len(tris)
+    if not tri_count:
+        return tris.copy()
+
+    # 頂点→三角面の隣接リスト
+    corner_vertices = tris.ravel()
+    corner_order = np.argsort(corner_vertices, kind='stable')
+    adjacency = (corner_order // 3).tolist()
+    live_counts = np.bincount(corner_vertices, minlength=vert_count)
+    offsets = np.concatenate(([0], np.cumsum(live_counts))).tolist()
+    live_counts = live_counts.tolist()
+    tri_list = tris.tolist()
+
+    timestamps = [0] * vert_count
+    emitted = [False] * tri_count
+    dead_ends = []
+    output = []
+    time = cache_size + 1
+    cursor = 0
+    fan = int(tris[0, 0])
+    while fan >= 0:
+        candidates = []
+        for tri_index in adjacency[offsets[fan]:offsets[fan + 1]]:
+            if emitted[tri_index]:
+                continue
+            emitted[tri_index] = True
+            output.append(tri_index)
+            for vert in tri_list[tri_index]:
+                dead_ends.append(vert)
+                candidates.append(vert)
+                live_counts[vert] -= 1
+                if cache_size < time - timestamps[vert]:
+                    timestamps[vert] = time
+                    time += 1
+
+        # 次の扇の中心: キャッシュに残っている候補のうち最も古いもの
+        fan = -1
+        best_priority = -1
+        for vert in candidates:
+            if live_counts[vert] <= 0:
+                continue
+            priority = 0
+            if time - timestamps[vert] + 2 * live_counts[vert] <= cache_size:
+                priority = time - timestamps[vert]
+            if best_priority < priority:
+                best_priority = priority
+                fan = vert
+        if fan < 0:
+            while dead_ends:
+                vert = dead_ends.pop()
+                if 0 < live_counts[vert]:
+                    fan = vert
+                    break
+        if fan < 0:
+            while cursor < vert_count:
+                if 0 < live_counts[cursor]:
+                    fan = cursor
+                    break
+                cursor += 1
+    return tris[output]
+
+
+# FIFO頂点キャッシュでの三角面あたりの平均キャッシュミス数 (ACMR)
+def vertex_cache_acmr(tris, cache_size=16):
+    """Average cache miss ratio of the triangles on a FIFO vertex cache"""
+    tris = np.asarray(tris).ravel().tolist()
+    if not tris:
+        return 0.0
+    cache = collections.deque()
+    cached = set()
+    misses = 0
+    for vert in tris:
+        if vert in cached:
+            continue
+        misses += 1
+        cache.append(vert)
+        cached.add(vert)
+        if cache_size < len(cache):
+            cached.discard(cache.popleft())
+    return misses / (len(tris) // 3)
 
 
 # ボーン/ウェイト名を Blender → CM3D2
@@ -476,12 +699,17 @@ def default_cm3d2_dir(base_dir, file_name, new_ext):
 
 
 # 一時ファイル書き込みと自動バックアップを行うファイルオブジェクトを返す
-def open_temporary(filepath, mode, is_backup=False):
+def get_backup_filepath(filepath, is_backup=True):
+    """上書きする時のバックアップファイルのパス (バックアップしないなら None)"""
     backup_ext = preferences().backup_ext
     if is_backup and backup_ext:
-        backup_filepath = filepath + '.' + backup_ext
-    else:
-        backup_filepath = None
+        return filepath + '.' + backup_ext
+    return None
+
+
+def open_temporary(filepath, mode, is_backup=False, backup_filepath=None):
+    if backup_filepath is None:
+        backup_filepath = get_backup_filepath(filepath, is_backup)
     return fileutil.TemporaryFileWriter(filepath, mode, backup_filepath=backup_filepath)
 
 
@@ -544,17 +772,50 @@ def get_tex_storage_files():
     return files
 
 
+# このアドオンのキャッシュを置くフォルダ (ユーザー設定フォルダ内)
+def get_cache_dir():
+    return bpy.utils.user_resource('CONFIG', path="cm3d2_converter")
+
+
+# テクスチャ置き場の索引 (ユーザー設定フォルダにキャッシュする)
+def get_tex_index():
+    global tex_index
+    if tex_index is None:
+        tex_index = texcache.TexPathIndex(os.path.join(get_cache_dir(), "texpath_index.json"))
+        tex_index.load()
+    return tex_index
+
+
+# texファイルから取り出したPNGのキャッシュ
+def get_tex_extract_cache():
+    global tex_extract_cache
+    if tex_extract_cache is None:
+        tex_extract_cache = texcache.TexExtractCache(os.path.join(get_cache_dir(), "tex_png"))
+    tex_extract_cache.max_size = preferences().tex_cache_size * 1024 * 1024
+    return tex_extract_cache
+
+
+def get_image_filepaths():
+    """読み込まれているイメージが参照しているファイルのパス (展開キャッシュから消さないもの)"""
+    return {bpy.path.abspath(img.filepath, library=img.library) for img in bpy.data.images if img.source == 'FILE' and img.filepath}
+
+
 def get_texpath_dict(reload=False):
+    """テクスチャのファイル名 (小文字) -> パスの辞書を返す.
+    前回のセッションの索引があればディスクを走査せずに使い、
+    reload=True の場合は変更されたフォルダだけを再走査する.
+    """
     if reload or len(texpath_dict) == 0:
+        tex_dirs = [bpy.path.abspath(tex_dir) for tex_dir in get_default_tex_paths()]
+        index = get_tex_index()
+        if reload or not index.has_roots(tex_dirs):
+            index.refresh(tex_dirs)
+            try:
+                index.save()
+            except OSError as e:
+                print("Could not save the texture index:", e)
         texpath_dict.clear()
-        tex_dirs = get_default_tex_paths()
-        for tex_dir in tex_dirs:
-            for path in find_tex_all_files(tex_dir):
-                path = bpy.path.abspath(path)
-                file_name = os.path.basename(path).lower()
-                # 先に見つけたファイルを優先
-                if file_name not in texpath_dict:
-                    texpath_dict[file_name] = path
+        texpath_dict.update(index.to_dict(tex_dirs))
     return texpath_dict
 
 
@@ -585,15 +846,15 @@ def replace_cm3d2_tex(img, texpath_dict: dict=None, reload_path: bool=True) -> b
     if texpath_dict is None:
         texpath_dict = get_texpath_dict()
 
-    if __replace_cm3d2_tex(img, texpath_dict):
+    if _replace_cm3d2_tex(img, texpath_dict):
         return True
     if reload_path:
         texpath_dict = get_texpath_dict(True)
-        return __replace_cm3d2_tex(img, texpath_dict)
+        return _replace_cm3d2_tex(img, texpath_dict)
     return False
 
 
-def __replace_cm3d2_tex(img, texpath_dict: dict) -> bool:
+def _replace_cm3d2_tex(img, texpath_dict: dict) -> bool:
     source_name = remove_serial_number(img.name).lower()
 
     source_png_name = source_name + ".png"
@@ -605,53 +866,115 @@ def __replace_cm3d2_tex(img, texpath_dict: dict) -> bool:
     try:
         if tex_path is None:
             return False
-        tex_data = load_cm3d2tex(tex_path)
-        if tex_data is None:
-            return False
-        
-        png_path = tex_path[:-4] + ".png"
-        with open(png_path, 'wb') as png_file:
-            png_file.write(tex_data[-1])
-        img.filepath = png_path
-        img.reload()
-        return True
+        return load_cm3d2tex_image(img, tex_path)
     except:
         pass
     return False
 
 
+class TexLookupSession:
+    """1回の操作 (インポートなど) の間で共有するテクスチャ検索
+
+    The texture index is only loaded the first time a name is looked up, so a
+    session that never resolves a texture never touches the texture folders. It
+    is refreshed at most once per session, the first time a name is missing,
+    and names still missing after that are remembered so they are not searched
+    for again. Names that could not be loaded are collected in unresolved for
+    the report at the end of the operation.
+    """
+
+    def __init__(self, reload=False, rescan=True):
+        self.reload = reload
+        self._texpath_dict = None
+        self.can_rescan = rescan and not reload
+        self.missing = set()
+        self.unresolved = set()
+
+    @property
+    def texpath_dict(self):
+        if self._texpath_dict is None:
+            self._texpath_dict = get_texpath_dict(self.reload)
+        return self._texpath_dict
+
+    def _find(self, key):
+        return self.texpath_dict.get(key + ".png") or self.texpath_dict.get(key + ".tex")
+
+    def resolve_all(self, names):
+        """テクスチャ名をまとめて検索し、{名前: パス (無ければ None)} を返す"""
+        keys = {name: remove_serial_number(name).lower() for name in names if name}
+        misses = [key for key in dict.fromkeys(keys.values()) if key not in self.missing and self._find(key) is None]
+        if misses and self.can_rescan:
+            self.can_rescan = False
+            self._texpath_dict = get_texpath_dict(True)
+            misses = [key for key in misses if self._find(key) is None]
+        self.missing.update(misses)
+        return {name: None if key in self.missing else self._find(key) for name, key in keys.items()}
+
+    def replace(self, img) -> bool:
+        """replace_cm3d2_tex と同じくイメージをtex/pngファイルに置き換える"""
+        name = remove_serial_number(img.name)
+        if not name:
+            # テクスチャが未設定のスロットは検索しない
+            return False
+        if self.resolve_all([name]).get(name) and _replace_cm3d2_tex(img, self.texpath_dict):
+            return True
+        self.unresolved.add(name)
+        return False
+
+    def report_unresolved(self, operator):
+        if self.unresolved:
+            names = ", ".join(sorted(self.unresolved))
+            operator.report(type={'WARNING'}, message=f_tip_("{count} textures were not found: {names}", count=len(self.unresolved), names=names))
+
+
 # texファイルの読み込み
 def load_cm3d2tex(path, skip_data=False):
 
-    with open(path, 'rb') as file:
-        header_ext = read_str(file)
-        if header_ext != 'CM3D2_TEX':
-            return None
-        version = struct.unpack('<i', file.read(4))[0]
-        read_str(file)
-
-        # default value
-        tex_format = 5
-        uv_rects = None
-        data = None
-        if version >= 1010:
-            if version >= 1011:
-                num_rect = struct.unpack('<i', file.read(4))[0]
-                uv_rects = []
-                for i in range(num_rect):
-                    # x, y, w, h
-                    uv_rects.append(struct.unpack('<4f', file.read(4 * 4)))
-            width = struct.unpack('<i', file.read(4))[0]
-            height = struct.unpack('<i', file.read(4))[0]
-            tex_format = struct.unpack('<i', file.read(4))[0]
-            # if tex_format == 10 or tex_format == 12: return None
-        if not skip_data:
-            png_size = struct.unpack('<i', file.read(4))[0]
-            data = file.read(png_size)
-        return version, tex_format, uv_rects, data
-
-
-def create_tex(context, mate, node_name, tex_name=None, filepath=None, cm3d2path=None, tex_map_data=None, replace_tex=False, slot_index=-1):
+    with CM3D2BinaryReader.open(path) as reader:
+        texture = read_tex(reader, skip_data)
+    if texture is None:
+        return None
+    return texture.version, texture.tex_format, texture.uv_rects, texture.data
+
+
+# texファイルの画像データ (未対応の形式なら None)
+def read_cm3d2tex_image_data(tex_path):
+    tex_data = load_cm3d2tex(tex_path)
+    if tex_data is None or tex_data[1] not in (3, 5):
+        return None
+    return tex_data[-1]
+
+
+def pack_tex_image(img, filepath, data):
+    """画像データをファイルに書き出さずにイメージへパックする"""
+    img.filepath_raw = filepath
+    img.pack(data=data, data_len=len(data))
+    img.source = 'FILE'
+
+
+def load_cm3d2tex_image(img, tex_path, pack=None) -> bool:
+    """texファイルをイメージに読み込む.
+    PNGは展開キャッシュに取り出して読み込み、texファイルの横には書き出さない.
+    pack=True (省略時は設定値) の場合はディスクに書かずにパックする.
+    """
+    if pack is None:
+        pack = preferences().is_pack_tex
+    if pack:
+        data = read_cm3d2tex_image_data(tex_path)
+        if data is None:
+            return False
+        pack_tex_image(img, os.path.splitext(tex_path)[0] + ".png", data)
+        return True
+
+    png_path = get_tex_extract_cache().extract(tex_path, lambda: read_cm3d2tex_image_data(tex_path), get_image_filepaths)
+    if png_path is None:
+        return False
+    img.filepath = png_path
+    img.reload()
+    return True
+
+
+def create_tex(context, mate, node_name, tex_name=None, filepath=None, cm3d2path=None, tex_map_data=None, replace_tex=False, slot_index=-1, tex_session=None):
     if isinstance(context, bpy.types.Context):
         context = context.copy()
 
@@ -677,7 +1000,10 @@ def create_tex(context, mate, node_name, tex_name=None, filepath=None, cm3d2path
             tex.image = img
 
             if replace_tex:
-                replaced = replace_cm3d2_tex(tex.image, reload_path=False)
+                if tex_session:
+                    replaced = tex_session.replace(tex.image)
+                else:
+                    replaced = replace_cm3d2_tex(tex.image, reload_path=False)
                 if replaced and node_name == '_MainTex':
                     ob = context['active_object']
                     me = ob.data
@@ -725,7 +1051,10 @@ def create_tex(context, mate, node_name, tex_name=None, filepath=None, cm3d2path
 
             # tex探し
             if replace_tex:
-                replaced = replace_cm3d2_tex(tex.image, reload_path=False)
+                if tex_session:
+                    replaced = tex_session.replace(tex.image)
+                else:
+                    replaced = replace_cm3d2_tex(tex.image, reload_path=False)
                 # TODO 2.8での実施方法を調査. shader editorで十分？
 
     return tex
@@ -1022,13 +1351,6 @@ def trigonometric_smooth(x):
     return math.sin((x - 0.5) * math.pi) * 0.5 + 0.5
 
 
-# エクスポート例外クラス
-class CM3D2ExportException(Exception):
-    pass
-
-class CM3D2ImportException(Exception):
-    pass
-
 
 # ノード取得クラス
 class NodeHandler():
@@ -5,6 +5,7 @@ import re
 import struct
 import os
 import mathutils
+import numpy as np
 import traceback
 from typing import Any, Optional
 
@@ -133,6 +134,14 @@ def get_active_uv(me):
     return uvs.active
 
 
+def new_uv_layer(me, name):
+    if IS_LEGACY:
+        uv_tex = me.uv_textures.new(name)
+        return me.uv_layers[uv_tex.name]
+
+    return me.uv_layers.new(name=name, do_init=False)
+
+
 def set_display_type(ob, disp_type):
     if IS_LEGACY:
         ob.draw_type = disp_type
@@ -257,6 +266,14 @@ def convert_bl_to_cm_local_space(x):
     else:
         return mul(x, CM_TO_BL_SPACE_MAT4)
 
+# (N, 3) の配列をまとめて変換
+CM_TO_BL_SPACE_ARRAY = np.array(CM_TO_BL_SPACE_MAT4.to_3x3(), dtype=np.float32)
+BL_TO_CM_SPACE_ARRAY = np.array(BL_TO_CM_SPACE_MAT4.to_3x3(), dtype=np.float32)
+def convert_cm_to_bl_space_array(x):
+    return np.asarray(x, dtype=np.float32).reshape(-1, 3) @ CM_TO_BL_SPACE_ARRAY.T
+def convert_bl_to_cm_space_array(x):
+    return np.asarray(x, dtype=np.float32).reshape(-1, 3) @ BL_TO_CM_SPACE_ARRAY.T
+
 
 CM_TO_BL_BONE_ROTATION_MAT4 = mul(
     bpy_extras.io_utils.axis_conversion(from_forward='Z', from_up='-X', to_forward='Y', to_up='Z').to_4x4(),
@@ -344,6 +361,13 @@ def set_bone_matrix(bone, mat):
     #print("mat:  ", mat)
 
 
+def set_polygon_loops(me, loop_start, loop_total):
+    me.polygons.foreach_set('loop_start', loop_start)
+    # loop_total is derived from loop_start and read-only in newer versions
+    if not me.polygons.bl_rna.properties['loop_total'].is_readonly:
+        me.polygons.foreach_set('loop_total', loop_total)
+
+
 BL28_TO_LEGACY_ICON = {
     # Renamed in 2.80               
     'ADD'                          : 'ZOOMIN'             ,  
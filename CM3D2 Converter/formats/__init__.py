@@ -0,0 +1,15 @@
+"""CM3D2専用ファイルの読み書き (bpy を使わない部分)
+
+This package only depends on numpy, so it can be used from a plain Python
+interpreter. The command line tool is run from the add-on folder:
+
+    python -m formats inspect body001.model
+    python -m formats convert -o out/ *.tex *.mate
+"""
+from .errors import CM3D2ExportException, CM3D2ImportException, set_translation_function
+from .binary import CM3D2BinaryError, CM3D2BinaryReader, CM3D2BinaryWriter
+from . import mate
+from . import model
+from . import anm
+from . import tex
+from . import menu
@@ -0,0 +1,60 @@
+"""anmファイル (モーション) の読み書き
+
+The data is the same dict that the importer stores in the "AnmData" text:
+{bone name: {'path': bone path, 'channels': {channel id: [{'frame', 'f0', 'f1', 'f2'}, ...]}}}.
+Channels 100-103 are the rotation quaternion (x, y, z, w) and 104-106 the location,
+with f0 the value and f1/f2 the in/out tangents.
+"""
+from .errors import CM3D2ImportException, f_tip_
+
+
+def read_anm(reader):
+    """anmファイルを読み込んでボーンごとのチャンネルの辞書を返す"""
+    # ヘッダー
+    ext = reader.read_str()
+    if ext != 'CM3D2_ANIM':
+        raise CM3D2ImportException("これはカスタムメイド3D2のモーションファイルではありません")
+    reader.read_i32()  # version
+    first_channel_id = reader.read_u8()
+    if first_channel_id != 1:
+        raise CM3D2ImportException(f_tip_("Unexpected first channel id = {id} (should be 1).", id=first_channel_id))
+
+    anm_data = {}
+    for anim_data_index in range(9**9):
+        path = reader.read_str()
+        
+        base_bone_name = path.split('/')[-1]
+        if base_bone_name not in anm_data:
+            anm_data[base_bone_name] = {'path': path}
+            anm_data[base_bone_name]['channels'] = {}
+
+        for channel_index in range(9**9):
+            channel_id = reader.read_u8()
+            if channel_id <= 1:
+                break
+            channel_data_count = reader.read_i32()
+            # frame, f0, f1, f2 を一括で読み込む
+            channel_data = reader.read_f32_array(channel_data_count * 4).reshape(channel_data_count, 4).tolist()
+            anm_data[base_bone_name]['channels'][channel_id] = [{'frame': frame, 'f0': f0, 'f1': f1, 'f2': f2} for frame, f0, f1, f2 in channel_data]
+
+        if channel_id == 0:
+            break
+    return anm_data
+
+
+def write_anm(writer, anm_data, version=1000):
+    """read_anm と同じ形式の辞書を CM3D2BinaryWriter に書き込む (チャンネル番号は文字列でもよい)"""
+    writer.write_str('CM3D2_ANIM')
+    writer.write_i32(version)
+
+    for base_bone_name, bone_data in anm_data.items():
+        writer.write_bool(True)
+        writer.write_str(bone_data['path'])
+
+        for channel_id, channel in bone_data['channels'].items():
+            writer.write_u8(int(channel_id))
+            writer.write_i32(len(channel))
+            for channel_data in channel:
+                writer.write_f32s((channel_data['frame'], channel_data['f0'], channel_data['f1'], channel_data['f2']))
+
+    writer.write_bool(False)
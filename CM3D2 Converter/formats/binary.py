@@ -0,0 +1,277 @@
+"""CM3D2専用ファイルのバイナリ読み書き"""
+import mmap
+import struct
+import numpy as np
+
+
+# CM3D2専用ファイル用の文字列 (7bitずつの長さ + UTF-8)
+def _encode_str(raw_str):
+    data = raw_str.encode('utf-8')
+    length = len(data)
+    prefix = bytearray()
+    while 0x80 <= length:
+        prefix.append(length & 0x7F | 0x80)
+        length >>= 7
+    prefix.append(length)
+    return bytes(prefix) + data
+
+
+# CM3D2専用ファイル用の文字列書き込み
+def write_str(file, raw_str):
+    if isinstance(file, CM3D2BinaryWriter):
+        file.write_str(raw_str)
+    else:
+        file.write(_encode_str(raw_str))
+
+def pack_str(buffer, raw_str):
+    buffer += _encode_str(raw_str)
+    return buffer
+
+
+# CM3D2専用ファイル用の文字列読み込み
+def read_str(file):
+    if isinstance(file, CM3D2BinaryReader):
+        return file.read_str()
+    length = 0
+    for shift in range(0, 63, 7):
+        byte = struct.unpack('<B', file.read(1))[0]
+        length |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+    return file.read(length).decode('utf-8')
+
+
+_INT32 = struct.Struct('<i')
+_FLOAT32 = struct.Struct('<f')
+
+
+class CM3D2BinaryError(struct.error):
+    """Raised when a CM3D2 file ends early or holds an invalid value; `position` is the byte offset"""
+
+    def __init__(self, message, position):
+        super().__init__(f"{message} (at byte 0x{position:X})")
+        self.position = position
+
+
+class CM3D2BinaryReader:
+    """CM3D2専用ファイルをメモリ上のバッファから読み込むクラス
+
+    `data` may be bytes, a bytearray or an mmap. Values are unpacked straight from
+    the buffer at the current position, and reading past the end raises
+    CM3D2BinaryError with the position of the failed read.
+    """
+
+    def __init__(self, data, position=0):
+        self._data = data
+        self._size = len(data)
+        self._pos = position
+        self._map = None
+
+    @classmethod
+    def open(cls, filepath):
+        """ファイルをメモリマップして読み込む (close() で閉じる)"""
+        with open(filepath, 'rb') as file:
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空のファイルはマップできない
+                return cls(b'')
+        reader = cls(data)
+        reader._map = data
+        return reader
+
+    @classmethod
+    def from_file(cls, file):
+        """ファイルオブジェクトの残りを全て読み込む"""
+        return cls(file.read())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self):
+        return self._size
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def error(self, message, position=None):
+        return CM3D2BinaryError(message, self._pos if position is None else position)
+
+    def _take(self, size):
+        pos = self._pos
+        if size < 0 or self._size < pos + size:
+            raise self.error(f"Tried to read {size} bytes but only {max(self._size - pos, 0)} are left")
+        self._pos = pos + size
+        return pos
+
+    def read(self, size=-1):
+        """ファイルオブジェクトと同じく、終端では短いデータを返す"""
+        pos = min(self._pos, self._size)
+        end = self._size if size < 0 else min(pos + size, self._size)
+        self._pos = end
+        return self._data[pos:end]
+
+    def read_bytes(self, size):
+        pos = self._take(size)
+        return self._data[pos:pos + size]
+
+    def skip(self, size):
+        self._take(size)
+
+    def read_u8(self):
+        return self._data[self._take(1)]
+
+    def read_bool(self):
+        return self._data[self._take(1)] != 0
+
+    def read_i32(self):
+        return _INT32.unpack_from(self._data, self._take(4))[0]
+
+    def read_f32(self):
+        return _FLOAT32.unpack_from(self._data, self._take(4))[0]
+
+    def read_struct(self, fmt):
+        return struct.unpack_from(fmt, self._data, self._take(struct.calcsize(fmt)))
+
+    def read_i32s(self, count):
+        return self.read_struct(f'<{count}i')
+
+    def read_f32s(self, count):
+        return self.read_struct(f'<{count}f')
+
+    def read_array(self, dtype, count):
+        """`count` elements of `dtype` as a read-only array"""
+        dtype = np.dtype(dtype)
+        size = dtype.itemsize * count
+        pos = self._take(size)
+        return np.frombuffer(self._data[pos:pos + size], dtype=dtype, count=count)
+
+    def read_f32_array(self, count):
+        return self.read_array('<f4', count)
+
+    def read_str(self):
+        data, pos = self._data, self._pos
+        if self._size <= pos:
+            raise self.error("The file ends before a string")
+        length = data[pos]
+        pos += 1
+        if 0x80 <= length:
+            # 2バイト以上の長さ
+            length &= 0x7F
+            for shift in range(7, 63, 7):
+                if self._size <= pos:
+                    raise self.error("The file ends inside a string length")
+                byte = data[pos]
+                pos += 1
+                length |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+            else:
+                raise self.error("String length prefix is too long")
+        end = pos + length
+        if self._size < end:
+            raise self.error(f"String of {length} bytes does not fit in the file")
+        self._pos = end
+        return data[pos:end].decode('utf-8')
+
+
+class CM3D2BinaryWriter:
+    """CM3D2専用ファイルを bytearray にまとめて書き込むクラス
+
+    With a `file`, the buffer is written out whenever it grows past `buffer_size`
+    and when the writer is flushed or leaves a with block without an error.
+    Without one, getvalue() returns everything written so far.
+    """
+
+    def __init__(self, file=None, buffer_size=1 << 20):
+        self.file = file
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._flushed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def tell(self):
+        return self._flushed + len(self._buffer)
+
+    def getvalue(self):
+        return bytes(self._buffer)
+
+    def flush(self):
+        if self.file is not None and self._buffer:
+            self.file.write(self._buffer)
+            self._flushed += len(self._buffer)
+            self._buffer.clear()
+
+    def _check_flush(self):
+        if self.file is not None and self.buffer_size <= len(self._buffer):
+            self.flush()
+
+    def write(self, data):
+        if self.file is not None and self.buffer_size <= len(data):
+            # 大きなデータはバッファを通さずに書き込む
+            self.flush()
+            self.file.write(data)
+            self._flushed += len(data)
+            return
+        self._buffer += data
+        self._check_flush()
+
+    def write_u8(self, value):
+        self._buffer.append(value)
+
+    def write_bool(self, value):
+        self._buffer.append(1 if value else 0)
+
+    def write_i32(self, value):
+        self._buffer += _INT32.pack(value)
+
+    def write_f32(self, value):
+        self._buffer += _FLOAT32.pack(value)
+
+    def write_struct(self, fmt, *values):
+        self._buffer += struct.pack(fmt, *values)
+        self._check_flush()
+
+    def write_i32s(self, values):
+        self._buffer += struct.pack(f'<{len(values)}i', *values)
+        self._check_flush()
+
+    def write_f32s(self, values):
+        self._buffer += struct.pack(f'<{len(values)}f', *values)
+        self._check_flush()
+
+    def write_array(self, array):
+        self.write(array.tobytes())
+
+    def write_str(self, raw_str):
+        data = raw_str.encode('utf-8')
+        length = len(data)
+        buffer = self._buffer
+        while 0x80 <= length:
+            buffer.append(length & 0x7F | 0x80)
+            length >>= 7
+        buffer.append(length)
+        buffer += data
+        self._check_flush()
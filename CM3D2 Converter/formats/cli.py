@@ -0,0 +1,342 @@
+"""CM3D2専用ファイルをコマンドラインで検証/表示/変換/比較する
+
+Run from the add-on folder with `python -m formats <command> ...`. Directories
+given on the command line are walked recursively, and every file is handled on a
+worker process (-j sets the number of processes).
+
+    validate PATH...             parse every file and report the ones that fail
+    inspect PATH...              print a JSON summary of each file (one per line)
+    convert [-o DIR] PATH...     .tex <-> .png, .mate <-> .mate.txt,
+                                 .anm <-> .anm.json, .menu <-> .menu.json
+                                 (existing files are kept unless --force)
+    diff OLD_DIR NEW_DIR         list added, removed and changed files
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+
+from .binary import CM3D2BinaryReader, CM3D2BinaryWriter
+from .errors import CM3D2ImportException
+from . import anm, mate, menu, model, tex
+
+FORMATS = ('.model', '.anm', '.mate', '.tex', '.menu')
+# 変換の入力拡張子 -> 出力拡張子
+CONVERSIONS = {
+    '.tex': '.png',
+    '.png': '.tex',
+    '.mate': '.mate.txt',
+    '.mate.txt': '.mate',
+    '.anm': '.anm.json',
+    '.anm.json': '.anm',
+    '.menu': '.menu.json',
+    '.menu.json': '.menu',
+}
+
+
+def file_format(path, extensions=FORMATS):
+    """一番長く一致する拡張子を返す (対応していなければ None)"""
+    name = path.lower()
+    matches = [ext for ext in extensions if name.endswith(ext)]
+    return max(matches, key=len) if matches else None
+
+
+def iter_files(paths, extensions=FORMATS):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if file_format(name, extensions):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def read_file(path):
+    """ファイルを拡張子に応じて読み込む"""
+    ext = file_format(path)
+    if ext == '.model':
+        with model.ModelReader(path) as model_data:
+            return model_data.read_all()
+    with CM3D2BinaryReader.open(path) as reader:
+        if ext == '.anm':
+            return anm.read_anm(reader)
+        elif ext == '.mate':
+            mat_data = mate.Material()
+            mat_data.read(reader)
+            return mat_data
+        elif ext == '.tex':
+            texture = tex.read_tex(reader)
+            if texture is None:
+                raise CM3D2ImportException("Not a valid CM3D2 .tex file.")
+            return texture
+        elif ext == '.menu':
+            return menu.read_menu(reader)
+    raise ValueError("Unsupported file type: " + path)
+
+
+def validate(path):
+    read_file(path)
+
+
+def describe(path):
+    """ファイルの概要を辞書で返す (modelは頂点などを読み込まない)"""
+    ext = file_format(path)
+    info = {'path': path, 'format': ext[1:] if ext else None, 'size': os.path.getsize(path)}
+    if ext == '.model':
+        with model.ModelReader(path) as model_data:
+            info.update({
+                'version': model_data.version,
+                'name': model_data.name,
+                'base_bone': model_data.base_bone,
+                'bones': len(model_data.bones),
+                'local_bones': len(model_data.local_bones),
+                'vertices': model_data.vertex_count,
+                'meshes': model_data.mesh_count,
+                'materials': [mat_data.name for mat_data in model_data.materials],
+                'shaders': [mat_data.shader1 for mat_data in model_data.materials],
+                'morphs': model_data.morph_names,
+            })
+    elif ext == '.anm':
+        anm_data = read_file(path)
+        frames = [channel_data['frame'] for bone_data in anm_data.values() for channel in bone_data['channels'].values() for channel_data in channel]
+        info.update({
+            'bones': len(anm_data),
+            'channels': sum(len(bone_data['channels']) for bone_data in anm_data.values()),
+            'keyframes': len(frames),
+            'length': max(frames) if frames else 0.0,
+        })
+    elif ext == '.mate':
+        mat_data = read_file(path)
+        info.update({
+            'version': mat_data.version,
+            'name': mat_data.name,
+            'shader': mat_data.shader1,
+            'textures': [tex_item[2] for tex_item in mat_data.tex_list if len(tex_item) > 2],
+            'colors': len(mat_data.col_list),
+            'floats': len(mat_data.f_list),
+        })
+    elif ext == '.tex':
+        texture = read_file(path)
+        info.update({
+            'version': texture.version,
+            'tex_path': texture.path,
+            'tex_format': texture.tex_format,
+            'width': texture.width,
+            'height': texture.height,
+            'uv_rects': len(texture.uv_rects or ()),
+        })
+    elif ext == '.menu':
+        menu_data = read_file(path)
+        info.update({
+            'version': menu_data.version,
+            'name': menu_data.name,
+            'category': menu_data.category,
+            'commands': len(menu_data.commands),
+        })
+    return info
+
+
+def convert_path(path, output_dir=None):
+    """変換後のファイルのパスを返す (出力先フォルダが無ければ入力ファイルの隣)"""
+    ext = file_format(path, CONVERSIONS)
+    if ext is None:
+        raise ValueError("Unsupported file type: " + path)
+    base_name = os.path.basename(path)[:-len(ext)]
+    return os.path.join(output_dir or os.path.dirname(path), base_name + CONVERSIONS[ext])
+
+
+def convert(path, output_dir=None, force=False):
+    """ファイルを変換して出力先のパスを返す (force でなければ既存のファイルは上書きしない)"""
+    output_path = convert_path(path, output_dir)
+    if not force and os.path.exists(output_path):
+        raise FileExistsError("Output file already exists (use --force to overwrite): " + output_path)
+    ext = file_format(path, CONVERSIONS)
+    base_name = os.path.basename(path)[:-len(ext)]
+
+    if ext == '.tex':
+        texture = read_file(path)
+        if tex.png_size(texture.data) is None:
+            raise CM3D2ImportException("The texture data is not a PNG image (tex_format {}).".format(texture.tex_format))
+        data = texture.data
+    elif ext == '.mate':
+        data = read_file(path).to_text().encode('utf-8')
+    elif ext in ('.anm', '.menu'):
+        content = read_file(path)
+        if ext == '.menu':
+            content = content.__dict__
+        data = json.dumps(content, ensure_ascii=False, indent=2).encode('utf-8')
+    else:
+        with open(path, 'rb') as file:
+            source = file.read()
+        writer = CM3D2BinaryWriter()
+        if ext == '.png':
+            size = tex.png_size(source)
+            if size is None:
+                raise ValueError("Not a PNG file: " + path)
+            texture = tex.Texture(1010, tex.BASE_PATH_TEX + base_name + '.png', source, width=size[0], height=size[1])
+            tex.write_tex(writer, texture)
+        elif ext == '.mate.txt':
+            mate.parse_text(source.decode('utf-8')).write(writer)
+        elif ext == '.anm.json':
+            anm.write_anm(writer, json.loads(source.decode('utf-8')))
+        elif ext == '.menu.json':
+            menu.write_menu(writer, menu.Menu(**json.loads(source.decode('utf-8'))))
+        data = writer.getvalue()
+
+    with open(output_path, 'wb') as file:
+        file.write(data)
+    return output_path
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compare(old_path, new_path):
+    """2つのファイルの概要を比較して違う項目名を返す (同じなら None)"""
+    if os.path.getsize(old_path) == os.path.getsize(new_path) and file_digest(old_path) == file_digest(new_path):
+        return None
+    old_info, new_info = describe(old_path), describe(new_path)
+    keys = [key for key in old_info if key != 'path' and old_info[key] != new_info.get(key)]
+    return keys or ['data']
+
+
+# ワーカープロセスで実行する関数 (1つのファイルの失敗で全体を止めないよう、例外は全て文字列にして返す)
+def _run(func, *args):
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, "{}: {}".format(type(e).__name__, e)
+
+
+def _map(jobs, func, *iterables):
+    count = len(iterables[0])
+    if jobs == 1:
+        yield from map(_run, [func] * count, *iterables)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        chunksize = max(1, count // ((jobs or os.cpu_count() or 1) * 8))
+        yield from executor.map(_run, [func] * count, *iterables, chunksize=chunksize)
+
+
+def cmd_validate(args):
+    paths = list(iter_files(args.paths))
+    failed = 0
+    for path, (result, error) in zip(paths, _map(args.jobs, validate, paths)):
+        if error:
+            failed += 1
+            print("{}: {}".format(path, error))
+    print("{} files, {} failed".format(len(paths), failed), file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_inspect(args):
+    paths = list(iter_files(args.paths))
+    failed = 0
+    for path, (info, error) in zip(paths, _map(args.jobs, describe, paths)):
+        if error:
+            failed += 1
+            info = {'path': path, 'error': error}
+        print(json.dumps(info, ensure_ascii=False))
+    return 1 if failed else 0
+
+
+def cmd_convert(args):
+    def normalize(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    # 他の入力ファイルを上書きする変換や、同じファイルに出力する2つ目以降の変換は行わない
+    all_paths = {}
+    for path in iter_files(args.paths, CONVERSIONS):
+        all_paths.setdefault(normalize(path), path)
+    input_paths = set(all_paths)
+    output_paths = set()
+    paths = []
+    skipped = 0
+    for path in all_paths.values():
+        try:
+            output_path = normalize(convert_path(path, args.output))
+        except ValueError:
+            # 未対応のファイルはワーカーでエラーとして報告する
+            paths.append(path)
+            continue
+        if output_path in input_paths:
+            print("{}: skipped, the output is also an input: {}".format(path, output_path), file=sys.stderr)
+            skipped += 1
+        elif output_path in output_paths:
+            print("{}: skipped, another input has the same output: {}".format(path, output_path), file=sys.stderr)
+            skipped += 1
+        else:
+            output_paths.add(output_path)
+            paths.append(path)
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    failed = 0
+    for path, (output_path, error) in zip(paths, _map(args.jobs, convert, paths, [args.output] * len(paths), [args.force] * len(paths))):
+        if error:
+            failed += 1
+            print("{}: {}".format(path, error), file=sys.stderr)
+        else:
+            print(output_path)
+    return 1 if failed or skipped else 0
+
+
+def cmd_diff(args):
+    def relative_files(root):
+        return {os.path.relpath(path, root): path for path in iter_files([root])}
+
+    old_files, new_files = relative_files(args.old), relative_files(args.new)
+    for name in sorted(old_files.keys() - new_files.keys()):
+        print("D " + name)
+    for name in sorted(new_files.keys() - old_files.keys()):
+        print("A " + name)
+
+    common_names = sorted(old_files.keys() & new_files.keys())
+    changed = 0
+    results = _map(args.jobs, compare, [old_files[name] for name in common_names], [new_files[name] for name in common_names])
+    for name, (keys, error) in zip(common_names, results):
+        if error:
+            changed += 1
+            print("! {}: {}".format(name, error))
+        elif keys:
+            changed += 1
+            print("M {}: {}".format(name, ", ".join(keys)))
+    return 1 if changed or old_files.keys() != new_files.keys() else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m formats', description="Validate, inspect, convert and diff CM3D2 files without Blender.")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="Number of worker processes (default: CPU count, 1 runs in this process)")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    sub = subparsers.add_parser('validate', help="Parse every file and report the ones that fail")
+    sub.add_argument('paths', nargs='+')
+    sub.set_defaults(func=cmd_validate)
+
+    sub = subparsers.add_parser('inspect', help="Print a JSON summary of each file")
+    sub.add_argument('paths', nargs='+')
+    sub.set_defaults(func=cmd_inspect)
+
+    sub = subparsers.add_parser('convert', help=".tex<->.png, .mate<->.mate.txt, .anm<->.anm.json, .menu<->.menu.json")
+    sub.add_argument('-o', '--output', help="Output folder (default: next to each input file)")
+    sub.add_argument('-f', '--force', action='store_true', help="Overwrite existing output files")
+    sub.add_argument('paths', nargs='+')
+    sub.set_defaults(func=cmd_convert)
+
+    sub = subparsers.add_parser('diff', help="Compare two folders")
+    sub.add_argument('old')
+    sub.add_argument('new')
+    sub.set_defaults(func=cmd_diff)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,23 @@
+"""formats パッケージの例外とメッセージの翻訳"""
+
+_translation_function = None
+
+
+def set_translation_function(func):
+    """Use `func(msgid, *args, **kwargs)` to translate and format messages (the add-on passes f_tip_)"""
+    global _translation_function
+    _translation_function = func
+
+
+def f_tip_(msgid, *args, **kwargs):
+    if _translation_function is not None:
+        return _translation_function(msgid, *args, **kwargs)
+    return msgid.format(*args, **kwargs)
+
+
+# エクスポート例外クラス
+class CM3D2ExportException(Exception):
+    pass
+
+class CM3D2ImportException(Exception):
+    pass
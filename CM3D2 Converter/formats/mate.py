@@ -0,0 +1,246 @@
+"""mateファイル (マテリアル) の読み書き"""
+import json
+from .errors import CM3D2ImportException, f_tip_
+
+
+# 文字列の左右端から空白を削除
+def _line_trim(line):
+    return line.strip(' 　\t\r\n')
+
+
+class Material():
+    """マテリアルデータクラス"""
+    def __init__(self):
+        self.version = 1000
+        self.name1 = None
+        self.name2 = None
+        self.shader1 = None
+        self.shader2 = None
+
+        self.tex_list = []  # prop_name, (tex_name, tex_path, trans[2], scale[2])
+        self.col_list = []  # prop_name, col[4]
+        self.f_list = []  # prop_name, f
+        self.range_list = [] # prop_name, col[4]
+
+        self.custom_list = dict()
+
+    def sort(self):
+        self.tex_list = sorted(self.tex_list, key=lambda item: item[0])
+        self.col_list = sorted(self.col_list, key=lambda item: item[0])
+        self.f_list = sorted(self.f_list, key=lambda item: item[0])
+
+    @property
+    def name(self):
+        return self.name2 or self.name1
+
+    def read(self, reader, read_header=True):
+        """CM3D2BinaryReader から読み込む"""
+        if read_header:
+            header = reader.read_str()
+            if header != 'CM3D2_MATERIAL':
+                raise CM3D2ImportException(f_tip_("mateファイルではありません。ヘッダ:{}", header))
+            self.version = reader.read_i32()
+            self.name1 = reader.read_str()
+        self.name2 = reader.read_str()
+
+        self.shader1 = reader.read_str()
+        self.shader2 = reader.read_str()
+        
+        peeked = reader.read_u8()
+        reader.seek(-1, 1)
+        if self.version >= 2102 and (peeked in (0, 1)): # CR Edit Mode
+            cr_unknown_float_count = reader.read_u8()
+            for i in range(cr_unknown_float_count):
+                # CR TODO
+                self.custom_list[f'cr_unknown_float:{i:03d}'] = reader.read_struct('<f')
+
+        for i in range(99999):
+            prop_type = reader.read_str()
+            if prop_type == 'tex':
+                prop_name = reader.read_str()
+                sub_type = reader.read_str()
+                if sub_type == 'tex2d':
+                    tex_name = reader.read_str()
+                    tex_path = reader.read_str()
+                    offset_x, offset_y, scale_x, scale_y = reader.read_f32s(4)
+                    tex_item = [prop_name, tex_name, tex_path, (offset_x, offset_y), (scale_x, scale_y)]
+                else:
+                    tex_item = [prop_name]
+                self.tex_list.append(tex_item)
+
+            elif prop_type == 'col':
+                prop_name = reader.read_str()
+                col = reader.read_f32s(4)
+                self.col_list.append([prop_name, col])
+
+            elif prop_type == 'f' or prop_type == 'range': # 'range' from CR Edit
+                prop_name = reader.read_str()
+                f = reader.read_f32()
+                self.f_list.append([prop_name, f])
+            
+            # CR TODO
+            elif prop_type == 'keyword':
+                prop_name = reader.read_str()
+                keyword_f = reader.read_f32()
+                self.custom_list.setdefault('keyword', dict())[prop_name] = keyword_f #.append([prop_name, keyword_f])
+                
+            # CR TODO
+            elif prop_type == '_ALPHAPREMULTIPLY_ON':
+                alpha_bool = reader.read_bool()
+                self.custom_list['_ALPHAPREMULTIPLY_ON'] = alpha_bool
+
+            elif prop_type == 'end':
+                break
+            else:
+                raise CM3D2ImportException(f_tip_("Materialプロパティに未知の設定値タイプ({prop})が見つかりました。", prop=prop_type))
+
+    def write(self, writer, write_header=True):
+        """CM3D2BinaryWriter に書き込む"""
+        if write_header:
+            writer.write_str('CM3D2_MATERIAL')
+            writer.write_i32(self.version)
+            writer.write_str(self.name1)
+
+        writer.write_str(self.name2)
+        writer.write_str(self.shader1)
+        writer.write_str(self.shader2)
+
+        for tex_item in self.tex_list:
+            writer.write_str('tex')
+            writer.write_str(tex_item[0])  # prop_name
+
+            if len(tex_item) < 2:
+                writer.write_str('null')
+            else:
+                writer.write_str('tex2d')
+                writer.write_str(tex_item[1])  # tex_name
+                writer.write_str(tex_item[2])  # tex_path
+                trans = tex_item[3]
+                scale = tex_item[4]
+                writer.write_f32s((trans[0], trans[1], scale[0], scale[1]))
+
+        for col_item in self.col_list:
+            writer.write_str('col')
+            writer.write_str(col_item[0])  # prop_name
+
+            col = col_item[1]
+            writer.write_f32s((col[0], col[1], col[2], col[3]))
+
+        for f_item in self.f_list:
+            writer.write_str('f')
+            writer.write_str(f_item[0])  # prop_name
+
+            writer.write_f32(f_item[1])
+
+        writer.write_str('end')
+
+    def to_text(self):
+        output_text = str(self.version) + "\n"
+        output_text += self.name1 + "\n"
+        output_text += self.name2 + "\n"
+        output_text += self.shader1 + "\n"
+        output_text += self.shader2 + "\n"
+        output_text += "\n"
+
+        for tex_item in self.tex_list:
+            output_text += 'tex\n'
+            output_text += "\t" + tex_item[0] + "\n"  # prop_name
+
+            if len(tex_item) < 2:
+                output_text += '\tnull\n'
+            else:
+                output_text += '\ttex2d\n'
+                output_text += "\t" + tex_item[1] + "\n"  # tex_name
+                output_text += "\t" + tex_item[2] + "\n"  # tex_path
+                trans = tex_item[3]
+                scale = tex_item[4]
+                output_text += "\t" + " ".join([str(trans[0]), str(trans[1]), str(scale[0]), str(scale[1])]) + "\n"
+
+        for col_item in self.col_list:
+            output_text += 'col\n'
+            output_text += "\t" + col_item[0] + "\n"  # prop_name
+            col = col_item[1]
+            output_text += "\t" + " ".join([str(col[0]), str(col[1]), str(col[2]), str(col[3])]) + "\n"  # prop_name
+
+        for f_item in self.f_list:
+            output_text += 'f\n'
+            output_text += "\t" + f_item[0] + "\n"  # prop_name
+            f = f_item[1]
+            output_text += "\t" + str(f) + "\n"
+
+        return output_text
+
+    def to_json(self):
+        return json.dumps(self.__dict__, ensure_ascii=False, indent=2)
+
+    def from_dict(self, data):
+        self.name1 = data['name1']
+        self.name2 = data['name2']
+        self.version = data['version']
+        self.shader1 = data['shader1']
+        self.shader2 = data['shader2']
+
+        self.tex_list = data['tex_list']  # prop_name, (tex_name, tex_path, trans[2], scale[2])
+        self.col_list = data['col_list']  # prop_name, col[4]
+        self.f_list = data['f_list']  # prop_name, f
+
+
+# テキストからマテリアルを作成
+def parse_text(text):
+    mat_data = Material()
+    lines = text.split('\n')
+
+    mat_data.version = int(lines[0])
+    mat_data.name1 = lines[1]
+    mat_data.name2 = lines[2]
+    mat_data.shader1 = lines[3]
+    mat_data.shader2 = lines[4]
+
+    line_seek = 5
+    while line_seek < len(lines):
+        node_type = _line_trim(lines[line_seek])
+        if not node_type:
+            line_seek += 1
+            continue
+        if node_type == 'tex':
+            prop_name = _line_trim(lines[line_seek + 1])
+            sub_type = _line_trim(lines[line_seek + 2])
+            if sub_type == 'tex2d':
+                line_seek += 3
+                tex_name = _line_trim(lines[line_seek])
+                tex_path = _line_trim(lines[line_seek + 1])
+                tex_map = _line_trim(lines[line_seek + 2]).split(' ')
+                for map_datum in range(len(tex_map)):
+                    tex_map[map_datum] = float(tex_map[map_datum])
+                mat_data.tex_list.append([prop_name, tex_name, tex_path, tex_map[:2], tex_map[2:]])
+            else:
+                mat_data.tex_list.append([prop_name])
+
+            line_seek += 3
+
+        elif node_type == 'col':
+            prop_name = _line_trim(lines[line_seek + 1])
+            tex_map = _line_trim(lines[line_seek + 2]).split(' ')
+            for map_datum in range(len(tex_map)):
+                tex_map[map_datum] = float(tex_map[map_datum])
+
+            mat_data.col_list.append([prop_name, tex_map[:]])
+            line_seek += 3
+
+        elif node_type == 'f':
+            prop_name = _line_trim(lines[line_seek + 1])
+            val = float(_line_trim(lines[line_seek + 2]))
+
+            mat_data.f_list.append([prop_name, val])
+            line_seek += 3
+        else:
+            raise Exception('未知の設定値タイプが見つかりました。')
+
+    return mat_data
+
+
+def parse_json(text):
+    mat_data = Material()
+    mat_data.from_dict(json.loads(text))
+
+    return mat_data
@@ -0,0 +1,59 @@
+"""menuファイルの読み書き"""
+from .binary import CM3D2BinaryWriter
+from .errors import CM3D2ImportException
+
+
+class Menu():
+    """menuファイルの中身 (commands はコマンド名とパラメータの文字列リストのリスト)"""
+
+    def __init__(self, version=1000, path='', name='', category='', description='', commands=None):
+        self.version = version
+        self.path = path
+        self.name = name
+        self.category = category
+        self.description = description
+        self.commands = commands if commands is not None else []
+
+
+def read_menu(reader):
+    if reader.read_str() != 'CM3D2_MENU':
+        raise CM3D2ImportException("Not a valid CM3D2 .menu file.")
+
+    menu = Menu()
+    menu.version     = reader.read_i32()
+    menu.path        = reader.read_str()
+    menu.name        = reader.read_str()
+    menu.category    = reader.read_str()
+    menu.description = reader.read_str()
+
+    reader.read_i32()
+    string_list_length = reader.read_u8()
+    while string_list_length > 0:
+        menu.commands.append([reader.read_str() for i in range(string_list_length)])
+
+        # Check for end of file
+        if len(reader) <= reader.tell():
+            break
+        string_list_length = reader.read_u8()
+
+    return menu
+
+
+def write_menu(writer, menu):
+    writer.write_str('CM3D2_MENU')
+
+    writer.write_i32(menu.version    )
+    writer.write_str(menu.path       )
+    writer.write_str(menu.name       )
+    writer.write_str(menu.category   )
+    writer.write_str(menu.description)
+
+    body = CM3D2BinaryWriter()
+    for string_list in menu.commands:
+        body.write_u8(len(string_list))
+        for string in string_list:
+            body.write_str(string)
+    body.write_u8(0x00)
+
+    writer.write_i32(body.tell())
+    writer.write(body.getvalue())
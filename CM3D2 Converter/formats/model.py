@@ -0,0 +1,353 @@
+"""modelファイルの読み書き"""
+import numpy as np
+from .binary import CM3D2BinaryReader
+from .errors import CM3D2ImportException
+from .mate import Material
+
+
+# modelファイルの頂点/ウェイト/モーフのレイアウト
+MODEL_WEIGHT_DTYPE = np.dtype([('index', '<u2', 4), ('value', '<f4', 4)])
+
+def model_vertex_dtype(model_ver, extra_uv_uses=()):
+    fields = [('co', '<f4', 3), ('normal', '<f4', 3), ('uv', '<f4', 2)]
+    extra_uv_count = sum(1 for used in extra_uv_uses if used) if model_ver >= 2102 else 0
+    if extra_uv_count:
+        fields.append(('extra_uvs', '<f4', (extra_uv_count, 2)))
+    return np.dtype(fields)
+
+def model_morph_dtype(morph_extra_uvs=False):
+    fields = [('index', '<u2'), ('co', '<f4', 3), ('normal', '<f4', 3)]
+    if morph_extra_uvs:
+        fields.append(('color', '<f4', 4))
+    return np.dtype(fields)
+
+
+class ModelReader:
+    """modelファイルをセクション単位で読み込むクラス
+
+    Bone positions and rotations are (x, y, z) and (w, x, y, z) tuples and local
+    bone matrices are nested 4x4 lists. The file is memory-mapped and the byte offset of each section is recorded the
+    first time it is located. Bones, local bones and materials have to be parsed to
+    find where the next section starts; the vertex, weight and face blocks are
+    skipped by size and only decoded when they are accessed.
+    """
+    SECTIONS = ('header', 'bones', 'local_bones', 'vertices', 'weights', 'faces', 'materials', 'morphs')
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._reader = CM3D2BinaryReader.open(filepath)
+        self.offsets = {'header': 0}
+        self._cache = {}
+        try:
+            self._section('header')
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._reader.close()
+
+    def tell(self):
+        return self._reader.tell()
+
+    @property
+    def version(self):
+        return self._section('header')['version']
+
+    @property
+    def name(self):
+        return self._section('header')['name']
+
+    @property
+    def base_bone(self):
+        return self._section('header')['base_bone']
+
+    @property
+    def bones(self):
+        return self._section('bones')
+
+    @property
+    def local_bones(self):
+        return self._section('local_bones')
+
+    @property
+    def vertex_count(self):
+        self._section('local_bones')
+        return self._cache['counts'][0]
+
+    @property
+    def mesh_count(self):
+        self._section('local_bones')
+        return self._cache['counts'][1]
+
+    @property
+    def extra_uv_uses(self):
+        if 'extra_uv_uses' not in self._cache:
+            self._read_extra_uv_uses(self._seek('vertices'))
+        return self._cache['extra_uv_uses']
+
+    @property
+    def vertices(self):
+        return self._section('vertices')
+
+    @property
+    def weights(self):
+        return self._section('weights')
+
+    @property
+    def faces(self):
+        """面の頂点番号 (ファイル上の順序のまま) のメッシュごとのリスト"""
+        return self._section('faces')
+
+    @property
+    def materials(self):
+        return self._section('materials')
+
+    @property
+    def morphs(self):
+        return self._section('morphs')
+
+    @property
+    def morph_names(self):
+        if 'morphs' in self._cache:
+            return [morph['name'] for morph in self._cache['morphs']]
+        if 'morph_names' not in self._cache:
+            self._cache['morph_names'] = [morph['name'] for morph in self._read_morphs(self._seek('morphs'), read_data=False)]
+        return self._cache['morph_names']
+
+    def read_all(self):
+        """全セクションを読み込む (この後はファイルを閉じても参照できる)"""
+        self.extra_uv_uses
+        for name in self.SECTIONS:
+            self._section(name)
+        return self
+
+    def _section(self, name):
+        if name not in self._cache:
+            reader = self._seek(name)
+            self._cache[name] = getattr(self, '_read_' + name)(reader)
+            self._set_next_offset(name, reader.tell())
+        return self._cache[name]
+
+    def _seek(self, name):
+        index = self.SECTIONS.index(name)
+        for prev_name in self.SECTIONS[:index]:
+            next_name = self.SECTIONS[self.SECTIONS.index(prev_name) + 1]
+            if next_name in self.offsets:
+                continue
+            skip = getattr(self, '_skip_' + prev_name, None)
+            if skip and prev_name not in self._cache:
+                self._reader.seek(self.offsets[prev_name])
+                skip(self._reader)
+                self._set_next_offset(prev_name, self._reader.tell())
+            else:
+                self._section(prev_name)
+        self._reader.seek(self.offsets[name])
+        return self._reader
+
+    def _set_next_offset(self, name, offset):
+        index = self.SECTIONS.index(name) + 1
+        if index < len(self.SECTIONS):
+            self.offsets.setdefault(self.SECTIONS[index], offset)
+
+    def _read_header(self, reader):
+        try: # luvoid : utf-8 decoding could possibly throw an error here
+            ext = reader.read_str()
+        except:
+            ext = None
+        if ext != 'CM3D2_MESH':
+            raise CM3D2ImportException("これはカスタムメイド3D2のモデルファイルではありません")
+        version = reader.read_i32()
+        name = reader.read_str()
+        base_bone = reader.read_str()
+        return {'version': version, 'name': name, 'base_bone': base_bone}
+
+    def _read_bones(self, reader):
+        bone_data = []
+        bone_count = reader.read_i32()
+        for i in range(bone_count):
+            name = reader.read_str()
+            unknown = reader.read_u8()
+            bone_data.append({'name': name, 'unknown': unknown})
+
+        parents_position = reader.tell()
+        for i, parent_index in enumerate(reader.read_i32s(bone_count)):
+            parent_name = None
+            if parent_index != -1:
+                if not 0 <= parent_index < bone_count:
+                    raise reader.error(f"Bone {i} has an invalid parent index {parent_index} ({bone_count} bones)", parents_position + i * 4)
+                parent_name = bone_data[parent_index]['name']
+            bone_data[i]['parent_index'] = parent_index
+            bone_data[i]['parent_name'] = parent_name
+
+        for i in range(bone_count):
+            x, y, z, rx, ry, rz, rw = reader.read_f32s(7)
+            bone_data[i]['co'] = (x, y, z)
+            bone_data[i]['rot'] = (rw, rx, ry, rz)
+            if self.version >= 2001:
+                use_scale = reader.read_u8()
+                if use_scale:
+                    bone_data[i]['scale'] = list(reader.read_f32s(3))
+        return bone_data
+
+    def _read_local_bones(self, reader):
+        vertex_count, mesh_count, local_bone_count = reader.read_i32s(3)
+        self._cache['counts'] = (vertex_count, mesh_count, local_bone_count)
+
+        local_bone_data = []
+        for i in range(local_bone_count):
+            local_bone_data.append({'name': reader.read_str()})
+
+        matrices = reader.read_f32_array(local_bone_count * 16).reshape(local_bone_count, 4, 4).tolist()
+        for i in range(local_bone_count):
+            local_bone_data[i]['matrix'] = matrices[i]
+        return local_bone_data
+
+    def _read_extra_uv_uses(self, reader):
+        extra_uv_uses = [False] * 7
+        if self.version >= 2102: # CR Edit Mode
+            extra_uv_uses = reader.read_struct('<7?')
+        self._cache['extra_uv_uses'] = extra_uv_uses
+        return extra_uv_uses
+
+    def _read_vertices(self, reader):
+        # co, normal, uv (, extra_uvs) are interleaved per vertex, so the whole block is one structured array
+        vertex_dtype = model_vertex_dtype(self.version, self._read_extra_uv_uses(reader))
+        vertex_data = reader.read_array(vertex_dtype, self.vertex_count)
+        unknown_count = reader.read_i32()
+        reader.skip(unknown_count * 4 * 4)
+        return vertex_data
+
+    def _skip_vertices(self, reader):
+        vertex_dtype = model_vertex_dtype(self.version, self._read_extra_uv_uses(reader))
+        reader.skip(vertex_dtype.itemsize * self.vertex_count)
+        unknown_count = reader.read_i32()
+        reader.skip(unknown_count * 4 * 4)
+
+    def _read_weights(self, reader):
+        return reader.read_array(MODEL_WEIGHT_DTYPE, self.vertex_count)
+
+    def _skip_weights(self, reader):
+        reader.skip(MODEL_WEIGHT_DTYPE.itemsize * self.vertex_count)
+
+    def _read_faces(self, reader):
+        face_data = []
+        for i in range(self.mesh_count):
+            face_count = int(reader.read_i32() / 3)
+            face_data.append(reader.read_array('<u2', face_count * 3).reshape(face_count, 3))
+        return face_data
+
+    def _skip_faces(self, reader):
+        for i in range(self.mesh_count):
+            index_count = reader.read_i32()
+            reader.skip(index_count * 2)
+
+    def _read_materials(self, reader):
+        material_data = []
+        material_count = reader.read_i32()
+        for i in range(material_count):
+            mat_data = Material()
+            mat_data.version = self.version
+            mat_data.read(reader, read_header=False)
+            material_data.append(mat_data)
+        return material_data
+
+    def _read_morphs(self, reader, read_data=True):
+        misc_data = []
+        while True:
+            data_type = reader.read_str()
+            if data_type == 'morph':
+                misc_item = {'type': data_type}
+                misc_data.append(misc_item)
+                misc_item['name'] = reader.read_str()
+                morph_vert_count = reader.read_i32()
+                morph_extra_uvs = False
+                if self.version >= 2102: # CR Edit Mode
+                    morph_extra_uvs = reader.read_bool()
+                    misc_item['uvs'] = []
+                morph_dtype = model_morph_dtype(morph_extra_uvs)
+                if read_data:
+                    misc_item['data'] = reader.read_array(morph_dtype, morph_vert_count)
+                else:
+                    reader.skip(morph_dtype.itemsize * morph_vert_count)
+            else:
+                break
+        return misc_data
+
+
+def write_model(writer, version, name, base_bone, bones, local_bones, vertices, tangents, weights, faces, materials, morphs=()):
+    """modelファイルを CM3D2BinaryWriter に書き込む
+
+    bones are dicts with name, unknown, parent_index, co (x, y, z), rot (w, x, y, z)
+    and an optional scale; local_bones are dicts with name and a flat 16-float matrix.
+    vertices and weights are model_vertex_dtype / MODEL_WEIGHT_DTYPE arrays, tangents
+    is an (N, 4) array or None, faces is one flat index array per material and morphs is a
+    list of (name, model_morph_dtype array).
+    """
+    # ファイル先頭
+    writer.write_str('CM3D2_MESH')
+    writer.write_i32(version)
+
+    writer.write_str(name)
+    writer.write_str(base_bone)
+
+    # ボーン情報書き出し
+    writer.write_i32(len(bones))
+    for bone in bones:
+        writer.write_str(bone['name'])
+        writer.write_struct('<b', bone['unknown'])
+    writer.write_i32s([bone['parent_index'] for bone in bones])
+    for bone in bones:
+        writer.write_f32s((bone['co'][0], bone['co'][1], bone['co'][2], bone['rot'][1], bone['rot'][2], bone['rot'][3], bone['rot'][0]))
+        if version >= 2001:
+            use_scale = ('scale' in bone)
+            writer.write_struct('<b', use_scale)
+            if use_scale:
+                bone_scale = bone['scale']
+                writer.write_f32s((bone_scale[0], bone_scale[1], bone_scale[2]))
+
+    writer.write_i32s((len(vertices), len(faces)))
+
+    # ローカルボーン情報を書き出し
+    writer.write_i32(len(local_bones))
+    for bone in local_bones:
+        writer.write_str(bone['name'])
+    for bone in local_bones:
+        writer.write_f32s(bone['matrix'])
+
+    # 頂点情報を書き出し
+    writer.write_array(vertices)
+
+    # 接空間情報を書き出し
+    if tangents is not None:
+        writer.write_i32(len(tangents))
+        writer.write_array(np.asarray(tangents, dtype='<f4'))
+    else:
+        writer.write_i32(0)
+
+    # ウェイト情報を書き出し
+    writer.write_array(weights)
+
+    # 面情報を書き出し
+    for tris in faces:
+        writer.write_i32(len(tris))
+        writer.write_array(np.asarray(tris, dtype='<u2'))
+
+    # マテリアルを書き出し
+    writer.write_i32(len(materials))
+    for mat_data in materials:
+        mat_data.write(writer, write_header=False)
+
+    # モーフを書き出し
+    for morph_name, morph in morphs:
+        writer.write_str('morph')
+        writer.write_str(morph_name)
+        writer.write_i32(len(morph))
+        writer.write_array(morph)
+    writer.write_str('end')
@@ -0,0 +1,66 @@
+"""texファイル (テクスチャ) の読み書き"""
+import struct
+from .binary import CM3D2BinaryError
+
+BASE_PATH_TEX = "Assets/texture/texture/"
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def png_size(data):
+    """PNGのIHDRチャンクから (width, height) を返す (PNGでなければ None)"""
+    if data[:8] != PNG_SIGNATURE or data[12:16] != b'IHDR':
+        return None
+    return struct.unpack_from('>2I', data, 16)
+
+
+class Texture():
+    """texファイルの中身 (data はPNG等の画像ファイルそのもの)"""
+
+    def __init__(self, version=1010, path='', data=None, tex_format=5, uv_rects=None, width=0, height=0):
+        self.version = version
+        self.path = path
+        self.tex_format = tex_format
+        # x, y, w, h
+        self.uv_rects = uv_rects
+        self.width = width
+        self.height = height
+        self.data = data
+
+
+def read_tex(reader, skip_data=False):
+    """texファイルを読み込む (texファイルでなければ None を返す)"""
+    try:
+        header_ext = reader.read_str()
+    except (CM3D2BinaryError, UnicodeDecodeError):
+        return None
+    if header_ext != 'CM3D2_TEX':
+        return None
+    texture = Texture(version=reader.read_i32(), path=reader.read_str())
+
+    if texture.version >= 1010:
+        if texture.version >= 1011:
+            num_rect = reader.read_i32()
+            texture.uv_rects = [tuple(rect) for rect in reader.read_f32_array(num_rect * 4).reshape(num_rect, 4).tolist()]
+        texture.width, texture.height, texture.tex_format = reader.read_i32s(3)
+    if not skip_data:
+        data_size = reader.read_i32()
+        texture.data = reader.read_bytes(data_size)
+        if texture.version < 1010:
+            # 古いtexにはサイズが無いのでPNGから取得
+            texture.width, texture.height = png_size(texture.data) or (0, 0)
+    return texture
+
+
+def write_tex(writer, texture):
+    writer.write_str('CM3D2_TEX')
+    writer.write_i32(texture.version)
+    writer.write_str(texture.path)
+    if texture.version >= 1010:
+        if texture.version >= 1011:
+            uv_rects = texture.uv_rects or ()
+            writer.write_i32(len(uv_rects))
+            for uv_rect in uv_rects:
+                writer.write_f32s((uv_rect[0], uv_rect[1], uv_rect[2], uv_rect[3]))
+        writer.write_i32s((texture.width, texture.height, texture.tex_format))
+    writer.write_i32(len(texture.data))
+    writer.write(texture.data)
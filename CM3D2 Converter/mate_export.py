@@ -62,7 +62,7 @@ class CNV_OT_export_cm3d2_mate(bpy.types.Operator):
             return {'CANCELLED'}
 
         try:
-            with writer:
+            with writer, common.CM3D2BinaryWriter(writer) as mate_writer:
                 mate = context.material
                 if compat.IS_LEGACY:
                     mat_data = cm3d2_data.MaterialHandler.parse_mate_old(mate, remove_serial=True)
@@ -73,7 +73,7 @@ class CNV_OT_export_cm3d2_mate(bpy.types.Operator):
                 mat_data.name1 = self.name1
                 mat_data.name2 = self.name2
 
-                mat_data.write(writer)
+                mat_data.write(mate_writer)
 
         except common.CM3D2ExportException as e:
             self.report(type={'ERROR'}, message=str(e))
@@ -157,8 +157,8 @@ class CNV_OT_export_cm3d2_mate_text(bpy.types.Operator):
             return {'CANCELLED'}
 
         try:
-            with file:
-                mat_data.write(file, write_header=True)
+            with file, common.CM3D2BinaryWriter(file) as writer:
+                mat_data.write(writer, write_header=True)
         except Exception as e:
             self.report(type={'ERROR'}, message="mateファイルの出力に失敗、中止します。 構文を見直して下さい。" + str(e))
             return {'CANCELLED'}
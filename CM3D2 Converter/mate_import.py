@@ -50,7 +50,7 @@ class CNV_OT_import_cm3d2_mate(bpy.types.Operator):
         prefs.mate_import_path = self.filepath
 
         try:
-            file = open(self.filepath, 'rb')
+            file = common.CM3D2BinaryReader.open(self.filepath)
         except:
             self.report(type={'ERROR'}, message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", self.filepath))
             return {'CANCELLED'}
@@ -70,10 +70,12 @@ class CNV_OT_import_cm3d2_mate(bpy.types.Operator):
         context.material_slot.material = mate
         common.setup_material(mate)
 
+        tex_session = common.TexLookupSession()
         if compat.IS_LEGACY:
-            cm3d2_data.MaterialHandler.apply_to_old(context, mate, mat_data, prefs.is_replace_cm3d2_tex, self.is_decorate, prefs.mate_unread_same_value)
+            cm3d2_data.MaterialHandler.apply_to_old(context, mate, mat_data, prefs.is_replace_cm3d2_tex, self.is_decorate, prefs.mate_unread_same_value, tex_session=tex_session)
         else:
-            cm3d2_data.MaterialHandler.apply_to(context, mate, mat_data, prefs.is_replace_cm3d2_tex)
+            cm3d2_data.MaterialHandler.apply_to(context, mate, mat_data, prefs.is_replace_cm3d2_tex, tex_session=tex_session)
+        tex_session.report_unresolved(self)
 
         return {'FINISHED'}
 
@@ -120,7 +122,7 @@ class CNV_OT_import_cm3d2_mate_text(bpy.types.Operator):
             edit_text.clear()
 
         try:
-            file = open(self.filepath, 'rb')
+            file = common.CM3D2BinaryReader.open(self.filepath)
         except:
             self.report(type={'ERROR'}, message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", self.filepath))
             return {'CANCELLED'}
@@ -140,10 +142,12 @@ class CNV_OT_import_cm3d2_mate_text(bpy.types.Operator):
         context.material_slot.material = mate
         common.setup_material(mate)
 
+        tex_session = common.TexLookupSession()
         if compat.IS_LEGACY:
-            cm3d2_data.MaterialHandler.apply_to_old(context, mate, mat_data, prefs.is_replace_cm3d2_tex, self.is_decorate, prefs.mate_unread_same_value)
+            cm3d2_data.MaterialHandler.apply_to_old(context, mate, mat_data, prefs.is_replace_cm3d2_tex, self.is_decorate, prefs.mate_unread_same_value, tex_session=tex_session)
         else:
-            cm3d2_data.MaterialHandler.apply_to(context, mate, mat_data, prefs.is_replace_cm3d2_tex)
+            cm3d2_data.MaterialHandler.apply_to(context, mate, mat_data, prefs.is_replace_cm3d2_tex, tex_session=tex_session)
+        tex_session.report_unresolved(self)
 
         if not edit_text:
             edit_text = context.blend_data.texts.new(os.path.basename(mat_data.name))
@@ -137,9 +137,12 @@ class CM3D2MENU_OT_import(bpy.types.Operator):
     def execute(self, context):
         ob = context.object
         try:
-            file = open(self.filepath, 'rb')
-            ob.cm3d2_menu.clear()
-            ob.cm3d2_menu.unpack_from_file(file)
+            with common.CM3D2BinaryReader.open(self.filepath) as reader:
+                ob.cm3d2_menu.clear()
+                ob.cm3d2_menu.unpack_from_file(reader)
+        except (common.CM3D2ImportException, common.CM3D2BinaryError, UnicodeDecodeError) as e:
+            self.report(type={'ERROR'}, message=str(e))
+            return {'CANCELLED'}
         except IOError as e:
             self.report(type={'ERROR'}, message=e.args[0])
             return {'CANCELLED'}
@@ -183,8 +186,8 @@ class CM3D2MENU_OT_export(bpy.types.Operator):
     def execute(self, context):
         ob = context.object
         try:
-            file = common.open_temporary(self.filepath, 'wb', is_backup=self.is_backup)
-            ob.cm3d2_menu.pack_into_file(file)
+            with common.open_temporary(self.filepath, 'wb', is_backup=self.is_backup) as file, common.CM3D2BinaryWriter(file) as writer:
+                ob.cm3d2_menu.pack_into_file(writer)
         except IOError as e:
             self.report(type={'ERROR'}, message=e.args[0])
             return {'CANCELLED'}
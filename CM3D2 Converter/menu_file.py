@@ -1,9 +1,9 @@
 import bpy
 import math
 import mathutils
-import struct
 from . import common
 from . import compat
+from .formats import menu
 from .translations.pgettext_functions import *
 
 
@@ -207,7 +207,7 @@ class CM3D2MenuCommand():
             return _f
 
         cls.parse_list = catch_throw_wrap(cls.parse_list, "parsing", ValueError)
-        cls.pack_into  = catch_throw_wrap(cls.pack_into , "packing", ValueError)
+        cls.to_list    = catch_throw_wrap(cls.to_list   , "packing", ValueError)
 
         return cls
 
@@ -244,18 +244,17 @@ class CM3D2MENU_PG_AttachPointCommand(bpy.types.PropertyGroup):
         self.rotation.y = float(string_list[6]) * math.pi/180
         self.rotation.z = float(string_list[7]) * math.pi/180
     
-    def pack_into(self, buffer):
-        buffer = buffer + struct.pack('<B', 1 + 1 + 3 + 3)
-        buffer = common.pack_str(buffer, self.command   )
-        buffer = common.pack_str(buffer, self.point_name)
-        buffer = common.pack_str(buffer, str(self.location.x)              )
-        buffer = common.pack_str(buffer, str(self.location.y)              )
-        buffer = common.pack_str(buffer, str(self.location.z)              )
-        buffer = common.pack_str(buffer, str(self.rotation.x * 180/math.pi))
-        buffer = common.pack_str(buffer, str(self.rotation.y * 180/math.pi))
-        buffer = common.pack_str(buffer, str(self.rotation.z * 180/math.pi))
-
-        return buffer
+    def to_list(self):
+        return [
+            self.command                    ,
+            self.point_name                 ,
+            str(self.location.x)              ,
+            str(self.location.y)              ,
+            str(self.location.z)              ,
+            str(self.rotation.x * 180/math.pi),
+            str(self.rotation.y * 180/math.pi),
+            str(self.rotation.z * 180/math.pi),
+        ]
 
     def draw(self, context, layout):
         layout.label(text=self.name)
@@ -292,13 +291,12 @@ class CM3D2MENU_PG_PropertyCommand(bpy.types.PropertyGroup):
         self.prop_name  = string_list[1]
         self.value      = float(string_list[2])
     
-    def pack_into(self, buffer):
-        buffer = buffer + struct.pack('<B', 1 + 1 + 1)
-        buffer = common.pack_str(buffer, self.command    )
-        buffer = common.pack_str(buffer, self.prop_name  )
-        buffer = common.pack_str(buffer, str(self.value) )
-
-        return buffer
+    def to_list(self):
+        return [
+            self.command    ,
+            self.prop_name  ,
+            str(self.value) ,
+        ]
 
     def draw(self, context, layout):
         col = layout.column()
@@ -349,12 +347,8 @@ class CM3D2MENU_PG_MiscCommand(bpy.types.PropertyGroup):
             new_param.value = param
             new_param.name  = param
 
-    def pack_into(self, buffer):
-        buffer = buffer + struct.pack('<B', 1 + len(self.params))
-        buffer = common.pack_str(buffer, self.command)
-        for param in self.params:
-            buffer = common.pack_str(buffer, param.value)
-        return buffer
+    def to_list(self):
+        return [self.command] + [param.value for param in self.params]
     
     def draw(self, context, layout):
         enum_info = get_command_enum_info(self.command)
@@ -506,56 +500,35 @@ class OBJECT_PG_CM3D2Menu(bpy.types.PropertyGroup):
         new_command = self.new_command(command)
         new_command.parse_list(string_list)
 
-    def unpack_from_file(self, file):
-        if common.read_str(file) != 'CM3D2_MENU':
-            raise IOError("Not a valid CM3D2 .menu file.")
+    def unpack_from_file(self, reader):
+        menu_data = menu.read_menu(reader)
 
-        self.version      = struct.unpack('<i', file.read(4))[0]
-        self.path         = common.read_str(file)
-        self.name         = common.read_str(file)
-        self.category     = common.read_str(file)
-        self.description  = common.read_str(file)
+        self.version      = menu_data.version
+        self.path         = menu_data.path
+        self.name         = menu_data.name
+        self.category     = menu_data.category
+        self.description  = menu_data.description
         
-        struct.unpack('<i', file.read(4))[0]
-        string_list = []
-        string_list_length = struct.unpack('<B', file.read(1))[0]
-        while string_list_length > 0:
-            string_list.clear()
-
-            for i in range(string_list_length):
-                string_list.append(common.read_str(file))
-            
+        for string_list in menu_data.commands:
             try:
                 self.parse_list(string_list)
             except ValueError as e:
                 print(e)
-            
-            # Check for end of file
-            chunk = file.read(1)
-            if len(chunk) == 0:
-                break
-            string_list_length = struct.unpack('<B', chunk)[0]
 
         self.update()
     
-    def pack_into_file(self, file):
+    def pack_into_file(self, writer):
         self.update()
 
-        common.write_str(file, 'CM3D2_MENU')
-
-        file.write(struct.pack('<i', self.version    ))
-        common.write_str(file,       self.path       )
-        common.write_str(file,       self.name       )
-        common.write_str(file,       self.category   )
-        common.write_str(file,       self.description)
-                    
-        buffer = bytearray()
-        for command_pointer in self.commands:
-            buffer = command_pointer.dereference(self).pack_into(buffer)
-        buffer = buffer + struct.pack('<B', 0x00)
-        
-        file.write(struct.pack('<i', len(buffer)))
-        file.write(bytes(buffer))
+        menu_data = menu.Menu(
+            version     = self.version    ,
+            path        = self.path       ,
+            name        = self.name       ,
+            category    = self.category   ,
+            description = self.description,
+            commands    = [command_pointer.dereference(self).to_list() for command_pointer in self.commands]
+        )
+        menu.write_menu(writer, menu_data)
 
     def clear(self):
         self.property_unset('version'    )
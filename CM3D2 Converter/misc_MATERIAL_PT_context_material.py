@@ -587,7 +587,9 @@ class new_mate_opr():
             f_list.append(_RimPower)
             f_list.append(_RimShift)
         
-        texpath_dict = common.get_texpath_dict()
+        tex_session = common.TexLookupSession()
+        if prefs.is_replace_cm3d2_tex:
+            tex_session.resolve_all([data[1] for data in tex_list])
         slot_index = 0
         
         for data in tex_list:
@@ -600,7 +602,7 @@ class new_mate_opr():
 
             # tex探し
             if prefs.is_replace_cm3d2_tex:
-                replaced = common.replace_cm3d2_tex(tex.image, texpath_dict=texpath_dict, reload_path=False)
+                replaced = tex_session.replace(tex.image)
                 if compat.IS_LEGACY and replaced and key == '_MainTex':
                     for face in me.polygons:
                         if face.material_index == ob.active_material_index:
@@ -624,6 +626,7 @@ class new_mate_opr():
             cm3d2_data.align_nodes(mate)
             common.decorate_material(mate, self.is_decorate, me, ob.active_material_index)
 
+        tex_session.report_unresolved(self)
         return {'FINISHED'}
 
 
@@ -715,10 +718,12 @@ class CNV_OT_paste_material(bpy.types.Operator):
                     mate.name = mate_name
 
         prefs = common.preferences()
+        tex_session = common.TexLookupSession()
         if compat.IS_LEGACY:
-            cm3d2_data.MaterialHandler.apply_to_old(context, mate, mat_data, prefs.is_replace_cm3d2_tex, self.is_decorate)
+            cm3d2_data.MaterialHandler.apply_to_old(context, mate, mat_data, prefs.is_replace_cm3d2_tex, self.is_decorate, tex_session=tex_session)
         else:
-            cm3d2_data.MaterialHandler.apply_to(context, mate, mat_data, prefs.is_replace_cm3d2_tex)
+            cm3d2_data.MaterialHandler.apply_to(context, mate, mat_data, prefs.is_replace_cm3d2_tex, tex_session=tex_session)
+        tex_session.report_unresolved(self)
 
         self.report(type={'INFO'}, message="クリップボードからマテリアルを貼付けました")
         return {'FINISHED'}
@@ -457,18 +457,12 @@ class CNV_OT_set_default_toon_textures_old(bpy.types.Operator):
         dirname = os.path.dirname(bpy.path.abspath(img.filepath))
         png_path = os.path.join(dirname, self.name + ".png")
         tex_path = os.path.join(dirname, self.name + ".tex")
-        if not os.path.exists(png_path):
-            if os.path.exists(tex_path):
-                tex_data = common.load_cm3d2tex(tex_path)
-                if tex_data is None:
-                    return {'CANCELLED'}
-                tex_format = tex_data[1]
-                if not (tex_format == 3 or tex_format == 5):
-                    return {'CANCELLED'}
-                with open(png_path, 'wb') as png_file:
-                    png_file.write(tex_data[-1])
-        img.filepath = png_path
-        img.reload()
+        if not os.path.exists(png_path) and os.path.exists(tex_path):
+            if not common.load_cm3d2tex_image(img, tex_path):
+                return {'CANCELLED'}
+        else:
+            img.filepath = png_path
+            img.reload()
 
         if 'cm3d2_path' not in img:
             img['cm3d2_path'] = common.get_tex_cm3d2path(img.filepath)
@@ -1,24 +1,442 @@
-import struct
+import os
+import json
 import time
 import math
+import hashlib
+import concurrent.futures
 import bpy
-import bmesh
 import mathutils
-from operator import itemgetter
+import numpy as np
 from . import common
 from . import compat
 from . import cm3d2_data
+from .formats import model
 from .translations.pgettext_functions import *
 
 
-# メインオペレーター
-@compat.BlRegister()
-class CNV_OT_export_cm3d2_model(bpy.types.Operator):
-    bl_idname = 'export_mesh.export_cm3d2_model'
-    bl_label = "CM3D2モデル (.model)"
-    bl_description = "カスタムメイド3D2のmodelファイルを書き出します"
-    bl_options = {'REGISTER'}
+# エクスポートするメッシュの配列データ
+class ExportMesh:
+    """Array data of the mesh to export, gathered from one or more objects.
+
+    Objects after the first are transformed into the first object's space and
+    merged like Object > Join does: materials, vertex groups and shape keys are
+    matched by identity/name, and parts without a shape key use their basis.
+
+    co, normals          : vertex coordinates and normals (V, 3)
+    loop_vertices        : vertex of every loop
+    loop_uvs             : UV of every loop in the first object's active UV map (L, 2)
+    loop_ranks           : order of the loops around their vertex (see common.link_loop_ranks)
+    loop_normals         : split normals (L, 3) if any part has custom normals (vertex
+                           normals for the other parts), else None
+    loop_tangents        : MikkTSpace tangents (L, 3) and loop_bitangent_signs, or None
+    face_loop_starts, face_loop_totals, face_material_indices
+    materials            : merged material list
+    group_names          : merged vertex group names
+    weight_vertices, weight_groups, weight_values : vertex group memberships
+    shape_keys           : list of (name, co, normals) except the basis
+    """
+    def __init__(self, ob, use_tangents=False):
+        self.ob = ob
+        self.use_tangents = use_tangents
+        self.is_evaluated = False
+        self.materials = [slot.material for slot in ob.material_slots]
+        self.group_names = []
+        self.uv_name = ob.data.uv_layers.active.name
+        self.tangent_error = None
+        self.warnings = []
+        self._parts = []
+
+    def add_mesh(self, ob, me, key_shapes=None, loop_normals=None, is_temporary=True):
+        """メッシュの配列データを追加 (key_shapes が None ならシェイプキーから読む)
+
+        loop_normals を渡すとカスタム法線として使う.
+        is_temporary でない (ユーザーの) メッシュは、分割法線や接空間を一時的なコピーで計算する.
+        """
+        vert_count = len(me.vertices)
+        loop_count = len(me.loops)
+        face_count = len(me.polygons)
+        part = {}
+
+        co = np.empty((vert_count, 3), dtype=np.float32)
+        normals = np.empty((vert_count, 3), dtype=np.float32)
+        me.vertices.foreach_get('co', co.ravel())
+        me.vertices.foreach_get('normal', normals.ravel())
+        part['loop_vertices'] = np.empty(loop_count, dtype=np.int32)
+        me.loops.foreach_get('vertex_index', part['loop_vertices'])
+        part['loop_uvs'] = np.zeros((loop_count, 2), dtype=np.float32)
+        uv_layer = me.uv_layers.get(self.uv_name)
+        if uv_layer:
+            uv_layer.data.foreach_get('uv', part['loop_uvs'].ravel())
+        part['loop_ranks'] = common.link_loop_ranks(me, part['loop_vertices'], part['loop_uvs'])
+
+        # 分割法線はカスタム法線がある場合だけ、接空間はMikkTSpaceで出力する場合だけ計算する
+        part['has_custom_normals'] = loop_normals is not None or me.has_custom_normals
+        part['loop_normals'] = loop_normals
+        use_tangents = self.use_tangents and self.tangent_error is None
+        calc_me = me
+        if not is_temporary and (use_tangents or loop_normals is None and me.has_custom_normals):
+            calc_me = me.copy()
+        try:
+            if loop_normals is None and me.has_custom_normals:
+                calc_me.calc_normals_split()
+                part['loop_normals'] = np.empty((loop_count, 3), dtype=np.float32)
+                calc_me.loops.foreach_get('normal', part['loop_normals'].ravel())
+
+            if use_tangents:
+                try:
+                    if not uv_layer:
+                        raise RuntimeError(f_tip_("UV map \"{name}\" not found in {object}", name=self.uv_name, object=ob.name))
+                    calc_me.calc_tangents(uvmap=uv_layer.name)
+                    part['loop_tangents'] = np.empty((loop_count, 3), dtype=np.float32)
+                    part['loop_bitangent_signs'] = np.empty(loop_count, dtype=np.float32)
+                    calc_me.loops.foreach_get('tangent', part['loop_tangents'].ravel())
+                    calc_me.loops.foreach_get('bitangent_sign', part['loop_bitangent_signs'])
+                    calc_me.free_tangents()
+                except RuntimeError as e:
+                    self.tangent_error = str(e)
+        finally:
+            if calc_me is not me:
+                common.remove_data(calc_me)
+
+        part['face_loop_starts'] = np.empty(face_count, dtype=np.int64)
+        part['face_loop_totals'] = np.empty(face_count, dtype=np.int64)
+        material_indices = np.empty(face_count, dtype=np.int64)
+        me.polygons.foreach_get('loop_start', part['face_loop_starts'])
+        me.polygons.foreach_get('loop_total', part['face_loop_totals'])
+        me.polygons.foreach_get('material_index', material_indices)
+
+        # マテリアルとグループは同じものに合わせ、無ければ追加する
+        if ob == self.ob:
+            part['face_material_indices'] = material_indices
+        else:
+            material_map = []
+            for slot in ob.material_slots:
+                if slot.material not in self.materials:
+                    self.materials.append(slot.material)
+                material_map.append(self.materials.index(slot.material))
+            material_map = np.array(material_map + [-1], dtype=np.int64)
+            part['face_material_indices'] = material_map[np.minimum(material_indices, len(material_map) - 1)]
+        group_map = []
+        for vertex_group in ob.vertex_groups:
+            if vertex_group.name not in self.group_names:
+                self.group_names.append(vertex_group.name)
+            group_map.append(self.group_names.index(vertex_group.name))
+
+        weight_vertices, weight_groups, weight_values = [], [], []
+        for vert in me.vertices:
+            for vg in vert.groups:
+                # Apparently a vertex can be assigned to a non-existent group.
+                if vg.group < len(group_map):
+                    weight_vertices.append(vert.index)
+                    weight_groups.append(group_map[vg.group])
+                    weight_values.append(vg.weight)
+        part['weight_vertices'] = np.array(weight_vertices, dtype=np.int64)
+        part['weight_groups'] = np.array(weight_groups, dtype=np.int64)
+        part['weight_values'] = np.array(weight_values, dtype=np.float64)
+
+        if key_shapes is None:
+            key_shapes = []
+            if me.shape_keys:
+                for shape_key in me.shape_keys.key_blocks[1:]:
+                    key_co = np.empty((vert_count, 3), dtype=np.float32)
+                    shape_key.data.foreach_get('co', key_co.ravel())
+                    key_normals = np.array(shape_key.normals_vertex_get(), dtype=np.float32).reshape(-1, 3)
+                    key_shapes.append((shape_key.name, key_co, key_normals))
+
+        # 先頭のオブジェクトの空間へ変換
+        if ob != self.ob:
+            matrix = np.array(compat.mul(self.ob.matrix_world.inverted(), ob.matrix_world), dtype=np.float64)
+            normal_matrix = np.linalg.inv(matrix[:3, :3])
+
+            def transform_co(x):
+                return (x @ matrix[:3, :3].T + matrix[:3, 3]).astype(np.float32)
+
+            def transform_normal(x):
+                x = x @ normal_matrix
+                length = np.linalg.norm(x, axis=1)[:, np.newaxis]
+                return np.divide(x, length, out=np.zeros_like(x), where=length > 0).astype(np.float32)
+
+            co, normals = transform_co(co), transform_normal(normals)
+            if part['loop_normals'] is not None:
+                part['loop_normals'] = transform_normal(part['loop_normals'])
+            if 'loop_tangents' in part:
+                part['loop_tangents'] = (part['loop_tangents'] @ matrix[:3, :3].T).astype(np.float32)
+            key_shapes = [(name, transform_co(key_co), transform_normal(key_normals)) for name, key_co, key_normals in key_shapes]
+
+        part['co'] = co
+        part['normals'] = normals
+        part['key_shapes'] = {name: (key_co, key_normals) for name, key_co, key_normals in key_shapes}
+        part['key_names'] = [name for name, key_co, key_normals in key_shapes]
+        self._parts.append(part)
+
+    def add_evaluated_object(self, context, ob, custom_normal_blend=0.0):
+        """モディファイア適用後のメッシュを追加 (データブロックは作らない)
+
+        Blender can only evaluate one shape at a time, so with enabled modifiers
+        every shape key that differs from the basis costs one more evaluation of
+        the modifier stack. Keys equal to the basis reuse the basis result, and
+        without enabled modifiers the keys are read straight from the mesh.
+        """
+        self.is_evaluated = True
+        depsgraph = context.evaluated_depsgraph_get()
+
+        def evaluated_mesh():
+            depsgraph.update()
+            eval_ob = ob.evaluated_get(depsgraph)
+            return eval_ob, eval_ob.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph)
+
+        def read_shape(me):
+            key_co = np.empty((len(me.vertices), 3), dtype=np.float32)
+            key_normals = np.empty((len(me.vertices), 3), dtype=np.float32)
+            me.vertices.foreach_get('co', key_co.ravel())
+            me.vertices.foreach_get('normal', key_normals.ravel())
+            return key_co, key_normals
+
+        shape_keys = ob.data.shape_keys
+        key_blocks = shape_keys.key_blocks[:] if shape_keys else []
+        is_modified = any(mod.show_viewport for mod in ob.modifiers)
+        pre_show_only_shape_key = ob.show_only_shape_key
+        pre_active_shape_key_index = ob.active_shape_key_index
+        try:
+            # シェイプキーを1つずつ単独表示して評価する (None は基本形と同じ)
+            shapes = {}
+            if len(key_blocks) >= 2:
+                ob.show_only_shape_key = True
+                vert_count = len(ob.data.vertices)
+                basis_co = np.empty((vert_count, 3), dtype=np.float32)
+                key_blocks[0].data.foreach_get('co', basis_co.ravel())
+                for index, shape_key in enumerate(key_blocks):
+                    if index == 0:
+                        continue
+                    key_co = np.empty((vert_count, 3), dtype=np.float32)
+                    shape_key.data.foreach_get('co', key_co.ravel())
+                    if not is_modified:
+                        shapes[shape_key.name] = (key_co, np.array(shape_key.normals_vertex_get(), dtype=np.float32).reshape(-1, 3))
+                    elif np.array_equal(key_co, basis_co):
+                        shapes[shape_key.name] = None
+                    else:
+                        ob.active_shape_key_index = index
+                        eval_ob, me = evaluated_mesh()
+                        try:
+                            shapes[shape_key.name] = read_shape(me)
+                        finally:
+                            eval_ob.to_mesh_clear()
+                ob.active_shape_key_index = 0
+
+            eval_ob, me = evaluated_mesh()
+            try:
+                vert_count = len(me.vertices)
+                basis_shape = None
+                key_shapes = []
+                for name, shape in shapes.items():
+                    if shape is None:
+                        if basis_shape is None:
+                            basis_shape = read_shape(me)
+                        shape = basis_shape
+                    if len(shape[0]) != vert_count:
+                        self.warnings.append(f_tip_("Shape key \"{name}\" of {object} changes the vertex count after modifiers, skipped", name=name, object=ob.name))
+                        continue
+                    key_shapes.append((name, shape[0], shape[1]))
+                loop_normals = None
+                if custom_normal_blend > 0.0:
+                    loop_normals = self.blend_armature_normals(ob, me, custom_normal_blend)
+                self.add_mesh(ob, me, key_shapes=key_shapes, loop_normals=loop_normals)
+            finally:
+                eval_ob.to_mesh_clear()
+        finally:
+            if len(key_blocks) >= 2:
+                ob.show_only_shape_key = pre_show_only_shape_key
+                ob.active_shape_key_index = pre_active_shape_key_index
+                depsgraph.update()
+
+    def blend_armature_normals(self, ob, me, blend):
+        """アーマチュアで変形した評価後のメッシュ me の法線を、ボーンの回転で回した元の法線とブレンドする
+
+        This is what the modifier apply operator does with the custom normal blend
+        preference before the copy is exported: 0 keeps the deformed normals and
+        1 uses the rest normals rotated by the weighted pose of their bones.
+        Returns loop normals, or None if there is no armature or the modifiers
+        change the vertex count.
+        """
+        arm_obs = [mod.object for mod in ob.modifiers if mod.type == 'ARMATURE' and mod.object and mod.show_viewport]
+        source_me = ob.data
+        if not arm_obs or len(me.vertices) != len(source_me.vertices):
+            return None
+        arm_ob = arm_obs[0]
+
+        # ボーンごとの回転 (メッシュオブジェクトの空間)
+        to_mesh_space = compat.mul(ob.matrix_world.inverted(), arm_ob.matrix_world)
+        bone_indices = {}
+        rotations = []
+        for bone in arm_ob.data.bones:
+            pose_bone = arm_ob.pose.bones.get(bone.name)
+            if pose_bone is None:
+                continue
+            matrix = compat.mul(to_mesh_space, compat.mul(compat.mul(pose_bone.matrix, bone.matrix_local.inverted()), to_mesh_space.inverted()))
+            bone_indices[bone.name] = len(rotations)
+            rotations.append(np.array(matrix.to_quaternion().to_matrix(), dtype=np.float64))
+        group_bones = [bone_indices.get(vertex_group.name, -1) for vertex_group in ob.vertex_groups]
+
+        weight_vertices, weight_bones, weight_values = [], [], []
+        for vert in source_me.vertices:
+            for vg in vert.groups:
+                if vg.group < len(group_bones) and group_bones[vg.group] >= 0 and vg.weight > 0.0:
+                    weight_vertices.append(vert.index)
+                    weight_bones.append(group_bones[vg.group])
+                    weight_values.append(vg.weight)
+
+        vert_count = len(source_me.vertices)
+        rest_normals = np.empty((vert_count, 3), dtype=np.float32)
+        source_me.vertices.foreach_get('normal', rest_normals.ravel())
+        rotated = rest_normals.astype(np.float64)
+        if weight_vertices:
+            weight_vertices = np.array(weight_vertices, dtype=np.int64)
+            weight_values = np.array(weight_values, dtype=np.float64)
+            rotations = np.array(rotations)[np.array(weight_bones, dtype=np.int64)]
+            contributions = np.einsum('nij,nj->ni', rotations, rest_normals[weight_vertices]) * weight_values[:, np.newaxis]
+            weighted = np.zeros((vert_count, 3), dtype=np.float64)
+            np.add.at(weighted, weight_vertices, contributions)
+            is_weighted = np.bincount(weight_vertices, minlength=vert_count) > 0
+            rotated[is_weighted] = weighted[is_weighted]
+        length = np.linalg.norm(rotated, axis=1)[:, np.newaxis]
+        rotated = np.divide(rotated, length, out=rest_normals.astype(np.float64), where=length > 0)
+
+        # 評価後の分割法線と回した法線を球面線形補間する
+        loop_vertices = np.empty(len(me.loops), dtype=np.int64)
+        me.loops.foreach_get('vertex_index', loop_vertices)
+        me.calc_normals_split()
+        deformed = np.empty((len(me.loops), 3), dtype=np.float32)
+        me.loops.foreach_get('normal', deformed.ravel())
+        deformed = deformed.astype(np.float64)
+        target = rotated[loop_vertices]
+        angle = np.arccos(np.clip(np.einsum('ij,ij->i', deformed, target), -1.0, 1.0))
+        sin_angle = np.sin(angle)
+        is_parallel = sin_angle < 1e-6
+        sin_angle[is_parallel] = 1.0
+        deformed_weight = np.where(is_parallel, 1.0 - blend, np.sin((1.0 - blend) * angle) / sin_angle)
+        target_weight = np.where(is_parallel, blend, np.sin(blend * angle) / sin_angle)
+        blended = deformed * deformed_weight[:, np.newaxis] + target * target_weight[:, np.newaxis]
+        length = np.linalg.norm(blended, axis=1)[:, np.newaxis]
+        return np.divide(blended, length, out=deformed, where=length > 0).astype(np.float32)
+
+    def finish(self):
+        """追加したデータを連結する"""
+        parts = self._parts
+        vert_offsets = np.cumsum([0] + [len(part['co']) for part in parts])
+        loop_offsets = np.cumsum([0] + [len(part['loop_vertices']) for part in parts])
+
+        self.co = np.concatenate([part['co'] for part in parts])
+        self.normals = np.concatenate([part['normals'] for part in parts])
+        self.loop_vertices = np.concatenate([part['loop_vertices'] + vert_offsets[i] for i, part in enumerate(parts)]).astype(np.int32)
+        self.loop_uvs = np.concatenate([part['loop_uvs'] for part in parts])
+        self.loop_ranks = np.concatenate([part['loop_ranks'] for part in parts])
+        self.loop_normals = None
+        if any(part['has_custom_normals'] for part in parts):
+            # カスタム法線の無い部分は頂点の法線を使う
+            self.loop_normals = np.concatenate([
+                part['loop_normals'] if part['loop_normals'] is not None else part['normals'][part['loop_vertices']]
+                for part in parts
+            ])
+        self.loop_tangents = None
+        self.loop_bitangent_signs = None
+        if self.use_tangents and self.tangent_error is None:
+            self.loop_tangents = np.concatenate([part['loop_tangents'] for part in parts])
+            self.loop_bitangent_signs = np.concatenate([part['loop_bitangent_signs'] for part in parts])
+
+        self.face_loop_starts = np.concatenate([part['face_loop_starts'] + loop_offsets[i] for i, part in enumerate(parts)])
+        self.face_loop_totals = np.concatenate([part['face_loop_totals'] for part in parts])
+        self.face_material_indices = np.concatenate([part['face_material_indices'] for part in parts])
+
+        self.weight_vertices = np.concatenate([part['weight_vertices'] + vert_offsets[i] for i, part in enumerate(parts)])
+        self.weight_groups = np.concatenate([part['weight_groups'] for part in parts])
+        self.weight_values = np.concatenate([part['weight_values'] for part in parts])
+
+        # シェイプキーは名前で合わせ、無い部分は基本形のまま
+        key_names = []
+        for part in parts:
+            key_names.extend(name for name in part['key_names'] if name not in key_names)
+        self.shape_keys = []
+        for name in key_names:
+            key_co = np.concatenate([part['key_shapes'].get(name, (part['co'], part['normals']))[0] for part in parts])
+            key_normals = np.concatenate([part['key_shapes'].get(name, (part['co'], part['normals']))[1] for part in parts])
+            self.shape_keys.append((name, key_co, key_normals))
+
+        self._parts = []
+        return self
+
+    def __len__(self):
+        return len(self.co)
+
+
+# gather() のデータから出力内容のハッシュを求める
+def model_datas_hash(model_datas):
+    """Stable hash of everything that decides the bytes of an exported .model."""
+    digest = hashlib.blake2b(digest_size=16)
+
+    def update_array(name, array):
+        digest.update(name.encode('utf-8'))
+        if array is not None:
+            array = np.ascontiguousarray(array)
+            digest.update(f"{array.dtype.str}{array.shape}".encode('utf-8'))
+            digest.update(array.tobytes())
+
+    mesh = model_datas['mesh']
+    for name in ('co', 'normals', 'loop_vertices', 'loop_uvs', 'loop_ranks', 'loop_normals', 'loop_tangents', 'loop_bitangent_signs',
+                 'face_loop_starts', 'face_loop_totals', 'face_material_indices'):
+        update_array(name, getattr(mesh, name))
+    for key_name, key_co, key_normals in mesh.shape_keys:
+        update_array(key_name, key_co)
+        update_array(key_name, key_normals)
+    update_array('weights', model_datas['weights'])
+
+    for mat_data in model_datas['materials']:
+        mat_writer = common.CM3D2BinaryWriter()
+        mat_data.write(mat_writer, write_header=False)
+        digest.update(mat_writer.getvalue())
+
+    for name in ('model_name', 'base_bone_name', 'version', 'bone_data', 'local_bone_data', 'tangent_mode', 'scale', 'is_convert_tris', 'skip_shapekey', 'optimize_vertex_cache'):
+        digest.update(f"{name}={model_datas[name]!r}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+# 前回エクスポートした内容のハッシュ (出力先フォルダのサイドカーファイル)
+class ExportManifest:
+    """Hashes of the last incremental export of every .model in a directory.
+
+    An entry also records the file's size and mtime, so a file changed or
+    removed by something else is always written again.
+    """
+    FILE_NAME = ".cm3d2_export.json"
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, self.FILE_NAME)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def is_unchanged(self, filepath, digest):
+        entry = self.entries.get(os.path.basename(filepath))
+        if not entry or entry.get('hash') != digest:
+            return False
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return False
+        return entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns
 
+    def update(self, filepath, digest):
+        stat = os.stat(filepath)
+        self.entries[os.path.basename(filepath)] = {'hash': digest, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file, indent=1, sort_keys=True)
+
+
+# modelエクスポートの共通部分 (オプションと処理)
+class model_export_opr():
     filepath = bpy.props.StringProperty(subtype='FILE_PATH')
     filename_ext = ".model"
     filter_glob = bpy.props.StringProperty(default="*.model", options={'HIDDEN'})
@@ -55,6 +473,7 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
 
     is_align_to_base_bone = bpy.props.BoolProperty(name="Align to Base Bone", default=True, description="Align the object to it's base bone")
     is_convert_tris = bpy.props.BoolProperty(name="四角面を三角面に", default=True, description="四角ポリゴンを三角ポリゴンに変換してから出力します、元のメッシュには影響ありません")
+    is_optimize_vertex_cache = bpy.props.BoolProperty(name="Optimize Vertex Cache", default=False, description="Reorder triangles and vertices for the GPU vertex cache. The mesh looks the same but draws faster in game")
     is_normalize_weight = bpy.props.BoolProperty(name="ウェイトの合計を1.0に", default=True, description="4つのウェイトの合計値が1.0になるように正規化します")
     is_convert_bone_weight_names = bpy.props.BoolProperty(name="頂点グループ名をCM3D2用に変換", default=True, description="全ての頂点グループ名をCM3D2で使える名前にしてからエクスポートします")
     is_clean_vertex_groups = bpy.props.BoolProperty(name="クリーンな頂点グループ", default=True, description="重みがゼロの場合、頂点グループから頂点を削除します")
@@ -63,6 +482,15 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
     is_batch = bpy.props.BoolProperty(name="バッチモード", default=False, description="モードの切替やエラー個所の選択を行いません")
 
     export_tangent = bpy.props.BoolProperty(name="接空間情報出力", default=False, description="接空間情報(binormals, tangents)を出力する")
+    items = [
+        ('CM3D2'     , "Per Vertex" , "Accumulate the tangents of every triangle on its vertices", 'NONE', 1),
+        ('MIKKTSPACE', "MikkTSpace" , "Use Blender's MikkTSpace tangents of the exported mesh (triangles and quads only)", 'NONE', 2),
+    ]
+    tangent_mode = bpy.props.EnumProperty(items=items, name="Tangent Mode", default='CM3D2', description="How the exported tangents are calculated")
+
+    is_incremental = bpy.props.BoolProperty(name="Skip Unchanged Files", default=False, description="Skip writing (and backing up) files whose content would be the same as at their last export. Hashes are kept in a .cm3d2_export.json file next to the models")
+
+    is_evaluated_export = bpy.props.BoolProperty(name="Export Without Copying", default=False, description="Read the evaluated meshes of the selected objects directly instead of copying, applying modifiers to and joining them (Blender 2.80+)")
 
     @classmethod
     def poll(cls, context):
@@ -112,39 +540,47 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
         self.model_name = ob_names[0]
         self.base_bone_name = ob_names[1] if 2 <= len(ob_names) else 'Auto'
 
+        for key, value in self.get_source_defaults(context, ob).items():
+            setattr(self, key, value)
+
+        # エクスポート時のデフォルトパスを取得
+        if common.preferences().model_default_path:
+            self.filepath = common.default_cm3d2_dir(common.preferences().model_default_path, self.model_name, "model")
+        else:
+            self.filepath = common.default_cm3d2_dir(common.preferences().model_export_path, self.model_name, "model")
+
+        # バックアップ関係
+        self.is_backup = bool(common.preferences().backup_ext)
+
+        self.scale = 1.0 / common.preferences().scale
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    @staticmethod
+    def get_source_defaults(context, ob):
+        """オブジェクトに合わせたボーン情報元とバージョンのデフォルトを辞書で返す (決まらない項目は含まない)"""
+        defaults = {}
         # ボーン情報元のデフォルトオプションを取得
         if "BoneData" in context.blend_data.texts:
             if "LocalBoneData" in context.blend_data.texts:
-                self.bone_info_mode = 'TEXT'
+                defaults['bone_info_mode'] = 'TEXT'
         if "BoneData:0" in ob:
             ver = ob.get("ModelVersion")
             if ver and ver >= 1000:
-                self.version = str(ver)
+                defaults['version'] = str(ver)
             if "LocalBoneData:0" in ob:
-                self.bone_info_mode = 'OBJECT_PROPERTY'
+                defaults['bone_info_mode'] = 'OBJECT_PROPERTY'
         arm_ob = ob.parent
         if arm_ob:
             if arm_ob.type == 'ARMATURE':
-                self.bone_info_mode = 'ARMATURE_PROPERTY'
+                defaults['bone_info_mode'] = 'ARMATURE_PROPERTY'
         else:
             for mod in ob.modifiers:
                 if mod.type == 'ARMATURE':
                     if mod.object:
-                        self.bone_info_mode = 'ARMATURE_PROPERTY'
+                        defaults['bone_info_mode'] = 'ARMATURE_PROPERTY'
                         break
-
-        # エクスポート時のデフォルトパスを取得
-        if common.preferences().model_default_path:
-            self.filepath = common.default_cm3d2_dir(common.preferences().model_default_path, self.model_name, "model")
-        else:
-            self.filepath = common.default_cm3d2_dir(common.preferences().model_export_path, self.model_name, "model")
-
-        # バックアップ関係
-        self.is_backup = bool(common.preferences().backup_ext)
-
-        self.scale = 1.0 / common.preferences().scale
-        context.window_manager.fileselect_add(self)
-        return {'RUNNING_MODAL'}
+        return defaults
 
     # 'is_batch' がオンなら非表示
     def draw(self, context):
@@ -154,6 +590,7 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
         if not common.preferences().backup_ext:
             row.enabled = False
         self.layout.prop(self, 'is_arrange_name', icon='FILE_TICK')
+        self.layout.prop(self, 'is_incremental', icon='FILE_REFRESH')
         box = self.layout.box()
         box.prop(self, 'version', icon='LINENUMBERS_ON')
         box.prop(self, 'model_name', icon='SORTALPHA')
@@ -177,8 +614,12 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
         box.label(text="メッシュオプション")
         box.prop(self , 'is_align_to_base_bone', icon=compat.icon('OBJECT_ORIGIN'  ))
         box.prop(self , 'is_convert_tris'      , icon=compat.icon('MESH_DATA'      ))
+        box.prop(self , 'is_optimize_vertex_cache', icon=compat.icon('SORTSIZE'     ))
         box.prop(prefs, 'skip_shapekey'        , icon=compat.icon('SHAPEKEY_DATA'  ))
         box.prop(self , 'export_tangent'       , icon=compat.icon('CURVE_BEZCIRCLE'))
+        row = box.row()
+        row.prop(self , 'tangent_mode'         , icon=compat.icon('CURVE_BEZCIRCLE'))
+        row.enabled = self.export_tangent
         sub_box = box.box()
         sub_box.prop(self, 'is_normalize_weight', icon='MOD_VERTEX_WEIGHT')
         sub_box.prop(self, 'is_clean_vertex_groups', icon='MOD_VERTEX_WEIGHT')
@@ -188,6 +629,10 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
         row = sub_box.row()
         row.prop(prefs, 'custom_normal_blend', icon='SNAP_NORMAL', slider=True)
         row.enabled = prefs.is_apply_modifiers
+        if not compat.IS_LEGACY:
+            row = sub_box.row()
+            row.prop(self, 'is_evaluated_export', icon='DUPLICATE')
+            row.enabled = not self.is_align_to_base_bone
 
     def copy_and_activate_ob(self, context, ob):
         new_ob = ob.copy()
@@ -200,18 +645,45 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
 
     def execute(self, context):
         start_time = time.time()
+        ret = self.export_objects(context, context.active_object, context.selected_objects, self.export)
+        if 'FINISHED' not in ret:
+            return ret
+
+        context.window_manager.progress_update(10)
+        diff_time = time.time() - start_time
+        self.report(type={'INFO'}, message=f_tip_("modelのエクスポートが完了しました。{:.2f} 秒 file={}", diff_time, self.filepath))
+        return ret
+
+    def export_objects(self, context, ob_source, selected_objs, export_func, is_join=None):
+        """ob_source を基準に選択オブジェクトを用意して export_func(context, ob, source_obs) を呼ぶ"""
         prefs = common.preferences()
+        if is_join is None:
+            is_join = not self.is_batch
 
-        selected_objs = context.selected_objects
+        selected_objs = list(selected_objs)
         source_objs = []
         prev_mode = None
         try:
-            ob_source = context.active_object
             if ob_source not in selected_objs:
                 selected_objs.append(ob_source) # luvoid : Fix error where object is active but not selected
             ob_name = ob_source.name
             ob_main = None
-            if self.is_batch:
+            if self.is_evaluated_export and not compat.IS_LEGACY and not self.is_align_to_base_bone:
+                # コピーせずに、選択されたMESHオブジェクトを評価して書き出す
+                if not is_join:
+                    mesh_obs = [ob_source]
+                else:
+                    mesh_obs = [ob_source] + [ob for ob in selected_objs if ob.type == 'MESH' and ob != ob_source]
+
+                mode = ob_source.mode
+                if mode != 'OBJECT':
+                    prev_mode = mode
+                    bpy.ops.object.mode_set(mode='OBJECT')
+
+                if len(mesh_obs) > 1:
+                    self.report(type={'INFO'}, message=f_tip_("{}個のオブジェクトをマージしました", len(mesh_obs)))
+                return export_func(context, ob_source, mesh_obs)
+            elif not is_join:
                 # アクティブオブジェクトを１つコピーするだけでjoinしない
                 source_objs.append(ob_source)
                 compat.set_select(ob_source, False)
@@ -248,14 +720,7 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
                     bpy.ops.object.join()
                     self.report(type={'INFO'}, message=f_tip_("{}個のオブジェクトをマージしました", selected_count))
 
-            ret = self.export(context, ob_main)
-            if 'FINISHED' not in ret:
-                return ret
-
-            context.window_manager.progress_update(10)
-            diff_time = time.time() - start_time
-            self.report(type={'INFO'}, message=f_tip_("modelのエクスポートが完了しました。{:.2f} 秒 file={}", diff_time, self.filepath))
-            return ret
+            return export_func(context, ob_main, None)
         finally:
             # 作業データの破棄（コピーデータを削除、選択状態の復元、アクティブオブジェクト、モードの復元）
             if ob_main:
@@ -275,8 +740,38 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
             if prev_mode:
                 bpy.ops.object.mode_set(mode=prev_mode)
 
-    def export(self, context, ob):
-        """モデルファイルを出力"""
+    def export(self, context, ob, source_obs=None):
+        """モデルファイルを出力 (source_obs があればコピーせずにそれらを評価して出力)"""
+        model_datas = self.gather(context, ob, source_obs)
+        if not isinstance(model_datas, dict):
+            return model_datas
+
+        digest = None
+        if self.is_incremental:
+            digest = model_datas_hash(model_datas)
+            manifest = ExportManifest(os.path.dirname(self.filepath))
+            if manifest.is_unchanged(self.filepath, digest):
+                self.report(type={'INFO'}, message=f_tip_("Skipped {path}, nothing changed since the last export", path=self.filepath))
+                return {'FINISHED'}
+
+        try:
+            acmr = self.write_file(self.filepath, model_datas, common.get_backup_filepath(self.filepath, self.is_backup), context=context)
+        except common.CM3D2ExportException as e:
+            self.report(type={'ERROR'}, message=str(e))
+            return {'CANCELLED'}
+        if acmr:
+            self.report(type={'INFO'}, message=f_tip_("Vertex cache ACMR {before:.3f} -> {after:.3f}", before=acmr[0], after=acmr[1]))
+
+        if digest:
+            try:
+                manifest.update(self.filepath, digest)
+                manifest.save()
+            except OSError as e:
+                self.report(type={'WARNING'}, message=f_tip_("Could not save the export hashes: {error}", error=e))
+        return {'FINISHED'}
+
+    def gather(self, context, ob, source_obs=None):
+        """書き出しに必要なデータをシーンから集めて辞書で返す (失敗したらキャンセルオブジェクト)"""
         prefs = common.preferences()
 
         if not self.is_batch:
@@ -291,7 +786,7 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
             return res
         me = ob.data
 
-        if ob.active_shape_key_index != 0:
+        if source_obs is None and ob.active_shape_key_index != 0:
             ob.active_shape_key_index = 0
             me.update()
 
@@ -333,10 +828,6 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
         else:
             return self.report_cancel("ボーン情報元のモードがおかしいです")
 
-        if self.mate_info_mode == 'TEXT':
-            for index, slot in enumerate(ob.material_slots):
-                if "Material:" + str(index) not in context.blend_data.texts:
-                    return self.report_cancel("マテリアル情報元のテキストが足りません")
         context.window_manager.progress_update(1)
 
         # model名とか
@@ -377,6 +868,27 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
             bpy.ops.object.align_to_cm3d2_base_bone(scale=1.0/self.scale, is_preserve_mesh=True, bone_info_mode=self.bone_info_mode)
             me.update()
 
+        # メッシュの配列データを取得
+        mesh = ExportMesh(ob, use_tangents=self.export_tangent and self.tangent_mode == 'MIKKTSPACE')
+        if source_obs is None:
+            mesh.add_mesh(ob, me)
+        else:
+            for source_ob in source_obs:
+                if prefs.is_apply_modifiers:
+                    mesh.add_evaluated_object(context, source_ob, prefs.custom_normal_blend)
+                else:
+                    mesh.add_mesh(source_ob, source_ob.data, is_temporary=False)
+        mesh.finish()
+        for message in mesh.warnings:
+            self.report(type={'WARNING'}, message=message)
+        if None in mesh.materials:
+            return self.report_cancel("空のマテリアルスロットを削除してください")
+
+        if self.mate_info_mode == 'TEXT':
+            for index in range(len(mesh.materials)):
+                if "Material:" + str(index) not in context.blend_data.texts:
+                    return self.report_cancel("マテリアル情報元のテキストが足りません")
+
         # LocalBoneData情報読み込み
         local_bone_data = []
         if self.bone_info_mode == 'ARMATURE':
@@ -392,55 +904,70 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
         local_bone_name_indices = {bone['name']: index for index, bone in enumerate(local_bone_data)}
         context.window_manager.progress_update(3)
         
-        used_local_bone = {index: False for index, bone in enumerate(local_bone_data)}
-        
+        # 頂点グループ→ローカルボーンの対応と、使われるローカルボーン(親を含む)を頂点グループごとに一度だけ求める
+        group_local_indices = np.full(len(mesh.group_names), -1, dtype=np.int64)
+        group_used_local_bones = []
+        for group_index, group_name in enumerate(mesh.group_names):
+            name = common.encode_bone_name(group_name, self.is_convert_bone_weight_names)
+            group_local_indices[group_index] = local_bone_name_indices.get(name, -1)
+            used_local_bones = set()
+            visited_bones = set()
+            boneindex = bone_name_indices.get(name, -1)
+            while boneindex >= 0 and boneindex not in visited_bones:
+                visited_bones.add(boneindex)
+                parent = bone_data[boneindex]
+                localindex = local_bone_name_indices.get(parent['name'], -1)
+                if localindex >= 0:
+                    used_local_bones.add(localindex)
+                boneindex = parent['parent_index']
+            group_used_local_bones.append(used_local_bones)
+
         # ウェイト情報読み込み
-        vertices = []
+        vert_indices, group_indices, group_weights = mesh.weight_vertices, mesh.weight_groups, mesh.weight_values
+        local_indices = group_local_indices[group_indices]
+        is_valid = local_indices >= 0
+        if self.is_clean_vertex_groups:
+            is_valid &= group_weights > 0.0
+        vert_indices, local_indices, group_weights = vert_indices[is_valid], local_indices[is_valid], group_weights[is_valid]
+
+        group_counts = np.bincount(vert_indices, minlength=len(mesh))
+        if not np.all(group_counts):
+            if not self.is_batch and not mesh.is_evaluated:
+                self.select_no_weight_vertices(context, local_bone_name_indices)
+            return self.report_cancel("ウェイトが割り当てられていない頂点が見つかりました、中止します")
+        is_in_too_many = int(np.count_nonzero(group_counts > 4))
+
+        # luvoid : track used bones
+        used_local_bone = {index: False for index, bone in enumerate(local_bone_data)}
+        for index in np.unique(local_indices).tolist():
+            used_local_bone[index] = True
+        for group_index in np.unique(group_indices[is_valid]).tolist():
+            for index in group_used_local_bones[group_index]:
+                used_local_bone[index] = True
+
+        # 頂点ごとにウェイトの大きい順に4つまで
+        order = np.lexsort((-group_weights, vert_indices))
+        vert_indices, local_indices, group_weights = vert_indices[order], local_indices[order], group_weights[order]
+        ranks = np.arange(len(vert_indices)) - (np.cumsum(group_counts) - group_counts)[vert_indices]
+        is_top = ranks < 4
+        top_indices = np.zeros((len(mesh), 4), dtype=np.int64)
+        top_weights = np.zeros((len(mesh), 4), dtype=np.float64)
+        top_indices[vert_indices[is_top], ranks[is_top]] = local_indices[is_top]
+        top_weights[vert_indices[is_top], ranks[is_top]] = group_weights[is_top]
+
+        totals = top_weights.sum(axis=1)
         is_over_one = 0
         is_under_one = 0
-        is_in_too_many = 0
-        for i, vert in enumerate(me.vertices):
-            vgs = []
-            for vg in vert.groups:
-                if len(ob.vertex_groups) <= vg.group: # Apparently a vertex can be assigned to a non-existent group.
-                    continue
-                name = common.encode_bone_name(ob.vertex_groups[vg.group].name, self.is_convert_bone_weight_names)
-                index = local_bone_name_indices.get(name, -1)
-                if index >= 0 and (vg.weight > 0.0 or not self.is_clean_vertex_groups):
-                    vgs.append([index, vg.weight])
-                    # luvoid : track used bones
-                    used_local_bone[index] = True
-                    boneindex = bone_name_indices.get(name, -1)
-                    while boneindex >= 0:
-                        parent = bone_data[boneindex]
-                        localindex = local_bone_name_indices.get(parent['name'], -1)
-                        # could check for `localindex == -1` here, but it's prescence may be useful in determing if the local bones resolve back to some root
-                        used_local_bone[localindex] = True
-                        boneindex = parent['parent_index']
-            if len(vgs) == 0:
-                if not self.is_batch:
-                    self.select_no_weight_vertices(context, local_bone_name_indices)
-                return self.report_cancel("ウェイトが割り当てられていない頂点が見つかりました、中止します")
-            if len(vgs) > 4:
-                is_in_too_many += 1
-            vgs = sorted(vgs, key=itemgetter(1), reverse=True)[0:4]
-            total = sum(vg[1] for vg in vgs)
-            if self.is_normalize_weight:
-                for vg in vgs:
-                    vg[1] /= total
-            else:
-                if 1.01 < total:
-                    is_over_one += 1
-                elif total < 0.99:
-                    is_under_one += 1
-            if len(vgs) < 4:
-                vgs += [(0, 0.0)] * (4 - len(vgs))
-            vertices.append({
-                'index': vert.index,
-                'face_indexs': list(map(itemgetter(0), vgs)),
-                'weights': list(map(itemgetter(1), vgs)),
-            })
-        
+        if self.is_normalize_weight:
+            np.divide(top_weights, totals[:, np.newaxis], out=top_weights, where=totals[:, np.newaxis] != 0.0)
+        else:
+            is_over_one = int(np.count_nonzero(1.01 < totals))
+            is_under_one = int(np.count_nonzero(totals < 0.99))
+
+        weights = np.empty(len(mesh), dtype=common.MODEL_WEIGHT_DTYPE)
+        weights['index'] = top_indices
+        weights['value'] = top_weights
+
         if 1 <= is_over_one:
             self.report(type={'WARNING'}, message=f_tip_("ウェイトの合計が1.0を超えている頂点が見つかりました。正規化してください。超過している頂点の数:{}", is_over_one))
         if 1 <= is_under_one:
@@ -462,211 +989,160 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
                 pass
             else:
                 print(f_tip_("Unexpected: used_local_bone[{key}] == {value} when len(used_local_bone) == {length}", key=index, value=is_used, length=len(used_local_bone)))
-                self.report(type={'WARNING'}, message=f_tip_("Could not find whether bone with index {index} was used. See console for more info.", index=i))
+                self.report(type={'WARNING'}, message=f_tip_("Could not find whether bone with index {index} was used. See console for more info.", index=index))
         if is_deleted > 0:
             self.report(type={'WARNING'}, message=f_tip_("頂点が割り当てられていない{num}つのローカルボーンが見つかりました。 詳細については、ログを参照してください。", num=is_deleted))
             self.report(type={'INFO'}, message=deleted_names)
                 
         context.window_manager.progress_update(4)
-        
 
-        try:
-            writer = common.open_temporary(self.filepath, 'wb', is_backup=self.is_backup)
-        except:
-            self.report(type={'ERROR'}, message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", self.filepath))
-            return {'CANCELLED'}
+        # マテリアル情報を取得
+        materials = []
+        for material in mesh.materials:
+            if self.mate_info_mode == 'MATERIAL':
+                materials.append(cm3d2_data.MaterialHandler.parse_mate(material, self.is_arrange_name))
+            elif self.mate_info_mode == 'TEXT':
+                materials.append(cm3d2_data.MaterialHandler.parse_text(material, self.is_arrange_name))
 
-        model_datas = {
+        tangent_mode = None
+        if self.export_tangent:
+            tangent_mode = self.tangent_mode
+            if tangent_mode == 'MIKKTSPACE' and mesh.loop_tangents is None:
+                self.report(type={'WARNING'}, message=f_tip_("Could not calculate MikkTSpace tangents, using per-vertex tangents instead: {error}", error=mesh.tangent_error))
+                tangent_mode = 'CM3D2'
+
+        return {
+            'mesh': mesh,
+            'model_name': self.model_name,
+            'base_bone_name': self.base_bone_name,
+            'version': int(self.version),
             'bone_data': bone_data,
             'local_bone_data': local_bone_data,
-            'vertices': vertices,
+            'weights': weights,
+            'materials': materials,
+            'tangent_mode': tangent_mode,
+            'scale': self.scale,
+            'is_convert_tris': self.is_convert_tris,
+            'skip_shapekey': prefs.skip_shapekey,
+            'optimize_vertex_cache': self.is_optimize_vertex_cache,
         }
+
+    @staticmethod
+    def get_write_messages():
+        """write_file() のエラーメッセージの書式 (翻訳はメインスレッドで済ませておく)"""
+        return {
+            'open_failed': tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}"),
+            'too_many_vertices': tip_("頂点数がまだ多いです (現在{}頂点)。あと{}頂点以上減らしてください、中止します"),
+        }
+
+    def write_file(self, filepath, model_datas, backup_filepath=None, messages=None, context=None):
+        """gather() のデータをmodelファイルに書き出す
+
+        context を渡さず、backup_filepath と messages をメインスレッドで用意しておけば
+        設定や翻訳を含むbpyのデータには触れないので、ワーカースレッドからも呼べる.
+        """
+        if messages is None:
+            messages = self.get_write_messages()
         try:
-            with writer:
-                self.write_model(context, ob, writer, **model_datas)
-        except common.CM3D2ExportException as e:
-            self.report(type={'ERROR'}, message=str(e))
-            return {'CANCELLED'}
+            file = common.open_temporary(filepath, 'wb', backup_filepath=backup_filepath)
+        except:
+            raise common.CM3D2ExportException(messages['open_failed'].format(filepath))
+        with file, common.CM3D2BinaryWriter(file) as writer:
+            return self.write_model(context, writer, messages=messages, **model_datas)
 
-        return {'FINISHED'}
+    @staticmethod
+    def update_progress(context, value):
+        if context:
+            context.window_manager.progress_update(value)
 
-    def write_model(self, context, ob, writer, bone_data=[], local_bone_data=[], vertices=[]):
-        """モデルデータをファイルオブジェクトに書き込む"""
-        me = ob.data
-        prefs = common.preferences()
+    def write_model(self, context, writer, mesh, model_name, base_bone_name, version, bone_data, local_bone_data, weights, materials,
+                    tangent_mode=None, scale=1.0, is_convert_tris=True, skip_shapekey=False, optimize_vertex_cache=False, messages=None):
+        """モデルデータをファイルオブジェクトに書き込む
 
-        # ファイル先頭
-        common.write_str(writer, 'CM3D2_MESH')
-        self.version_num = int(self.version)
-        writer.write(struct.pack('<i', self.version_num))
-
-        common.write_str(writer, self.model_name)
-        common.write_str(writer, self.base_bone_name)
-
-        # ボーン情報書き出し
-        writer.write(struct.pack('<i', len(bone_data)))
-        for bone in bone_data:
-            common.write_str(writer, bone['name'])
-            writer.write(struct.pack('<b', bone['unknown']))
-        context.window_manager.progress_update(3.3)
-        for bone in bone_data:
-            writer.write(struct.pack('<i', bone['parent_index']))
-        context.window_manager.progress_update(3.7)
-        for bone in bone_data:
-            writer.write(struct.pack('<3f', bone['co'][0], bone['co'][1], bone['co'][2]))
-            writer.write(struct.pack('<4f', bone['rot'][1], bone['rot'][2], bone['rot'][3], bone['rot'][0]))
-            if self.version_num >= 2001:
-                use_scale = ('scale' in bone)
-                writer.write(struct.pack('<b', use_scale))
-                if use_scale:
-                    bone_scale = bone['scale']
-                    writer.write(struct.pack('<3f', bone_scale[0], bone_scale[1], bone_scale[2]))
-        context.window_manager.progress_update(4)
+        optimize_vertex_cache が有効なら並べ替え前後の ACMR を (before, after) で返す
+        """
+        self.update_progress(context, 4)
 
         # 正しい頂点数などを取得
-        bm = bmesh.new()
-        bm.from_mesh(me)
-        uv_lay = bm.loops.layers.uv.active
-        vert_uvs = []
-        vert_uvs_append = vert_uvs.append
-        vert_iuv = {}
-        vert_indices = {}
-        vert_count = 0
-        for vert in bm.verts:
-            vert_uv = []
-            vert_uvs_append(vert_uv)
-            for loop in vert.link_loops:
-                uv = loop[uv_lay].uv
-                if uv not in vert_uv:
-                    vert_uv.append(uv)
-                    vert_iuv[hash((vert.index, uv.x, uv.y))] = vert_count
-                    vert_indices[vert.index] = vert_count
-                    vert_count += 1
+        split = common.VertexSplit(mesh.loop_vertices, mesh.loop_uvs, len(mesh), mesh.loop_ranks)
+        vert_count = len(split)
         if 65535 < vert_count:
-            raise common.CM3D2ExportException(f_tip_("頂点数がまだ多いです (現在{}頂点)。あと{}頂点以上減らしてください、中止します", vert_count, vert_count - 65535))
-        context.window_manager.progress_update(5)
-
-        writer.write(struct.pack('<2i', vert_count, len(ob.material_slots)))
-
-        # ローカルボーン情報を書き出し
-        writer.write(struct.pack('<i', len(local_bone_data)))
-        for bone in local_bone_data:
-            common.write_str(writer, bone['name'])
-        context.window_manager.progress_update(5.3)
-        for bone in local_bone_data:
-            for f in bone['matrix']:
-                writer.write(struct.pack('<f', f))
-        context.window_manager.progress_update(5.7)
-
-        # カスタム法線情報を取得
-        if me.has_custom_normals:
-            custom_normals = [mathutils.Vector() for i in range(len(me.vertices))]
-            me.calc_normals_split()
-            for loop in me.loops:
-                custom_normals[loop.vertex_index] = loop.normal.copy()
-
-        cm_verts = []
-        cm_norms = []
-        cm_uvs = []
-        # 頂点情報を書き出し
-        for i, vert in enumerate(bm.verts):
-            co = compat.convert_bl_to_cm_space( vert.co * self.scale )
-            if me.has_custom_normals:
-                no = custom_normals[vert.index]
-            else:
-                no = vert.normal.copy()
-            no = compat.convert_bl_to_cm_space( no )
-            for uv in vert_uvs[i]:
-                cm_verts.append(co)
-                cm_norms.append(no)
-                cm_uvs.append(uv)
-                writer.write(struct.pack('<3f', co.x, co.y, co.z))
-                writer.write(struct.pack('<3f', no.x, no.y, no.z))
-                writer.write(struct.pack('<2f', uv.x, uv.y))
-        context.window_manager.progress_update(6)
-
-        cm_tris = self.parse_triangles(bm, ob, uv_lay, vert_iuv, vert_indices)
-
-        # 接空間情報を書き出し
-        if self.export_tangent:
-            tangents = self.calc_tangents(cm_tris, cm_verts, cm_norms, cm_uvs)
-            writer.write(struct.pack('<i', len(tangents)))
-            for t in tangents:
-                writer.write(struct.pack('<4f', *t))
+            if messages is None:
+                messages = self.get_write_messages()
+            raise common.CM3D2ExportException(messages['too_many_vertices'].format(vert_count, vert_count - 65535))
+        self.update_progress(context, 5)
+
+        cm_tris = self.parse_triangles(mesh, split, is_convert_tris)
+
+        # 頂点キャッシュ向けに面を並べ替え、頂点を最初に使われる順に振り直す
+        acmr = None
+        if optimize_vertex_cache and cm_tris:
+            acmr_before = common.vertex_cache_acmr(np.concatenate(cm_tris))
+            optimized_tris = [common.optimize_vertex_cache(tris, vert_count).ravel() for tris in cm_tris]
+            # 元の順番の方が良ければ面はそのまま (頂点の振り直しだけ行う)
+            if common.vertex_cache_acmr(np.concatenate(optimized_tris)) <= acmr_before:
+                cm_tris = optimized_tris
+            used_verts, first_uses = np.unique(np.concatenate(cm_tris), return_index=True)
+            unused_verts = np.setdiff1d(np.arange(vert_count), used_verts)
+            rank = split.reorder(np.concatenate([used_verts[np.argsort(first_uses)], unused_verts]))
+            cm_tris = [rank[tris] for tris in cm_tris]
+            acmr = (acmr_before, common.vertex_cache_acmr(np.concatenate(cm_tris)))
+
+        # カスタム法線情報を取得 (頂点ごとに最後のループの法線を使う)
+        if mesh.loop_normals is not None:
+            last_loops = len(split.loop_vertices) - 1 - np.unique(split.loop_vertices[::-1], return_index=True)[1]
+            vert_norms = np.zeros((len(mesh), 3), dtype=np.float32)
+            vert_norms[split.loop_vertices[last_loops]] = mesh.loop_normals[last_loops]
+            custom_normals = vert_norms.copy()
         else:
-            writer.write(struct.pack('<i', 0))
-
-        # ウェイト情報を書き出し
-        for vert in vertices:
-            for uv in vert_uvs[vert['index']]:
-                writer.write(struct.pack('<4H', *vert['face_indexs']))
-                writer.write(struct.pack('<4f', *vert['weights']))
-        context.window_manager.progress_update(7)
-
-        # 面情報を書き出し
-        for tri in cm_tris:
-            writer.write(struct.pack('<i', len(tri)))
-            for vert_index in tri:
-                writer.write(struct.pack('<H', vert_index))
-        context.window_manager.progress_update(8)
-
-        # マテリアルを書き出し
-        writer.write(struct.pack('<i', len(ob.material_slots)))
-        for slot_index, slot in enumerate(ob.material_slots):
-            if self.mate_info_mode == 'MATERIAL':
-                mat_data = cm3d2_data.MaterialHandler.parse_mate(slot.material, self.is_arrange_name)
-                mat_data.write(writer, write_header=False)
-
-            elif self.mate_info_mode == 'TEXT':
-                text = context.blend_data.texts["Material:" + str(slot_index)].as_string()
-                mat_data = cm3d2_data.MaterialHandler.parse_text(slot.material, self.is_arrange_name)
-                mat_data.write(writer, write_header=False)
-
-        context.window_manager.progress_update(9)
-
-        # モーフを書き出し
-        if me.shape_keys:
-            temp_me = context.blend_data.meshes.new(name=me.name + ".temp")
-            try:
-                vs = [vert.co for vert in me.vertices]
-                es = []
-                fs = [face.vertices for face in me.polygons]
-                temp_me.from_pydata(vs, es, fs)
-                if 2 <= len(me.shape_keys.key_blocks):
-                    for shape_key in me.shape_keys.key_blocks[1:]:
-                        morph = []
-                        vert_index = 0
-                        for i in range(len(me.vertices)):
-                            temp_me.vertices[i].co = shape_key.data[i].co.copy()
-                        temp_me.update()
-                        for i, vert in enumerate(me.vertices):
-                            co_diff = shape_key.data[i].co - vert.co
-                            if me.has_custom_normals:
-                                no_diff = custom_normals[i] - vert.normal
-                            else:
-                                no_diff = temp_me.vertices[i].normal - vert.normal
-                            if 0.001 < co_diff.length or 0.001 < no_diff.length:
-                                co = co_diff * self.scale
-                                for d in vert_uvs[i]:
-                                    morph.append((vert_index, co, no_diff))
-                                    vert_index += 1
-                            else:
-                                vert_index += len(vert_uvs[i])
-
-                        if prefs.skip_shapekey and not len(morph):
-                            continue
-                        common.write_str(writer, 'morph')
-                        common.write_str(writer, shape_key.name)
-                        writer.write(struct.pack('<i', len(morph)))
-                        for v_index, vec, normal in morph:
-                            vec    = compat.convert_bl_to_cm_space(vec   )
-                            normal = compat.convert_bl_to_cm_space(normal)
-                            writer.write(struct.pack('<H', v_index))
-                            writer.write(struct.pack('<3f', vec.x, vec.y, vec.z))
-                            writer.write(struct.pack('<3f', normal.x, normal.y, normal.z))
-            finally:
-                context.blend_data.meshes.remove(temp_me)
-        common.write_str(writer, 'end')
+            vert_norms = mesh.normals
+
+        # 頂点情報
+        # (変換行列は符号付きの置換なので、-0.0 を 0.0 にそろえれば1頂点ずつの変換と同じ値になる)
+        vert_cos = compat.convert_bl_to_cm_space_array(mesh.co * np.float32(scale)) + np.float32(0.0)
+        vert_norms = compat.convert_bl_to_cm_space_array(vert_norms) + np.float32(0.0)
+        cm_vertices = np.empty(len(split), dtype=common.model_vertex_dtype(version))
+        cm_vertices['co'] = vert_cos[split.vertices]
+        cm_vertices['normal'] = vert_norms[split.vertices]
+        cm_vertices['uv'] = split.uvs
+        self.update_progress(context, 6)
+
+        # 接空間情報
+        tangents = None
+        if tangent_mode == 'MIKKTSPACE':
+            tangents = self.calc_mikktspace_tangents(mesh, split)
+        elif tangent_mode:
+            tangents = self.calc_tangents(cm_tris, cm_vertices['co'], cm_vertices['normal'], cm_vertices['uv'])
+        self.update_progress(context, 7)
+
+        # モーフ
+        morphs = []
+        if mesh.shape_keys:
+            base_cos = mesh.co
+            base_norms = mesh.normals
+            for shape_key_name, key_cos, key_norms in mesh.shape_keys:
+                co_diffs = key_cos - base_cos
+                if mesh.loop_normals is not None:
+                    no_diffs = custom_normals - base_norms
+                else:
+                    no_diffs = key_norms - base_norms
+                is_moved = (0.001 < np.linalg.norm(co_diffs, axis=1)) | (0.001 < np.linalg.norm(no_diffs, axis=1))
+
+                morph_indices = np.flatnonzero(is_moved[split.vertices])
+                if skip_shapekey and not len(morph_indices):
+                    continue
+                morph_verts = split.vertices[morph_indices]
+                morph = np.empty(len(morph_indices), dtype=common.model_morph_dtype())
+                morph['index'] = morph_indices
+                morph['co'] = compat.convert_bl_to_cm_space_array(co_diffs[morph_verts] * np.float32(scale)) + np.float32(0.0)
+                morph['normal'] = compat.convert_bl_to_cm_space_array(no_diffs[morph_verts]) + np.float32(0.0)
+                morphs.append((shape_key_name, morph))
+        self.update_progress(context, 8)
+
+        model.write_model(writer, version, model_name, base_bone_name, bone_data, local_bone_data,
+                          cm_vertices, tangents, weights[split.vertices], cm_tris, materials, morphs)
+        self.update_progress(context, 9)
+        return acmr
 
     def write_tangents(self, writer, me):
         if len(me.uv_layers) < 1:
@@ -674,123 +1150,120 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
 
         num_loops = len(me.loops)
 
-    def parse_triangles(self, bm, ob, uv_lay, vert_iuv, vert_indices):
-        def vert_index_from_loops(loops):
-            """vert_index generator"""
-            for loop in loops:
-                uv = loop[uv_lay].uv
-                v_index = loop.vert.index
-                vert_index = vert_iuv.get(hash((v_index, uv.x, uv.y)))
-                if vert_index is None:
-                    vert_index = vert_indices.get(v_index, 0)
-                yield vert_index
-
-        triangles = []
-        for mate_index, slot in enumerate(ob.material_slots):
-            tris_faces = []
-            for face in bm.faces:
-                if face.material_index != mate_index:
-                    continue
-                if len(face.verts) == 3:
-                    tris_faces.extend(vert_index_from_loops(reversed(face.loops)))
-                elif len(face.verts) == 4 and self.is_convert_tris:
-                    v1 = face.loops[0].vert.co - face.loops[2].vert.co
-                    v2 = face.loops[1].vert.co - face.loops[3].vert.co
-                    if v1.length < v2.length:
-                        f1 = [0, 1, 2]
-                        f2 = [0, 2, 3]
+    def parse_triangles(self, mesh, split, is_convert_tris=True):
+        """マテリアルごとの三角面の頂点番号の配列のリストを返す"""
+        loop_starts = mesh.face_loop_starts
+        loop_totals = mesh.face_loop_totals
+        material_indices = mesh.face_material_indices
+
+        # 面ごとに (三角面のループ番号, 面番号, 面内の順番) を作る
+        # ループは逆順にたどるので、面内の i 番目は loop_start + loop_total - 1 - i
+        tri_loops, tri_faces, tri_orders = [], [], []
+        for total in np.unique(loop_totals).tolist():
+            if total < 3 or (3 < total and not is_convert_tris):
+                continue
+            faces = np.flatnonzero(loop_totals == total)
+            reversed_loops = loop_starts[faces, np.newaxis] + (total - 1 - np.arange(total))
+            if total == 3:
+                loops = reversed_loops[:, np.newaxis, :]
+            elif total == 4:
+                # 短い方の対角線で分割
+                face_cos = mesh.co[split.loop_vertices[loop_starts[faces, np.newaxis] + np.arange(4)]]
+                v1 = face_cos[:, 0] - face_cos[:, 2]
+                v2 = face_cos[:, 1] - face_cos[:, 3]
+                is_short = np.einsum('ij,ij->i', v1, v1) < np.einsum('ij,ij->i', v2, v2)
+                points = np.where(is_short[:, np.newaxis, np.newaxis], [[0, 1, 2], [0, 2, 3]], [[0, 1, 3], [1, 2, 3]])
+                loops = np.take_along_axis(reversed_loops[:, np.newaxis, :], points, axis=2)
+            else:
+                # 両端から交互に詰めていく
+                points = []
+                seek_min, seek_max = 0, total - 1
+                for tri_index in range(total - 2):
+                    if not tri_index % 2:
+                        points.append([seek_min, seek_min + 1, seek_max])
+                        seek_min += 1
                     else:
-                        f1 = [0, 1, 3]
-                        f2 = [1, 2, 3]
-                    faces, faces2 = [], []
-                    for i, vert_index in enumerate(vert_index_from_loops(reversed(face.loops))):
-                        if i in f1:
-                            faces.append(vert_index)
-                        if i in f2:
-                            faces2.append(vert_index)
-                    tris_faces.extend(faces)
-                    tris_faces.extend(faces2)
-                elif 5 <= len(face.verts) and self.is_convert_tris:
-                    face_count = len(face.verts) - 2
-
-                    tris = []
-                    seek_min, seek_max = 0, len(face.verts) - 1
-                    for i in range(face_count):
-                        if not i % 2:
-                            tris.append([seek_min, seek_min + 1, seek_max])
-                            seek_min += 1
-                        else:
-                            tris.append([seek_min, seek_max - 1, seek_max])
-                            seek_max -= 1
-
-                    tris_indexs = [[] for _ in range(len(tris))]
-                    for i, vert_index in enumerate(vert_index_from_loops(reversed(face.loops))):
-                        for tris_index, points in enumerate(tris):
-                            if i in points:
-                                tris_indexs[tris_index].append(vert_index)
-
-                    tris_faces.extend(p for ps in tris_indexs for p in ps)
-
-            triangles.append(tris_faces)
-        return triangles
+                        points.append([seek_min, seek_max - 1, seek_max])
+                        seek_max -= 1
+                loops = reversed_loops[:, points]
+            tri_loops.append(loops.reshape(-1, 3))
+            tri_faces.append(np.repeat(faces, loops.shape[1]))
+            tri_orders.append(np.tile(np.arange(loops.shape[1]), len(faces)))
+
+        slot_count = len(mesh.materials)
+        if not tri_loops:
+            return [np.empty(0, dtype=np.int64) for _ in range(slot_count)]
+        tri_loops = np.concatenate(tri_loops)
+        tri_faces = np.concatenate(tri_faces)
+        tri_orders = np.concatenate(tri_orders)
+
+        # マテリアル→面→面内の順に並べて、マテリアルごとに切り分ける
+        tri_materials = material_indices[tri_faces]
+        order = np.lexsort((tri_orders, tri_faces, tri_materials))
+        tri_verts = split.loop_indices[tri_loops[order]]
+        bounds = np.searchsorted(tri_materials[order], np.arange(slot_count + 1))
+        return [tri_verts[bounds[i]:bounds[i + 1]].ravel() for i in range(slot_count)]
 
     def calc_tangents(self, cm_tris, cm_verts, cm_norms, cm_uvs):
+        """三角面の接線を頂点ごとに足し合わせて (x, y, z, w) の配列を返す"""
         count = len(cm_verts)
-        tan1 = [None] * count
-        tan2 = [None] * count
-        for i in range(0, count):
-            tan1[i] = mathutils.Vector((0, 0, 0))
-            tan2[i] = mathutils.Vector((0, 0, 0))
-
-        for tris in cm_tris:
-            tri_len = len(tris)
-            tri_idx = 0
-            while tri_idx < tri_len:
-                i1, i2, i3 = tris[tri_idx], tris[tri_idx + 1], tris[tri_idx + 2]
-                v1, v2, v3 = cm_verts[i1], cm_verts[i2], cm_verts[i3]
-                w1, w2, w3 = cm_uvs[i1], cm_uvs[i2], cm_uvs[i3]
-
-                a1 = v2 - v1
-                a2 = v3 - v1
-                s1 = w2 - w1
-                s2 = w3 - w1
-                
-                r_inverse = (s1.x * s2.y - s2.x * s1.y)
-
-                if r_inverse != 0:
-                    # print("i1 = {i1}   i2 = {i2}   i3 = {i3}".format(i1=i1, i2=i2, i3=i3))
-                    # print("v1 = {v1}   v2 = {v2}   v3 = {v3}".format(v1=v1, v2=v2, v3=v3))
-                    # print("w1 = {w1}   w2 = {w2}   w3 = {w3}".format(w1=w1, w2=w2, w3=w3))
-
-                    # print("a1 = {a1}   a2 = {a2}".format(a1=a1, a2=a2))
-                    # print("s1 = {s1}   s2 = {s2}".format(s1=s1, s2=s2))
-                    
-                    # print("r_inverse = ({s1x} * {s2y} - {s2x} * {s1y}) = {r_inverse}".format(r_inverse=r_inverse, s1x=s1.x, s1y=s1.y, s2x=s2.x, s2y=s2.y))
-                                                
-                    r = 1.0 / r_inverse
-                    sdir = mathutils.Vector(((s2.y * a1.x - s1.y * a2.x) * r, (s2.y * a1.y - s1.y * a2.y) * r, (s2.y * a1.z - s1.y * a2.z) * r))
-                    tan1[i1] += sdir
-                    tan1[i2] += sdir
-                    tan1[i3] += sdir
-
-                    tdir = mathutils.Vector(((s1.x * a2.x - s2.x * a1.x) * r, (s1.x * a2.y - s2.x * a1.y) * r, (s1.x * a2.z - s2.x * a1.z) * r))
-                    tan2[i1] += tdir
-                    tan2[i2] += tdir
-                    tan2[i3] += tdir
-
-                tri_idx += 3
-
-        tangents = [None] * count
-        for i in range(0, count):
-            n = cm_norms[i]
-            ti = tan1[i]
-            t = (ti - n * n.dot(ti)).normalized()
-
-            c = n.cross(ti)
-            val = c.dot(tan2[i])
-            w = 1.0 if val < 0 else -1.0
-            tangents[i] = (-t.x, t.y, t.z, w)
+        cm_verts = np.asarray(cm_verts, dtype=np.float64)
+        cm_norms = np.asarray(cm_norms, dtype=np.float64)
+        cm_uvs = np.asarray(cm_uvs, dtype=np.float64)
+        tris = np.concatenate([np.asarray(tris, dtype=np.int64) for tris in cm_tris] or [np.empty(0, dtype=np.int64)]).reshape(-1, 3)
+
+        v1, v2, v3 = cm_verts[tris[:, 0]], cm_verts[tris[:, 1]], cm_verts[tris[:, 2]]
+        w1, w2, w3 = cm_uvs[tris[:, 0]], cm_uvs[tris[:, 1]], cm_uvs[tris[:, 2]]
+        a1 = v2 - v1
+        a2 = v3 - v1
+        s1 = w2 - w1
+        s2 = w3 - w1
+
+        r_inverse = s1[:, 0] * s2[:, 1] - s2[:, 0] * s1[:, 1]
+        is_valid = r_inverse != 0
+        tris, a1, a2, s1, s2 = tris[is_valid], a1[is_valid], a2[is_valid], s1[is_valid], s2[is_valid]
+        r = 1.0 / r_inverse[is_valid, np.newaxis]
+        sdir = (s2[:, 1:2] * a1 - s1[:, 1:2] * a2) * r
+        tdir = (s1[:, 0:1] * a2 - s2[:, 0:1] * a1) * r
+
+        tan1 = np.zeros((count, 3))
+        tan2 = np.zeros((count, 3))
+        for corner in range(3):
+            np.add.at(tan1, tris[:, corner], sdir)
+            np.add.at(tan2, tris[:, corner], tdir)
+
+        # 法線に直交化して正規化 (長さ0のものは0のまま)
+        t = tan1 - cm_norms * np.einsum('ij,ij->i', cm_norms, tan1)[:, np.newaxis]
+        length = np.linalg.norm(t, axis=1)
+        t = np.divide(t, length[:, np.newaxis], out=np.zeros_like(t), where=length[:, np.newaxis] > 0)
+
+        val = np.einsum('ij,ij->i', np.cross(cm_norms, tan1), tan2)
+        # ファイルと同じ float32 にしておく (比較やハッシュが書き出す値と一致するように)
+        tangents = np.empty((count, 4), dtype=np.float32)
+        tangents[:, 0] = -t[:, 0]
+        tangents[:, 1:3] = t[:, 1:3]
+        tangents[:, 3] = np.where(val < 0, 1.0, -1.0)
+        return tangents
 
+    def calc_mikktspace_tangents(self, mesh, split):
+        """BlenderのMikkTSpace接線をCM3D2の頂点ごとに平均して (x, y, z, w) の配列を返す"""
+        loop_tangents = mesh.loop_tangents
+        loop_signs = mesh.loop_bitangent_signs
+
+        count = len(split)
+        tangent_sums = np.zeros((count, 3))
+        np.add.at(tangent_sums, split.loop_indices, loop_tangents)
+        sign_sums = np.bincount(split.loop_indices, weights=loop_signs, minlength=count)
+
+        t = compat.convert_bl_to_cm_space_array(tangent_sums).astype(np.float64)
+        length = np.linalg.norm(t, axis=1)
+        t = np.divide(t, length[:, np.newaxis], out=np.zeros_like(t), where=length[:, np.newaxis] > 0)
+
+        # CM3D2の空間は鏡映なので、Blenderの bitangent_sign がそのまま w になる
+        tangents = np.empty((count, 4), dtype=np.float32)
+        tangents[:, 0] = -t[:, 0]
+        tangents[:, 1:3] = t[:, 1:3]
+        tangents[:, 3] = np.where(sign_sums < 0, -1.0, 1.0)
         return tangents
 
     def select_no_weight_vertices(self, context, local_bone_name_indices):
@@ -1022,6 +1495,196 @@ class CNV_OT_export_cm3d2_model(bpy.types.Operator):
             yield container[name]
 
 
+# メインオペレーター
+@compat.BlRegister()
+class CNV_OT_export_cm3d2_model(bpy.types.Operator, model_export_opr):
+    bl_idname = 'export_mesh.export_cm3d2_model'
+    bl_label = "CM3D2モデル (.model)"
+    bl_description = "カスタムメイド3D2のmodelファイルを書き出します"
+    bl_options = {'REGISTER'}
+
+
+# 一括エクスポート
+@compat.BlRegister()
+class CNV_OT_export_cm3d2_model_batch(bpy.types.Operator, model_export_opr):
+    bl_idname = 'export_mesh.export_cm3d2_model_batch'
+    bl_label = "CM3D2モデル一括 (.model)"
+    bl_description = "Export every selected mesh, or every collection with a selected mesh, to its own .model file in one go"
+    bl_options = {'REGISTER'}
+
+    directory = bpy.props.StringProperty(subtype='DIR_PATH')
+
+    # 自動の場合はエクスポートするオブジェクトごとに決める
+    items = [
+        ('AUTO', "Auto", "Use the version saved in each object (1000 if it has none)", 'NONE', 3),
+        ('2001', '2001', 'model version 2001 (available only for com3d2)', 'NONE', 0),
+        ('2000', '2000', 'model version 2000 (com3d2 version)', 'NONE', 1),
+        ('1000', '1000', 'model version 1000 (available for cm3d2/com3d2)', 'NONE', 2),
+    ]
+    version = bpy.props.EnumProperty(items=items, name="ファイルバージョン", default='AUTO')
+    items = [
+        ('AUTO'             , "Auto", "Choose for each object, like the single export does", 'AUTO', 5),
+        ('ARMATURE'         , "アーマチュア", "", 'OUTLINER_OB_ARMATURE', 1),
+        ('TEXT'             , "テキスト", "", 'FILE_TEXT', 2),
+        ('OBJECT_PROPERTY'  , "オブジェクト内プロパティ", "", 'OBJECT_DATAMODE', 3),
+        ('ARMATURE_PROPERTY', "アーマチュア内プロパティ", "", 'ARMATURE_DATA', 4),
+    ]
+    bone_info_mode = bpy.props.EnumProperty(items=items, name="ボーン情報元", default='AUTO', description="modelファイルに必要なボーン情報をどこから引っ張ってくるか選びます")
+    # 自動のままオブジェクトから決まらなかった場合の値
+    AUTO_FALLBACKS = {'version': '1000', 'bone_info_mode': 'OBJECT_PROPERTY'}
+
+    items = [
+        ('OBJECTS'    , "Objects"    , "One .model per selected mesh object", 'OBJECT_DATA', 1),
+        ('COLLECTIONS', "Collections", "One .model per collection with a selected mesh, joining its meshes (Blender 2.80+)", 'GROUP', 2),
+    ]
+    target_mode = bpy.props.EnumProperty(items=items, name="Targets", default='OBJECTS', description="What becomes one .model file")
+    max_workers = bpy.props.IntProperty(name="Threads", default=0, min=0, max=64, description="Number of files written at the same time (0: number of CPUs)")
+
+    @classmethod
+    def poll(cls, context):
+        return any(ob.type == 'MESH' for ob in context.selected_objects)
+
+    def invoke(self, context, event):
+        prefs = common.preferences()
+        self.directory = os.path.split(common.default_cm3d2_dir(prefs.model_default_path or prefs.model_export_path, None, "model"))[0]
+        self.is_backup = bool(prefs.backup_ext)
+        self.scale = 1.0 / prefs.scale
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def draw(self, context):
+        if not compat.IS_LEGACY:
+            self.layout.prop(self, 'target_mode', expand=True)
+        self.layout.prop(self, 'max_workers')
+        model_export_opr.draw(self, context)
+
+    def get_targets(self, context):
+        """(基準オブジェクト, オブジェクトのリスト) のリストを返す"""
+        selected_meshes = [ob for ob in context.selected_objects if ob.type == 'MESH']
+        if compat.IS_LEGACY or self.target_mode == 'OBJECTS':
+            return [(ob, [ob]) for ob in selected_meshes]
+
+        targets = []
+        for collection in context.blend_data.collections:
+            if not any(ob in selected_meshes for ob in collection.objects):
+                continue
+            obs = [ob for ob in collection.objects if ob.type == 'MESH']
+            ob_main = context.active_object if context.active_object in obs else obs[0]
+            targets.append((ob_main, obs))
+        in_collection = set(ob.name for ob_main, obs in targets for ob in obs)
+        targets.extend((ob, [ob]) for ob in selected_meshes if ob.name not in in_collection)
+        return targets
+
+    def get_target_options(self, context, options, ob):
+        """ダイアログの設定から1つのターゲット用の設定を作る (自動の項目だけオブジェクトに合わせる)"""
+        target_options = dict(options, model_name='*', base_bone_name='*')
+        source_defaults = self.get_source_defaults(context, ob)
+        for key, fallback in self.AUTO_FALLBACKS.items():
+            if target_options[key] == 'AUTO':
+                target_options[key] = source_defaults.get(key, fallback)
+        return target_options
+
+    def execute(self, context):
+        start_time = time.time()
+        targets = self.get_targets(context)
+        if not targets:
+            return self.report_cancel("No mesh objects selected")
+        self.is_batch = True
+        # gather() は self の設定を読み書きするので、ダイアログの設定を控えておいてターゲットごとに設定し直す
+        options = {key: getattr(self, key) for key in ('version', 'bone_info_mode', 'model_name', 'base_bone_name')}
+        messages = self.get_write_messages()
+
+        pre_selected = context.selected_objects[:]
+        pre_active = context.active_object
+        if pre_active and pre_active.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        # シーンのデータはメインスレッドで集め、書き出しはワーカースレッドで行う
+        results = []
+        used_paths = set()
+        manifest = ExportManifest(bpy.path.abspath(self.directory)) if self.is_incremental else None
+        max_workers = self.max_workers or os.cpu_count() or 1
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for ob_main, obs in targets:
+                    for ob in context.selected_objects:
+                        compat.set_select(ob, False)
+                    for ob in obs:
+                        compat.set_select(ob, True)
+                    compat.set_active(context, ob_main)
+
+                    for key, value in self.get_target_options(context, options, ob_main).items():
+                        setattr(self, key, value)
+                    gathered = []
+                    def gather(context, ob, source_obs):
+                        gathered.append(self.gather(context, ob, source_obs))
+                        return {'FINISHED'} if isinstance(gathered[0], dict) else gathered[0]
+                    self.export_objects(context, ob_main, obs, gather, is_join=len(obs) > 1)
+                    model_datas = gathered[0] if gathered else None
+                    if not isinstance(model_datas, dict):
+                        results.append((ob_main.name, None, None, f_tip_("Skipped, see the messages above")))
+                        continue
+
+                    filepath = os.path.join(bpy.path.abspath(self.directory), model_datas['model_name'] + ".model")
+                    if filepath in used_paths:
+                        results.append((ob_main.name, filepath, None, f_tip_("Skipped, another target already writes this file")))
+                        continue
+                    used_paths.add(filepath)
+                    digest = None
+                    if manifest:
+                        digest = model_datas_hash(model_datas)
+                        if manifest.is_unchanged(filepath, digest):
+                            results.append((ob_main.name, filepath, None, None))
+                            continue
+                    future = executor.submit(self.write_file, filepath, model_datas, common.get_backup_filepath(filepath, self.is_backup), messages)
+                    future.digest = digest
+                    results.append((ob_main.name, filepath, future, None))
+                context.window_manager.progress_end()
+
+                # 結果の一覧
+                export_count = 0
+                skip_count = 0
+                self.report(type={'INFO'}, message=f_tip_("Batch export of {count} models:", count=len(results)))
+                for name, filepath, future, error in results:
+                    if future:
+                        try:
+                            acmr = future.result()
+                            export_count += 1
+                            self.report(type={'INFO'}, message=f_tip_("  {name}: written {path}", name=name, path=filepath))
+                            if acmr:
+                                self.report(type={'INFO'}, message=f_tip_("    Vertex cache ACMR {before:.3f} -> {after:.3f}", before=acmr[0], after=acmr[1]))
+                            if future.digest:
+                                manifest.update(filepath, future.digest)
+                            continue
+                        except Exception as e:
+                            error = str(e)
+                    elif not error:
+                        skip_count += 1
+                        self.report(type={'INFO'}, message=f_tip_("  {name}: unchanged, skipped {path}", name=name, path=filepath))
+                        continue
+                    self.report(type={'WARNING'}, message=f_tip_("  {name}: {error}", name=name, error=error))
+
+                if manifest:
+                    try:
+                        manifest.save()
+                    except OSError as e:
+                        self.report(type={'WARNING'}, message=f_tip_("Could not save the export hashes: {error}", error=e))
+        finally:
+            for key, value in options.items():
+                setattr(self, key, value)
+            for ob in context.selected_objects:
+                compat.set_select(ob, False)
+            for ob in pre_selected:
+                compat.set_select(ob, True)
+            if pre_active:
+                compat.set_active(context, pre_active)
+
+        diff_time = time.time() - start_time
+        self.report(type={'INFO'}, message=f_tip_("Exported {exported} and skipped {skipped} unchanged of {count} models in {time:.2f} seconds", exported=export_count, skipped=skip_count, count=len(results), time=diff_time))
+        return {'FINISHED'} if export_count or skip_count else {'CANCELLED'}
+
+
 # メニューを登録する関数
 def menu_func(self, context):
     self.layout.operator(CNV_OT_export_cm3d2_model.bl_idname, icon_value=common.kiss_icon())
+    self.layout.operator(CNV_OT_export_cm3d2_model_batch.bl_idname, icon_value=common.kiss_icon())
@@ -3,11 +3,11 @@ import math
 import struct
 import time
 import traceback
+import concurrent.futures
 import bpy
 import bpy_extras
-import bmesh
 import mathutils
-from collections import Counter
+import numpy as np
 from . import common
 from . import compat
 from . import cm3d2_data
@@ -15,6 +15,283 @@ from .translations.pgettext_functions import *
 from .misc_OBJECT_PT_transform import CNV_OT_align_to_cm3d2_base_bone
 
 
+# 頂点グループにウェイトをまとめて割り当てる
+def assign_vertex_group_weights(vertex_groups, bone_indices, weights):
+    """Assign (V, 4) local bone indices/weights with one `add` call per (group, weight) pair.
+
+    vertex_groups is indexed by local bone; bones that share a vertex group are
+    merged first, so a vertex gets one weight per group. The weights are used
+    as they are, so the number of calls is the number of distinct weights per
+    group: batching only saves calls when many vertices share a weight (such as
+    1.0, or the steps of a tool that quantizes weights).
+
+    Returns the names of the vertex groups that received a non-zero weight.
+    """
+    # ボーン番号 -> 割り当て先の頂点グループ番号 (名前が同じなら同じグループ)
+    groups = []
+    group_numbers = {}
+    bone_groups = []
+    for vertex_group in vertex_groups:
+        if vertex_group.name not in group_numbers:
+            group_numbers[vertex_group.name] = len(groups)
+            groups.append(vertex_group)
+        bone_groups.append(group_numbers[vertex_group.name])
+    bone_groups = np.array(bone_groups + [-1], dtype=np.int64)
+    group_count = len(groups)
+
+    bone_count = len(vertex_groups)
+    influence_count = bone_indices.shape[1] if bone_indices.ndim == 2 else 1
+    vert_indices = np.repeat(np.arange(len(bone_indices), dtype=np.int64), influence_count)
+    bone_indices = np.asarray(bone_indices, dtype=np.int64).ravel()
+    weights = np.asarray(weights, dtype=np.float32).ravel()
+
+    mask = (0.0 < weights) & (0 <= bone_indices) & (bone_indices < bone_count)
+    vert_indices, group_indices, weights = vert_indices[mask], bone_groups[bone_indices[mask]], weights[mask]
+    if not len(weights):
+        return set()
+
+    # 同じ頂点に同じグループが複数回ある場合は 'REPLACE' と同様に最後の値を使う
+    keys = vert_indices * group_count + group_indices
+    _, last = np.unique(keys[::-1], return_index=True)
+    last = len(keys) - 1 - last
+    vert_indices, group_indices, weights = vert_indices[last], group_indices[last], weights[last]
+
+    order = np.lexsort((vert_indices, weights, group_indices))
+    vert_indices, group_indices, weights = vert_indices[order], group_indices[order], weights[order]
+    starts = np.flatnonzero(np.r_[True, (group_indices[1:] != group_indices[:-1]) | (weights[1:] != weights[:-1])])
+    ends = np.r_[starts[1:], len(weights)]
+
+    used_group_names = set()
+    vert_list = vert_indices.tolist()
+    for start, end, group_index, weight in zip(starts.tolist(), ends.tolist(), group_indices[starts].tolist(), weights[starts].tolist()):
+        vertex_group = groups[group_index]
+        vertex_group.add(vert_list[start:end], weight, 'REPLACE')
+        used_group_names.add(vertex_group.name)
+    return used_group_names
+
+
+# 位置と法線が同一の頂点をまとめる
+def weld_vertices(co, normal):
+    """Group vertices whose position and normal are bit-identical.
+
+    Returns (weld_map, weld_source): weld_map maps every file vertex to its welded vertex,
+    weld_source is the first file vertex of each welded vertex. Welded vertices keep the file order.
+    """
+    keys = np.ascontiguousarray(np.concatenate((co, normal), axis=1), dtype=np.float32)
+    keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+    _, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse.ravel()].astype(np.int32), first_index[order].astype(np.int32)
+
+
+def face_edge_keys(faces, vert_count):
+    """Return one undirected edge key per loop of a triangle array."""
+    faces = np.asarray(faces, dtype=np.int64)
+    v1, v2 = faces.ravel(), np.roll(faces, -1, axis=1).ravel()
+    return np.minimum(v1, v2) * vert_count + np.maximum(v1, v2)
+
+
+def row_ids(*arrays):
+    """Return an id per row that is equal for bit-identical rows of the given (N, k) arrays."""
+    rows = np.ascontiguousarray(np.concatenate([np.asarray(array, dtype=np.float32).reshape(len(array), -1) for array in arrays], axis=1))
+    rows = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+    return np.unique(rows, return_inverse=True)[1].ravel()
+
+
+# UVや法線の切れ目からシャープ/シームにする辺を求める
+def calc_edge_flags(faces, vert_count, loop_co, loop_uvs, loop_normals):
+    """Return (edge_keys, is_sharp, is_seam) for the edges of the mesh.
+
+    The loops around an edge are grouped by the positions of its ends, so the
+    result is the same whether or not duplicated vertices were welded: an edge
+    is a seam where the faces around it have different UVs at its ends, and
+    sharp where they have different normals. Boundary edges are neither.
+    """
+    loop_keys = face_edge_keys(faces, vert_count)
+    edge_keys, loop_edges = np.unique(loop_keys, return_inverse=True)
+    loop_edges = loop_edges.ravel()
+    if not len(loop_keys):
+        return edge_keys, np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+
+    # 位置の同じ辺ごとにまとめる
+    loops = np.arange(len(loop_keys))
+    position_ids = row_ids(loop_co)
+    next_loops = np.roll(loops.reshape(-1, 3), -1, axis=1).ravel()
+    is_reversed = position_ids > position_ids[next_loops]
+    first_loops = np.where(is_reversed, next_loops, loops)
+    second_loops = np.where(is_reversed, loops, next_loops)
+    position_count = int(position_ids.max()) + 1
+    geometry_edge_keys, geometry_edges = np.unique(position_ids[first_loops].astype(np.int64) * position_count + position_ids[second_loops], return_inverse=True)
+    geometry_edges = geometry_edges.ravel()
+
+    def is_split(loop_values):
+        # 辺の両端の値の組み合わせが2種類以上あれば切れ目
+        value_ids = row_ids(loop_values[first_loops], loop_values[second_loops])
+        value_count = int(value_ids.max()) + 1
+        pairs = np.unique(geometry_edges.astype(np.int64) * value_count + value_ids)
+        split_geometry_edges = np.bincount(pairs // value_count, minlength=len(geometry_edge_keys)) > 1
+        is_split_edge = np.zeros(len(edge_keys), dtype=bool)
+        np.logical_or.at(is_split_edge, loop_edges, split_geometry_edges[geometry_edges])
+        return is_split_edge
+
+    return edge_keys, is_split(loop_normals), is_split(loop_uvs)
+
+
+def set_edge_flags(me, edge_keys, vert_count, **flags):
+    """Write per-edge boolean arrays (indexed like edge_keys) to the mesh edges."""
+    edge_vertices = np.empty(len(me.edges) * 2, dtype=np.int32)
+    me.edges.foreach_get('vertices', edge_vertices)
+    edge_vertices = edge_vertices.reshape(-1, 2).astype(np.int64)
+    edge_index = np.searchsorted(edge_keys, edge_vertices.min(axis=1) * vert_count + edge_vertices.max(axis=1))
+    for attr, values in flags.items():
+        me.edges.foreach_set(attr, values[edge_index])
+
+
+# modelファイルを読み込む (ワーカースレッドで実行される)
+def read_model(filepath):
+    """Read every section of a .model file without touching bpy data.
+
+    Returns (model, None, 0) on success, otherwise (None, exception, byte position).
+    """
+    try:
+        model = cm3d2_data.ModelReader(filepath)
+    except Exception as e:
+        return None, e, 0
+    with model:
+        try:
+            return model.read_all(), None, 0
+        except UnicodeDecodeError as e:
+            return None, e, model.tell() - len(e.object)
+        except (struct.error, common.CM3D2ImportException) as e:
+            return None, e, model.tell()
+
+
+# 同じスケルトンを持つmodelを見分けるためのキー
+def skeleton_key(model):
+    return (model.base_bone, tuple(
+        (data['name'], data['parent_index'], tuple(data['co']), tuple(data['rot']), tuple(data['scale']) if 'scale' in data else None)
+        for data in model.bones
+    ))
+
+
+# ボーンのレストポーズの行列 (アーマチュア空間) を求める
+def bone_rest_matrix(data, parent_mat, scale):
+    """parent_mat is the matrix of the parent bone, or None for a root bone."""
+    if parent_mat is None:
+        co_mat  = mathutils.Matrix.Translation(data['co'].copy() * scale)
+        rot_mat = mathutils.Quaternion(data['rot'].copy()).to_matrix().to_4x4()
+        mat = compat.mul(co_mat, rot_mat)
+        mat = compat.convert_cm_to_bl_bone_rotation(mat)
+        return compat.convert_cm_to_bl_space(mat)
+
+    local_co_mat  = mathutils.Matrix.Translation(data['co'].copy() * scale)
+    local_rot_mat = data['rot'].copy().to_matrix().to_4x4()
+    local_mat     = compat.mul(local_co_mat, local_rot_mat)
+    local_mat     = compat.convert_cm_to_bl_bone_space(local_mat)
+    mat = compat.mul(parent_mat, local_mat)
+    return compat.convert_cm_to_bl_bone_rotation(mat)
+
+
+def bone_rest_matrices(bone_data, scale):
+    """Return {bone index: rest matrix} for every bone whose parent chain reaches a root."""
+    matrices = {}
+    for index in sort_bones_parent_first(bone_data):
+        data = bone_data[index]
+        matrices[index] = bone_rest_matrix(data, matrices.get(data['parent_index']), scale)
+    return matrices
+
+
+# 読み込むmodelとボーン構成が合うアーマチュアをシーンから探す
+def find_compatible_armature(context, base_bone, base_bone_name, bones, tolerance=1e-4):
+    """Return an armature object with the same base bone whose bones shared with
+    bones ((name, parent name, rest matrix) tuples) also have the same parents
+    and, including the object transform, the same rest pose, or None.
+
+    Head positions may differ by tolerance, and the elements of the normalized
+    rotation matrices by 1e-4.
+    """
+    for ob in context.scene.objects:
+        if ob.type != 'ARMATURE':
+            continue
+        arm = ob.data
+        if arm.get('BaseBone', base_bone) != base_bone or base_bone_name not in arm.bones:
+            continue
+        for name, parent_name, matrix in bones:
+            bone = arm.bones.get(name)
+            if not bone:
+                continue
+            if (bone.parent.name if bone.parent else None) != parent_name:
+                break
+            world_matrix = compat.mul(ob.matrix_world, bone.matrix_local)
+            if (world_matrix.to_translation() - matrix.to_translation()).length > tolerance:
+                break
+            rot_a, rot_b = world_matrix.to_3x3().normalized(), matrix.to_3x3().normalized()
+            if any(abs(a - b) > 1e-4 for row_a, row_b in zip(rot_a, rot_b) for a, b in zip(row_a, row_b)):
+                break
+        else:
+            return ob
+    return None
+
+
+# 「BoneData:0」のような連番のカスタムプロパティに書き込む
+def set_indexed_data(target, prefix, lines, merge=False):
+    """With merge, keep the existing entries and only append lines whose name (first field) is new."""
+    if not merge:
+        for i, s in enumerate(lines):
+            target[prefix + str(i)] = s
+        return
+    count = 0
+    names = set()
+    while prefix + str(count) in target:
+        names.add(target[prefix + str(count)].split(",", 1)[0])
+        count += 1
+    for s in lines:
+        name = s.split(",", 1)[0]
+        if name not in names:
+            names.add(name)
+            target[prefix + str(count)] = s
+            count += 1
+
+
+# 親ボーンが必ず先に来るボーンの作成順を求める
+def sort_bones_parent_first(bone_data):
+    """Return bone_data indices in creation order, each parent before its children.
+
+    Roots come first, then the other bones in the order the former requeue loop
+    created them: one pass over the file per level of backward parent reference.
+    Bones whose parent chain never reaches a root are left out.
+    """
+    bone_count = len(bone_data)
+    rounds = [None] * bone_count
+    for index in range(bone_count):
+        chain = []
+        current = index
+        while 0 <= current < bone_count and rounds[current] is None and current not in chain:
+            chain.append(current)
+            current = bone_data[current]['parent_index']
+        if current == -1:
+            parent_round = None
+        elif 0 <= current < bone_count and rounds[current] is not None:
+            parent_round = rounds[current]
+        else:
+            parent_round = -1
+        for bone_index in reversed(chain):
+            if parent_round == -1:
+                rounds[bone_index] = -1
+            elif parent_round is None:
+                rounds[bone_index] = 0
+            elif parent_round == 0:
+                rounds[bone_index] = 1
+            else:
+                parent_index = bone_data[bone_index]['parent_index']
+                rounds[bone_index] = parent_round if parent_index < bone_index else parent_round + 1
+            parent_round = rounds[bone_index]
+
+    return sorted((index for index in range(bone_count) if rounds[index] != -1), key=lambda index: (rounds[index], index))
+
+
 # メインオペレーター
 @compat.BlRegister()
 #@bpy_extras.io_utils.orientation_helper(axis_forward='-Z', axis_up='Y')
@@ -25,6 +302,8 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
     bl_options = {'REGISTER'}
 
     filepath = bpy.props.StringProperty(subtype='FILE_PATH')
+    files = bpy.props.CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory = bpy.props.StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
     filename_ext = ".model"
     filter_glob = bpy.props.StringProperty(default="*.model", options={'HIDDEN'})
 
@@ -33,7 +312,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
     is_mesh = bpy.props.BoolProperty(name="メッシュ生成", default=True, description="ポリゴンを読み込みます、大抵の場合オンでOKです")
     is_remove_doubles = bpy.props.BoolProperty(name="重複頂点を結合", default=True, description="UVの切れ目でポリゴンが分かれている仕様なので、インポート時にくっつけます")
     is_seam = bpy.props.BoolProperty(name="シームをつける", default=True, description="UVの切れ目にシームをつけます")
-    is_sharp = bpy.props.BoolProperty(name="Mark Sharp", default=True, description="This will mark removed doubles on your mesh as sharp (or all free edges if not removing doubles).")
+    is_sharp = bpy.props.BoolProperty(name="Mark Sharp", default=True, description="Mark the edges where the normals of the model are split as sharp")
 
     is_convert_bone_weight_names = bpy.props.BoolProperty(name="頂点グループ名をBlender用に変換", default=False, description="全ての頂点グループ名をBlenderの左右対称編集で使えるように変換してから読み込みます")
     is_vertex_group_sort = bpy.props.BoolProperty(name="頂点グループを名前順ソート", default=True, description="頂点グループを名前順でソートします")
@@ -47,10 +326,15 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
     is_armature_clean = bpy.props.BoolProperty(name="不要なボーンを削除", default=False, description="ウェイトが無いボーンを削除します")
     is_custom_bones = bpy.props.BoolProperty(name="Use Custom Bones", default=False, description="Use the currently selected object for custom bone shapes.")\
     
+    is_share_armature = bpy.props.BoolProperty(name="Share Armatures", default=True, description="When importing several files, bind the models that have the same skeleton to one armature")
+    is_use_existing_armature = bpy.props.BoolProperty(name="Use Existing Armature", default=False, description="Bind the model to an armature in the scene with the same base bone and bone hierarchy, adding only the bones it lacks")
+    
     is_bone_data_text = bpy.props.BoolProperty(name="テキスト", default=True, description="ボーン情報をテキストとして読み込みます")
     is_bone_data_obj_property = bpy.props.BoolProperty(name="オブジェクトのカスタムプロパティ", default=True, description="メッシュオブジェクトのカスタムプロパティにボーン情報を埋め込みます")
     is_bone_data_arm_property = bpy.props.BoolProperty(name="アーマチュアのカスタムプロパティ", default=True, description="アーマチュアデータのカスタムプロパティにボーン情報を埋め込みます")
-    texpath_dict = None
+    tex_session = None
+    custom_bone_ob = None
+    progress_offset = 0
 
     @classmethod
     def poll(cls, context):
@@ -105,6 +389,8 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
         row = sub_box.row()
         row.prop    (self , 'is_custom_bones'             , icon=compat.icon('BONE_DATA'), text="Use Selected as Bone Shape"     )
         row.enabled = bool(context.object)
+        sub_box.prop(self , 'is_share_armature'           , icon='LINKED'                                                         )
+        sub_box.prop(self , 'is_use_existing_armature'    , icon='ARMATURE_DATA'                                                  )
         
         box = self.layout.box()
         box.label(text="ボーン情報埋め込み場所")
@@ -118,229 +404,138 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
         prefs = common.preferences()
         prefs.model_import_path = self.filepath
         prefs.scale = self.scale
-        context.window_manager.progress_begin(0, 10)
-        context.window_manager.progress_update(0)
 
-        custom_bone_ob = context.active_object
-        if not custom_bone_ob:
+        filepaths = self.get_filepaths()
+        if not filepaths:
+            self.report(type={'ERROR'}, message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", self.filepath))
+            return {'CANCELLED'}
+
+        self.custom_bone_ob = context.active_object
+        if not self.custom_bone_ob:
             self.is_custom_bones = False
 
         #global_matrix = bpy_extras.io_utils.axis_conversion(from_forward=self.axis_forward, from_up=self.axis_up).to_4x4()
 
+        # 見つからないテクスチャがあっても再走査は1回だけ
+        self.tex_session = common.TexLookupSession(reload=self.reload_tex_cache)
+
+        # バイナリの解析はワーカースレッドで行い、Blenderのデータはメインスレッドで作る
+        # (読み込みは終わった順に受け取るが、名前やアーマチュアの共有が毎回同じになるようファイルの順に作る)
+        context.window_manager.progress_begin(0, 10 * len(filepaths))
+        self.progress_offset = 0
+        self.update_progress(context, 0)
+        armatures = {}
+        imported_paths = []
+        max_workers = min(len(filepaths), os.cpu_count() or 1)
         try:
-            reader = open(self.filepath, 'rb')
-        except:
-            self.report(type={'ERROR'}, message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", self.filepath))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(read_model, filepath): file_index for file_index, filepath in enumerate(filepaths)}
+                try:
+                    read_results = {}
+                    next_index = 0
+                    for future in concurrent.futures.as_completed(futures):
+                        read_results[futures[future]] = future.result()
+                        while next_index in read_results:
+                            self.build_model(context, filepaths[next_index], next_index, read_results.pop(next_index), armatures, imported_paths)
+                            next_index += 1
+                finally:
+                    # 失敗した場合はまだ始まっていない読み込みを止める
+                    for future in futures:
+                        future.cancel()
+        finally:
+            context.window_manager.progress_end()
+        self.tex_session.report_unresolved(self)
+        if not imported_paths:
             return {'CANCELLED'}
 
-        self.texpath_dict = common.get_texpath_dict(reload=self.reload_tex_cache)
-
-        with reader:
-            # ヘッダー
-            ext = None
-            try: # luvoid : utf-8 decoding could possibly throw an error here
-                ext = common.read_str(reader)
-            except:
-                ext = False
-            if ext != 'CM3D2_MESH':
-                self.report(type={'ERROR'}, message="これはカスタムメイド3D2のモデルファイルではありません")
-                return {'CANCELLED'}
-            model_ver = struct.unpack('<i', reader.read(4))[0]
-            self.report(type={'INFO'}, message=f_tip_("Model Version = {version}", version=model_ver))
-            context.window_manager.progress_update(0.1)
+        require_time = time.time() - start_time
+        filesize = sum(os.path.getsize(filepath) for filepath in imported_paths)
+        filesize_str = "バイト"
+        if 1024 * 1024 < filesize:
+            filesize = filesize / (1024 * 1024.0)
+            filesize_str = "MB"
+        elif 1024 < filesize:
+            filesize = filesize / 1024.0
+            filesize_str = "KB"
+        if len(filepaths) == 1:
+            self.report(type={'INFO'}, message=f_tip_("modelのインポートが完了しました ({} {}/ {:.2f} 秒)", filesize, filesize_str, require_time))
+        else:
+            self.report(type={'INFO'}, message=f_tip_("Imported {count} of {total} model files ({size:.2f} {unit} / {time:.2f} sec)", count=len(imported_paths), total=len(filepaths), size=filesize, unit=filesize_str, time=require_time))
 
-            try:
-                # 名前群を取得
-                model_name1 = common.read_str(reader)
-                model_name2 = common.read_str(reader)
-                context.window_manager.progress_update(0.2)
-
-                # ボーン情報読み込み
-                bone_data = []
-                bone_count = struct.unpack('<i', reader.read(4))[0]
-                for i in range(bone_count):
-                    name = common.read_str(reader)
-                    unknown = struct.unpack('<B', reader.read(1))[0]
-                    bone_data.append({'name': name, 'unknown': unknown})
-
-                for i in range(bone_count):
-                    parent_index = struct.unpack('<i', reader.read(4))[0]
-                    parent_name = None
-                    if parent_index != -1:
-                        parent_name = bone_data[parent_index]['name']
-                    bone_data[i]['parent_index'] = parent_index
-                    bone_data[i]['parent_name'] = parent_name
-
-                for i in range(bone_count):
-                    x, y, z = struct.unpack('<3f', reader.read(3*4))
-                    bone_data[i]['co'] = mathutils.Vector((x, y, z))
-
-                    x, y, z = struct.unpack('<3f', reader.read(3*4))
-                    w = struct.unpack('<f', reader.read(4))[0]
-                    bone_data[i]['rot'] = mathutils.Quaternion((w, x, y, z))
-                    if model_ver >= 2001:
-                        use_scale = struct.unpack('<B', reader.read(1))[0]
-                        if use_scale:
-                            scale_x, scale_y, scale_z = struct.unpack('<3f', reader.read(3*4))
-                            bone_data[i]['scale'] = [scale_x, scale_y, scale_z]
-
-                context.window_manager.progress_update(0.3)
-
-                print(f_("Reading vertex, mesh, and local bone count at 0x{num:02X}", num=reader.tell()))
-                vertex_count, mesh_count, local_bone_count = struct.unpack('<3i', reader.read(3*4))
-
-                # ローカルボーン情報読み込み
-                local_bone_data = []
-                for i in range(local_bone_count):
-                    local_bone_data.append({'name': common.read_str(reader)})
-
-                for i in range(local_bone_count):
-                    row0 = struct.unpack('<4f', reader.read(4 * 4))
-                    row1 = struct.unpack('<4f', reader.read(4 * 4))
-                    row2 = struct.unpack('<4f', reader.read(4 * 4))
-                    row3 = struct.unpack('<4f', reader.read(4 * 4))
-                    local_bone_data[i]['matrix'] = mathutils.Matrix([row0, row1, row2, row3])
-                context.window_manager.progress_update(0.4)
-
-                # 頂点情報読み込み
-                vertex_data = []
-                print(f_("Reading vertex data at 0x{num:02X}", num=reader.tell()))
-                extra_uv_uses = [False] * 7
-                if model_ver >= 2102: # CR Edit Mode
-                    extra_uv_uses = struct.unpack('<7?', reader.read(7))
-                    print(f_("extra_uv_uses = {boollist}", boollist=extra_uv_uses))
-                for i in range(vertex_count):
-                    co = struct.unpack('<3f', reader.read(3 * 4))
-                    no = struct.unpack('<3f', reader.read(3 * 4))
-                    uv = struct.unpack('<2f', reader.read(2 * 4))
-                    extra_uvs = [] # CR Edit
-                    for i, used in enumerate(extra_uv_uses):
-                        if used:
-                            extra_uvs.append(struct.unpack('<2f', reader.read(2 * 4)))
-                    vertex_data.append({'co': co, 'normal': no, 'uv': uv, 'extra_uvs': extra_uvs})
-                if self.is_remove_doubles:
-                    comparison_data = list(hash(repr(v['co']) + " " + repr(v['normal'])) for v in vertex_data)
-                    comparison_counter = Counter(comparison_data)
-                    comparison_data = list((comparison_counter[h] > 1) for h in comparison_data)
-                    del comparison_counter
-                print(f_("Reading unknown count at 0x{num:02X}", num=reader.tell()))
-                unknown_count = struct.unpack('<i', reader.read(4))[0]
-                for i in range(unknown_count):
-                    struct.unpack('<4f', reader.read(4 * 4))
-                for i in range(vertex_count):
-                    indexes = struct.unpack('<4H', reader.read(4 * 2))
-                    values = struct.unpack('<4f', reader.read(4 * 4))
-                    vertex_data[i]['weights'] = list({
-                            'index': index,
-                            'value': value,
-                            'name': local_bone_data[index]['name'],
-                        } for index, value in zip(indexes, values))
-                context.window_manager.progress_update(0.5)
-                # 面情報読み込み
-                face_data = []
-                for i in range(mesh_count):
-                    face_count = int(struct.unpack('<i', reader.read(4))[0] / 3)
-                    datum = [tuple(reversed(struct.unpack('<3H', reader.read(3 * 2)))) for j in range(face_count)]
-                    face_data.append(datum)
-                context.window_manager.progress_update(0.6)
-
-                # マテリアル情報読み込み
-                # TODO MaterialHandlerに変更
-                material_data = []
-                material_count = struct.unpack('<i', reader.read(4))[0]
-                for i in range(material_count):
-                    print(f_("mate count: {num} of {count} @ 0x{pos:02X}", num=i, count=material_count, pos=reader.tell()))
-                    data = cm3d2_data.MaterialHandler.read(reader, read_header=False, version=model_ver)
-                    data.name1 = data.name.lower()
-                    material_data.append(data)
-                    
-                    # name1 = common.read_str(reader)
-                    # name2 = common.read_str(reader)
-                    # name3 = common.read_str(reader)
-                    # data_list = []
-                    # material_data.append({'name1': name1, 'name2': name2, 'name3': name3, 'data': data_list})
-                    # while True:
-                    #     data_type = common.read_str(reader)
-                    #     if data_type == 'tex':
-                    #         data_item = {'type': data_type}
-                    #         data_list.append(data_item)
-                    #         data_item['name'] = common.read_str(reader)
-                    #         data_item['type2'] = common.read_str(reader)
-                    #         if data_item['type2'] == 'tex2d':
-                    #             data_item['name2'] = common.read_str(reader)
-                    #             data_item['path'] = common.read_str(reader)
-                    #             data_item['tex_map'] = struct.unpack('<4f', reader.read(4*4))
-                    #     elif data_type == 'col':
-                    #         name = common.read_str(reader)
-                    #         col = struct.unpack('<4f', reader.read(4*4))
-                    #         data_list.append({'type': data_type, 'name': name, 'color': col})
-                    #     elif data_type == 'f':
-                    #         name = common.read_str(reader)
-                    #         fval = struct.unpack('<f', reader.read(4))[0]
-                    #         data_list.append({'type': data_type, 'name': name, 'float': fval})
-                    #     else:
-                    #         break
-
-                context.window_manager.progress_update(0.8)
-
-                # その他情報読み込み
-                misc_data = []
-                while True:
-                    #print(f_("Reading data_type at 0x{num:02X}", num=reader.tell()))
-                    data_type = common.read_str(reader)
-                    if data_type == 'morph':
-                        misc_item = {'type': data_type}
-                        misc_data.append(misc_item)
-                        misc_item['name'] = common.read_str(reader)
-                        misc_item['data'] = data_list = []
-                        morph_vert_count = struct.unpack('<i', reader.read(4))[0]
-                        morph_extra_uvs = False
-                        if model_ver >= 2102: # CR Edit Mode
-                            morph_extra_uvs = struct.unpack('<?', reader.read(1))[0]
-                            misc_item['uvs'] = []
-                            print(f_("{morph}.morph_extra_uvs @ 0x{pos:02X} = {bool}", morph=misc_item['name'], bool=morph_extra_uvs, pos=reader.tell()-1))
-                        for i in range(morph_vert_count):
-                            index = struct.unpack('<H', reader.read(2))[0]
-                            co = mathutils.Vector(struct.unpack('<3f', reader.read(3 * 4)))
-                            normal = struct.unpack('<3f', reader.read(3 * 4))
-                            extra_uvs = () # CR Edit
-                            if morph_extra_uvs:
-                                extra_uvs = struct.unpack('<4f', reader.read(4 * 4))
-                            data_list.append({'index': index, 'co': co, 'normal': normal, 'color': extra_uvs})
-                    else:
-                        break
-            
-            except UnicodeDecodeError as e:
-                msg = [
-                    f_tip_("Error reading file at byte 0x{num:02X}", num=reader.tell()-len(e.object)) + "\n",
-                    str(e) + "\n",
-                    *traceback.format_tb(e.__traceback__)
-                ]
-                self.report(type={'ERROR'}, message="".join(reversed(msg))[0:-1])
-                print("".join(msg))
-                return {'CANCELLED'}
-            
-            except struct.error as e:
-                msg = [
-                    f_tip_("Error reading file at byte 0x{num:02X}", num=reader.tell()) + "\n",
-                    str(e) + "\n",
-                    *traceback.format_tb(e.__traceback__)
-                ]
-                self.report(type={'ERROR'}, message="".join(reversed(msg))[0:-1])
-                print("".join(msg))
-                return {'CANCELLED'}
+        return {'FINISHED'}
 
-            except common.CM3D2ImportException as e:
-                msg = [
-                    f_tip_("Error reading file at byte 0x{num:02X}", num=reader.tell()) + "\n",
-                    str(e) + "\n",
-                    *traceback.format_tb(e.__traceback__)
-                ]
-                self.report(type={'ERROR'}, message="".join(reversed(msg))[0:-1])
-                print("".join(msg))
-                return {'CANCELLED'}
+    def build_model(self, context, filepath, file_index, read_result, armatures, imported_paths):
+        """read_model() の結果からオブジェクトを作る (armatures は同じスケルトンのアーマチュア)"""
+        self.progress_offset = file_index * 10
+        model, error, position = read_result
+        if error:
+            self.report_read_error(filepath, error, position)
+            return
+        self.report(type={'INFO'}, message=f_tip_("Model Version = {version}", version=model.version))
+
+        arm_ob = None
+        share_key = None
+        if self.is_armature and self.is_share_armature:
+            share_key = skeleton_key(model)
+            arm_ob = armatures.get(share_key)
+        arm_ob = self.import_model(context, model, arm_ob)
+        if share_key is not None and arm_ob:
+            armatures[share_key] = arm_ob
+        imported_paths.append(filepath)
+
+    def get_filepaths(self):
+        directory = self.directory or os.path.dirname(self.filepath)
+        filepaths = [os.path.join(directory, file.name) for file in self.files if file.name]
+        if filepaths:
+            return filepaths
+        if os.path.isdir(self.filepath):
+            # ファイル未選択ならフォルダ内のmodelファイルを全て読み込む
+            return sorted(entry.path for entry in os.scandir(self.filepath) if entry.is_file() and entry.name.lower().endswith(".model"))
+        if os.path.isfile(self.filepath):
+            return [self.filepath]
+        return []
+
+    def report_read_error(self, filepath, error, position):
+        if isinstance(error, (UnicodeDecodeError, struct.error, common.CM3D2ImportException)) and position:
+            msg = [
+                f_tip_("Error reading file at byte 0x{num:02X}", num=position) + "\n",
+                str(error) + "\n",
+                *traceback.format_tb(error.__traceback__)
+            ]
+            self.report(type={'ERROR'}, message="".join(reversed(msg))[0:-1])
+            print(filepath)
+            print("".join(msg))
+        elif isinstance(error, common.CM3D2ImportException):
+            self.report(type={'ERROR'}, message=str(error))
+        else:
+            self.report(type={'ERROR'}, message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", filepath))
+
+    def update_progress(self, context, value):
+        context.window_manager.progress_update(self.progress_offset + value)
 
-        context.window_manager.progress_update(1)
+    def import_model(self, context, model, arm_ob=None):
+        """読み込んだmodelからオブジェクトを作成し、使ったアーマチュアを返す (arm_obがあればそれを使う)"""
+        prefs = common.preferences()
+        custom_bone_ob = self.custom_bone_ob
+
+        model_ver = model.version
+        model_name1 = model.name
+        model_name2 = model.base_bone
+        bone_data = model.bones
+        local_bone_data = model.local_bones
+        vertex_count = model.vertex_count
+        extra_uv_uses = model.extra_uv_uses
+        if model_ver >= 2102: # CR Edit Mode
+            print(f_("extra_uv_uses = {boollist}", boollist=extra_uv_uses))
+        vertex_data = model.vertices
+        weight_data = model.weights
+        face_data = [datum[:, ::-1] for datum in model.faces]
+        material_data = model.materials
+        for data in material_data:
+            data.name1 = data.name.lower()
+        misc_data = model.morphs
+
+        self.update_progress(context, 1)
 
         try:
             bpy.ops.object.mode_set(mode='OBJECT')
@@ -349,29 +544,57 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
         bpy.ops.object.select_all(action='DESELECT')
 
         # アーマチュア作成
+        is_new_armature = arm_ob is None
+        if self.is_armature and is_new_armature and self.is_use_existing_armature:
+            bones = [
+                (common.decode_bone_name(bone_data[index]['name'], self.is_convert_bone_weight_names),
+                 bone_data[index]['parent_name'] and common.decode_bone_name(bone_data[index]['parent_name'], self.is_convert_bone_weight_names),
+                 matrix)
+                for index, matrix in bone_rest_matrices(bone_data, self.scale).items()
+            ]
+            arm_ob = find_compatible_armature(context, model_name2, common.decode_bone_name(model_name2, self.is_convert_bone_weight_names), bones, tolerance=1e-4 * max(self.scale, 1.0))
+            is_new_armature = arm_ob is None
         if self.is_armature:
-            arm    = bpy.data.armatures.new(model_name1 + ".armature")
-            arm_ob = bpy.data.objects.new  (model_name1 + ".armature", arm)
-            compat.link(bpy.context.scene, arm_ob)
-            compat.set_select(arm_ob, True)
-            compat.set_active(context, arm_ob)
-
-            arm.show_names              = prefs.show_bone_names        
-            arm.show_axes               = prefs.show_bone_axes         
-            arm.show_bone_custom_shapes = prefs.show_bone_custom_shapes
-            arm.show_group_colors       = prefs.show_bone_group_colors
-            if compat.IS_LEGACY:
-                arm_ob.show_x_ray = prefs.show_bone_in_front
+            if arm_ob:
+                # 既存のアーマチュアを使い、足りないボーンだけ追加する
+                arm = arm_ob.data
+                compat.set_select(arm_ob, True)
+                compat.set_active(context, arm_ob)
             else:
-                arm_ob.show_in_front = prefs.show_bone_in_front     
+                arm    = bpy.data.armatures.new(model_name1 + ".armature")
+                arm_ob = bpy.data.objects.new  (model_name1 + ".armature", arm)
+                compat.link(bpy.context.scene, arm_ob)
+                compat.set_select(arm_ob, True)
+                compat.set_active(context, arm_ob)
+
+                arm.show_names              = prefs.show_bone_names        
+                arm.show_axes               = prefs.show_bone_axes         
+                arm.show_bone_custom_shapes = prefs.show_bone_custom_shapes
+                arm.show_group_colors       = prefs.show_bone_group_colors
+                if compat.IS_LEGACY:
+                    arm_ob.show_x_ray = prefs.show_bone_in_front
+                else:
+                    arm_ob.show_in_front = prefs.show_bone_in_front     
 
             bpy.ops.object.mode_set(mode='EDIT')
 
-            # 基幹ボーンのみ作成
-            child_data = []
-            for data in bone_data:
-                if not data['parent_name']:
-                    bone = arm.edit_bones.new(common.decode_bone_name(data['name'], self.is_convert_bone_weight_names))
+            # 親から順にボーンを作成
+            edit_bones = {}
+            bone_children = {}
+            new_bones = []
+            existing_bones = {} if is_new_armature else {bone.name: bone for bone in arm.edit_bones}
+            for index in sort_bones_parent_first(bone_data):
+                data = bone_data[index]
+                name = common.decode_bone_name(data['name'], self.is_convert_bone_weight_names)
+                if name in existing_bones:
+                    edit_bones[index] = existing_bones[name]
+                    bone_children.setdefault(name, [])
+                    continue
+                bone = arm.edit_bones.new(name)
+                edit_bones[index] = bone
+                new_bones.append(bone)
+                bone_children[bone.name] = []
+                if data['parent_index'] == -1:
                     bone.head, bone.tail = (0, 0, 0), (0, 1, 0)
 
                     #co.x, co.y, co.z = -co.x, co.z, -co.y
@@ -386,15 +609,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                     #rot = compat.convert_cm_to_bl_bone_rotation(rot)
                     #mat = compat.mul(mathutils.Matrix.Translation(co), rot.to_matrix().to_4x4())
                     
-                    co_mat  = mathutils.Matrix.Translation(data['co'].copy() * self.scale)
-                    rot     = mathutils.Quaternion(data['rot'].copy())
-                    #rot     = compat.convert_cm_to_bl_bone_rotation(rot)
-                    rot_mat = rot.to_matrix().to_4x4()
-                    #rot_mat = compat.convert_cm_to_bl_bone_rotation(rot_mat)
-                    mat = compat.mul(co_mat, rot_mat)
-                    mat = compat.convert_cm_to_bl_bone_rotation(mat)
-                    mat = compat.convert_cm_to_bl_space(mat)
-                    #mat = compat.mul(mat, compat.CM_TO_BL_LOCAL_BONE_MAT4)
+                    mat = bone_rest_matrix(data, None, self.scale)
                     
                     
                     #fix_mat_scale = mathutils.Matrix.Scale(-1, 4, (1, 0, 0))
@@ -407,16 +622,9 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
 
                     bone["UnknownFlag"] = 1 if data['unknown'] else 0
                 else:
-                    child_data.append(data)
-            context.window_manager.progress_update(1.333)
-
-            # 子ボーンを追加していく
-            while len(child_data):
-                data = child_data.pop(0)
-                parent = arm.edit_bones.get(common.decode_bone_name(data['parent_name'], self.is_convert_bone_weight_names))
-                if parent:
-                    bone = arm.edit_bones.new(common.decode_bone_name(data['name'], self.is_convert_bone_weight_names))
+                    parent = edit_bones[data['parent_index']]
                     bone.parent = parent
+                    bone_children[parent.name].append(bone)
                     bone.head, bone.tail = (0, 0, 0), (0, 1, 0)
 
                     #parent_mats = []
@@ -447,18 +655,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                     #    parent.matrix.to_quaternion().to_matrix().to_4x4()
                     #)
 
-                    parent_mat = parent.matrix
-                    
-                    local_co      = data['co' ].copy() * self.scale
-                    local_rot     = data['rot'].copy()
-                    #local_rot     = compat.convert_cm_to_bl_bone_rotation(rot)
-                    local_co_mat  = mathutils.Matrix.Translation(local_co)
-                    local_rot_mat = local_rot.to_matrix().to_4x4()
-                    local_mat     = compat.mul(local_co_mat, local_rot_mat)
-                    local_mat     = compat.convert_cm_to_bl_bone_space(local_mat)
-                    #local_mat     = compat.mul(local_mat, mathutils.Matrix.Diagonal((1,1,1)).to_4x4())
-                    mat = compat.mul(parent_mat, local_mat)
-                    mat = compat.convert_cm_to_bl_bone_rotation(mat)
+                    mat = bone_rest_matrix(data, parent.matrix, self.scale)
 
                     
                     #co_mat        = compat.mul( parent.matrix.inverted(), compat.convert_cm_to_bl_local_bone_mat4(local_co_mat) )
@@ -492,44 +689,39 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                     compat.set_bone_matrix(bone, mat)
                     
                     bone["UnknownFlag"] = 1 if data['unknown'] else 0
-                else:
-                    child_data.append(data)
-            context.window_manager.progress_update(1.666)
+            self.update_progress(context, 1.666)
 
             # ボーン整頓
-            for bone in arm.edit_bones:
-                if len(bone.children) == 0:
+            for bone in new_bones:
+                children = bone_children[bone.name]
+                if len(children) == 0:
                     if bone.parent:
                         pass
                     else:
                         bone.length = 0.2 * self.scale
-                elif len(bone.children) == 1:
-                    co = bone.children[0].head - bone.head
+                elif len(children) == 1:
+                    co = children[0].head - bone.head
                     bone.length = co.length
-                elif len(bone.children) >= 2:
+                elif len(children) >= 2:
                     if bone.parent:
                         max_len = 0.0
-                        for child_bone in bone.children:
+                        for child_bone in children:
                             co = child_bone.head - bone.head
                             if max_len < co.length:
                                 max_len = co.length
                         bone.length = max_len
                     else:
                         bone.length = 0.2 * self.scale
-            for bone in arm.edit_bones:
-                if len(bone.children) == 0:
+            for bone in new_bones:
+                if len(bone_children[bone.name]) == 0:
                     if bone.parent:
                         bone.length = bone.parent.length * 0.5
 
             # 一部ボーン削除
             if self.is_armature_clean:
-                for bone in arm.edit_bones:
-                    for b in local_bone_data:
-                        name = common.decode_bone_name(b['name'], self.is_convert_bone_weight_names)
-                        if bone.name == name:
-                            break
-                    else:
-                        arm.edit_bones.remove(bone)
+                local_bone_names = {common.decode_bone_name(b['name'], self.is_convert_bone_weight_names) for b in local_bone_data}
+                for bone in [bone for bone in new_bones if bone.name not in local_bone_names]:
+                    arm.edit_bones.remove(bone)
 
             arm.layers[16] = True
             compat.set_display_type(arm, prefs.bone_display_type)
@@ -539,83 +731,67 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                 print("Set custom bones")
                 for pose_bone in arm_ob.pose.bones:
                     pose_bone.custom_shape = custom_bone_ob
-        context.window_manager.progress_update(2)
+        self.update_progress(context, 2)
 
         if self.is_mesh:
             # メッシュ作成
             me = context.blend_data.meshes.new(model_name1)
-            verts, faces = [], []
-            for data in vertex_data:
-                #co = list(data['co'][:])
-                #co[0] = -co[0]
-                #co[0] *= self.scale
-                #co[1] *= self.scale
-                #co[2] *= self.scale
-                co = compat.convert_cm_to_bl_space( mathutils.Vector(data['co']) * self.scale )
-                #co = mathutils.Vector(data['co']) * self.scale
-                verts.append(co)
-            context.window_manager.progress_update(2.25)
-            for data in face_data:
-                faces.extend(data)
-            context.window_manager.progress_update(2.5)
-            me.from_pydata(verts, [], faces)
+            source_faces = np.concatenate(face_data).astype(np.int32) if face_data else np.empty((0, 3), dtype=np.int32)
+            face_material_indices = np.repeat(np.arange(len(face_data), dtype=np.int32), [len(data) for data in face_data])
+            # 重複頂点の結合はメッシュ作成前に配列上で行う
+            if self.is_remove_doubles:
+                weld_map, weld_source = weld_vertices(vertex_data['co'], vertex_data['normal'])
+            else:
+                weld_map = weld_source = np.arange(vertex_count, dtype=np.int32)
+            faces = weld_map[source_faces]
+            is_valid_face = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+            if not is_valid_face.all():
+                source_faces, faces, face_material_indices = source_faces[is_valid_face], faces[is_valid_face], face_material_indices[is_valid_face]
+            # ループごとの元の頂点番号 (UV, モーフの法線などはこれで引く)
+            loop_sources = source_faces.ravel()
+            self.update_progress(context, 2.25)
+            verts = compat.convert_cm_to_bl_space_array(vertex_data['co'][weld_source] * self.scale)
+            self.update_progress(context, 2.5)
+            common.mesh_from_arrays(me, verts, faces, face_material_indices)
             # オブジェクト化
             ob = context.blend_data.objects.new(model_name1, me)
             ob.rotation_mode = 'QUATERNION'
             compat.link(context.scene, ob)
             compat.set_select(ob, True)
             compat.set_active(context, ob)
-            bpy.ops.object.shade_smooth()
-            context.window_manager.progress_update(2.75)
+            self.update_progress(context, 2.75)
             # オブジェクト変形
             CNV_OT_align_to_cm3d2_base_bone.from_bone_data(ob=ob, bone_data=bone_data, base_bone_name=model_name2, scale=self.scale)
-            context.window_manager.progress_update(3)
+            self.update_progress(context, 3)
 
             # 頂点グループ作成
-            for data in local_bone_data:
-                ob.vertex_groups.new(name=common.decode_bone_name(data['name'], self.is_convert_bone_weight_names))
-            context.window_manager.progress_update(3.333)
-            for vert_index, data in enumerate(vertex_data):
-                for weight in data['weights']:
-                    if 0.0 < weight['value']:
-                        vertex_group = ob.vertex_groups[common.decode_bone_name(weight['name'], self.is_convert_bone_weight_names)]
-                        vertex_group.add([vert_index], weight['value'], 'REPLACE')
-            context.window_manager.progress_update(3.666)
-            if self.is_vertex_group_sort:
-                bpy.ops.object.vertex_group_sort(sort_type='NAME')
+            local_bone_names = [common.decode_bone_name(data['name'], self.is_convert_bone_weight_names) for data in local_bone_data]
+            for name in local_bone_names:
+                ob.vertex_groups.new(name=name)
+            # 名前が重複した場合は従来通り最初のグループに割り当てる
+            local_vertex_groups = [ob.vertex_groups[name] for name in local_bone_names]
+            self.update_progress(context, 3.333)
+            used_group_names = assign_vertex_group_weights(local_vertex_groups, weight_data['index'][weld_source], weight_data['value'][weld_source])
+            self.update_progress(context, 3.666)
             if self.is_remove_empty_vertex_group:
                 for vg in ob.vertex_groups[:]:
-                    for vert in me.vertices:
-                        for group in vert.groups:
-                            if group.group == vg.index:
-                                if 0.0 < group.weight:
-                                    break
-                        else:
-                            continue
-                        break
-                    else:
+                    if vg.name not in used_group_names:
                         ob.vertex_groups.remove(vg)
+            if self.is_vertex_group_sort:
+                bpy.ops.object.vertex_group_sort(sort_type='NAME')
             ob.vertex_groups.active_index = 0
-            context.window_manager.progress_update(4)
+            self.update_progress(context, 4)
 
             # UV作成
-            bm = bmesh.new()
-            bm.from_mesh(me)
-            bm.loops.layers.uv.new(f_data_("MainUV"))
-            vert_loops = {}
+            uv_layer = compat.new_uv_layer(me, f_data_("MainUV"))
+            common.set_loop_attribute(uv_layer.data, 'uv', vertex_data['uv'], loop_sources)
+            extra_uv_index = 0
             for i, used in enumerate(extra_uv_uses):    
                 if used:
-                    bm.loops.layers.uv.new(f_data_("ExtraUV{num}", num=i))
-            for face in bm.faces:
-                for loop in face.loops:
-                    vert_loops.setdefault(loop.vert.index, []).append(loop.index)
-                    loop[bm.loops.layers.uv[0]].uv = vertex_data[loop.vert.index]['uv']
-                    for extra_uv_index, extra_uv in enumerate(vertex_data[loop.vert.index]['extra_uvs']):
-                        loop[bm.loops.layers.uv[extra_uv_index+1]].uv = extra_uv
-
-            bm.to_mesh(me)
-            bm.free()
-            context.window_manager.progress_update(5)
+                    uv_layer = compat.new_uv_layer(me, f_data_("ExtraUV{num}", num=i))
+                    common.set_loop_attribute(uv_layer.data, 'uv', vertex_data['extra_uvs'][:, extra_uv_index], loop_sources)
+                    extra_uv_index += 1
+            self.update_progress(context, 5)
             # モーフ追加
             morph_count = 0
             for data in misc_data:
@@ -623,32 +799,31 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                     if morph_count == 0:
                         bpy.ops.object.shape_key_add(from_mix=False)
                         me.shape_keys.name = model_name1
+                        basis_co = np.empty((len(me.vertices), 3), dtype=np.float32)
+                        me.shape_keys.key_blocks[0].data.foreach_get('co', basis_co.ravel())
                     shape_key = ob.shape_key_add(name=data['name'], from_mix=False)
+                    morph_indices = data['data']['index']
+                    # convert from range(-1, 1) to range(0, 1)
                     normals_color = me.vertex_colors.new(name=f"{data['name']}_normals", do_init=False) or me.vertex_colors[-1]
-                    if len(data['data']) and data['data'][0]['color']:
+                    morph_normals = np.ones((len(morph_indices), 4), dtype=np.float32)
+                    morph_normals[:, :3] = data['data']['normal'] * 0.5 + 0.5
+                    common.set_loop_attribute(normals_color.data, 'color', morph_normals, loop_sources, morph_indices)
+                    if len(morph_indices) and 'color' in data['data'].dtype.names:
                         unknown_color = me.vertex_colors.new(name=f"{data['name']}_unknown", do_init=False) or me.vertex_colors[-1]
-                    for vert in data['data']:
-                        vert_index = vert['index']
-                        co = compat.convert_cm_to_bl_space( mathutils.Vector(vert['co']) * self.scale )
-                        shape_key.data[vert_index].co = shape_key.data[vert_index].co + co
-                        for loop_index in vert_loops[vert_index]:
-                            normals_color.data[loop_index].color = ( # convert from range(-1, 1) to range(0, 1)
-                                vert['normal'][0] * 0.5 + 0.5,
-                                vert['normal'][1] * 0.5 + 0.5,
-                                vert['normal'][2] * 0.5 + 0.5,
-                                1,
-                            )
-                            if vert['color']:
-                                unknown_color.data[loop_index].color = ( # convert from range(-1, 1) to range(0, 1)
-                                    vert['color'][0] * 0.5 * vert['color'][3] + 0.5,
-                                    vert['color'][1] * 0.5 * vert['color'][3] + 0.5,
-                                    vert['color'][2] * 0.5 * vert['color'][3] + 0.5,
-                                    1,
-                                )
+                        colors = data['data']['color']
+                        morph_colors = np.ones((len(morph_indices), 4), dtype=np.float32)
+                        morph_colors[:, :3] = colors[:, :3] * 0.5 * colors[:, 3:4] + 0.5
+                        common.set_loop_attribute(unknown_color.data, 'color', morph_colors, loop_sources, morph_indices)
+                    # 結合された重複頂点は同じ移動量を持つので一度だけ加える
+                    welded_indices, first_indices = np.unique(weld_map[morph_indices], return_index=True)
+                    deltas = compat.convert_cm_to_bl_space_array(data['data']['co'][first_indices] * self.scale)
+                    shape_co = basis_co.copy()
+                    np.add.at(shape_co, welded_indices, deltas)
+                    shape_key.data.foreach_set('co', shape_co.ravel())
 
                     # XXX Morph custom-normal data is lost
                     morph_count += 1
-            context.window_manager.progress_update(6)
+            self.update_progress(context, 6)
 
             # マテリアル追加
             progress_count_total = 0.0
@@ -657,13 +832,15 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
             self.progress_plus_value = 1.0 / (progress_count_total if progress_count_total > 0.0 else 1.0)
             self.progress_count = 6.0
 
-            face_seek = 0
+            # このmodelのテクスチャをまとめて検索
+            self.tex_session.resolve_all([tex_item[1] for data in material_data for tex_item in data.tex_list if len(tex_item) > 1])
+
             mates_set = set()
             override = context.copy()
             override['object'] = ob
             prefs = common.preferences()
             for index, data in enumerate(material_data):
-                print(f_("material count: {num} of {count}", num=index, count=material_count))
+                print(f_("material count: {num} of {count}", num=index, count=len(material_data)))
                 if prefs.mate_unread_same_value and data.name in mates_set:
                     continue
                 mates_set.add(data.name)
@@ -674,65 +851,33 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                 #mate['shader2'] = data['name3']
 
                 ob.material_slots[-1].material = mate
-                # 面にマテリアル割り当て
-                for i in range(face_seek, face_seek + len(face_data[index])):
-                    me.polygons[i].material_index = index
-                face_seek += len(face_data[index])
+                # 面へのマテリアル割り当てはメッシュ作成時に済んでいる
 
                 # テクスチャ追加
                 if compat.IS_LEGACY:
                     #self.create_mateprop_old(context, me, texes_set, mate, index, data)
-                    cm3d2_data.MaterialHandler.apply_to_old(override, mate, data)
+                    cm3d2_data.MaterialHandler.apply_to_old(override, mate, data, tex_session=self.tex_session)
                     common.decorate_material(mate, self.is_decorate, me, index)
                 else:
                     #self.create_mateprop(context, me, texes_set, mate, index, data)
-                    cm3d2_data.MaterialHandler.apply_to(override, mate, data)
+                    cm3d2_data.MaterialHandler.apply_to(override, mate, data, tex_session=self.tex_session)
                     common.decorate_material(mate, self.is_decorate, me, index)
                 common.setup_material(mate)
 
             ob.active_material_index = 0
-            context.window_manager.progress_update(7)
+            self.update_progress(context, 7)
 
             # メッシュ整頓
-            pre_mesh_select_mode = context.tool_settings.mesh_select_mode[:]
-            if self.is_sharp:
-                context.tool_settings.mesh_select_mode = (False, True, False)
-                bpy.ops.object.mode_set(mode='EDIT')
-
-                bpy.ops.mesh.select_non_manifold(extend=False, use_wire=True, use_boundary=True, use_multi_face=False, use_non_contiguous=False, use_verts=False)
-                bpy.ops.mesh.mark_sharp(use_verts=False)
-
-                bpy.ops.object.mode_set(mode='OBJECT')
-                context.tool_settings.mesh_select_mode = pre_mesh_select_mode
-            if self.is_remove_doubles:
-                pre_mesh_select_mode = context.tool_settings.mesh_select_mode[:]
-                context.tool_settings.mesh_select_mode = (True, False, False)
-                bpy.ops.object.mode_set(mode='EDIT')
-                bpy.ops.mesh.select_all(action='DESELECT')
-                bpy.ops.object.mode_set(mode='OBJECT')
-
-                for is_comparison, vert in zip(comparison_data, me.vertices):
-                    if is_comparison:
-                        vert.select = True
-                bpy.ops.object.mode_set(mode='EDIT')
-                bpy.ops.mesh.remove_doubles(threshold=0.000001)
-
+            if self.is_sharp or self.is_seam:
+                edge_keys, is_sharp_edge, is_seam_edge = calc_edge_flags(faces, len(verts), vertex_data['co'][loop_sources], vertex_data['uv'][loop_sources], vertex_data['normal'][loop_sources])
+                edge_flags = {}
                 if self.is_sharp:
-                    context.tool_settings.mesh_select_mode = (False, True, False)
-                    bpy.ops.mesh.select_non_manifold(extend=False, use_wire=True, use_boundary=True, use_multi_face=False, use_non_contiguous=False, use_verts=False)
-                    bpy.ops.mesh.mark_sharp(clear=True, use_verts=False)
-
-                bpy.ops.object.mode_set(mode='OBJECT')
-            context.tool_settings.mesh_select_mode = pre_mesh_select_mode
-            if self.is_seam:
-                bpy.ops.object.mode_set(mode='EDIT')
-                bpy.ops.mesh.select_all(action='SELECT')
-                bpy.ops.uv.select_all(action='SELECT')
-                bpy.ops.uv.seams_from_islands()
-                bpy.ops.object.mode_set(mode='OBJECT')
-            bpy.ops.object.mode_set(mode='EDIT')
-            bpy.ops.mesh.select_all(action='DESELECT')
-            bpy.ops.object.mode_set(mode='OBJECT')
+                    edge_flags['use_edge_sharp'] = is_sharp_edge
+                if self.is_seam:
+                    edge_flags['use_seam'] = is_seam_edge
+                set_edge_flags(me, edge_keys, len(verts), **edge_flags)
+            for elements in (me.vertices, me.edges, me.polygons):
+                elements.foreach_set('select', np.zeros(len(elements), dtype=bool))
 
             if self.is_armature:
                 mod = ob.modifiers.new("Armature", 'ARMATURE')
@@ -740,7 +885,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                 compat.set_active(context, arm_ob)
                 bpy.ops.object.parent_set(type='OBJECT', keep_transform=True)
                 compat.set_active(context, ob)
-        context.window_manager.progress_update(8)
+        self.update_progress(context, 8)
 
         # マテリアル情報のテキスト埋め込み
         if self.is_mate_data_text:
@@ -778,7 +923,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                 #         txt.write("\t" + tex_data['name'] + "\n")
                 #         txt.write("\t" + str(tex_data['float']) + "\n")
                 # txt.current_line_index = 0
-        context.window_manager.progress_update(9)
+        self.update_progress(context, 9)
 
         # ボーン情報のテキスト埋め込み
         if self.is_bone_data_text:
@@ -787,6 +932,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                 txt.clear()
             else:
                 txt = context.blend_data.texts.new("BoneData")
+        arm_bone_lines = []
         for i, data in enumerate(bone_data):
             s = ",".join([data['name'], str(data['unknown']), ""])
             parent_index = data['parent_index']
@@ -807,11 +953,11 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
             if self.is_mesh and self.is_bone_data_obj_property:
                 ob["BoneData:" + str(i)] = s
             if self.is_armature and self.is_bone_data_arm_property:
-                arm["BoneData:" + str(i)] = s
+                arm_bone_lines.append(s)
         if self.is_bone_data_text:
             txt['BaseBone'] = model_name2
             txt.current_line_index = 0
-        context.window_manager.progress_update(10)
+        self.update_progress(context, 10)
 
         # ローカルボーン情報のテキスト埋め込み
         if self.is_bone_data_text:
@@ -820,6 +966,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                 txt.clear()
             else:
                 txt = context.blend_data.texts.new("LocalBoneData")
+        arm_local_bone_lines = []
         for i, data in enumerate(local_bone_data):
             s = data['name'] + ","
 
@@ -836,7 +983,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
             if self.is_mesh and self.is_bone_data_obj_property:
                 ob["LocalBoneData:" + str(i)] = s
             if self.is_armature and self.is_bone_data_arm_property:
-                arm["LocalBoneData:" + str(i)] = s
+                arm_local_bone_lines.append(s)
         if self.is_bone_data_text:
             txt['BaseBone'] = model_name2
             txt.current_line_index = 0
@@ -846,23 +993,15 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
             if model_ver >= 1000:
                 ob['ModelVersion'] = model_ver
         if self.is_armature and self.is_bone_data_arm_property:
-            arm['BaseBone'] = model_name2
-            if model_ver >= 1000:
+            # 使い回したアーマチュアには無いボーンの情報だけを追加する
+            set_indexed_data(arm, "BoneData:", arm_bone_lines, merge=not is_new_armature)
+            set_indexed_data(arm, "LocalBoneData:", arm_local_bone_lines, merge=not is_new_armature)
+            # 使い回したアーマチュアに無ければ基点ボーンなども設定する
+            if is_new_armature or 'BaseBone' not in arm:
+                arm['BaseBone'] = model_name2
+            if model_ver >= 1000 and (is_new_armature or 'ModelVersion' not in arm):
                 arm['ModelVersion'] = model_ver
-        context.window_manager.progress_end()
-
-        require_time = time.time() - start_time
-        filesize = os.path.getsize(self.filepath)
-        filesize_str = "バイト"
-        if 1024 * 1024 < filesize:
-            filesize = filesize / (1024 * 1024.0)
-            filesize_str = "MB"
-        elif 1024 < filesize:
-            filesize = filesize / 1024.0
-            filesize_str = "KB"
-        self.report(type={'INFO'}, message=f_tip_("modelのインポートが完了しました ({} {}/ {:.2f} 秒)", filesize, filesize_str, require_time))
-
-        return {'FINISHED'}
+        return arm_ob
 
     def create_mateprop_old(self, context, me, tex_set, mate, mate_idx, data: list):
         # create_matepropとの違いは、slot_indexの有無、nodeの接続・配置処理のみ
@@ -928,7 +1067,7 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
                             img = tex.image
                             # col = mate.node_tree.nodes.new(type='ShaderNodeAttribute')
                             # tex.image = bpy.data.images.load("C:\\path\\to\\im.jpg")
-                            replaced = common.replace_cm3d2_tex(img, self.texpath_dict, reload_path=False)
+                            replaced = self.tex_session.replace(img)
                             if compat.IS_LEGACY and replaced and prop_name == '_MainTex':
                                 for face in me.polygons:
                                     if face.material_index == mate_idx:
@@ -967,9 +1106,95 @@ class CNV_OT_import_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHe
 
     def progress(self, context):
         self.progress_count += self.progress_plus_value
-        context.window_manager.progress_update(self.progress_count)
+        self.update_progress(context, self.progress_count)
+
+
+@compat.BlRegister()
+class CNV_OT_inspect_cm3d2_model(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
+    bl_idname = 'import_mesh.inspect_cm3d2_model'
+    bl_label = "CM3D2モデル情報 (.model)"
+    bl_description = "Read only the names, bones, materials and morph names of a .model file (without its mesh data) into the \"ModelInfo\" text"
+    bl_options = {'REGISTER'}
+
+    filepath = bpy.props.StringProperty(subtype='FILE_PATH')
+    filename_ext = ".model"
+    filter_glob = bpy.props.StringProperty(default="*.model", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return True
+
+    def invoke(self, context, event):
+        prefs = common.preferences()
+        if prefs.model_default_path:
+            self.filepath = common.default_cm3d2_dir(prefs.model_default_path, None, "model")
+        else:
+            self.filepath = common.default_cm3d2_dir(prefs.model_import_path, None, "model")
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        try:
+            model = cm3d2_data.ModelReader(self.filepath)
+        except common.CM3D2ImportException as e:
+            self.report(type={'ERROR'}, message=str(e))
+            return {'CANCELLED'}
+        except:
+            self.report(type={'ERROR'}, message=f_tip_("ファイルを開くのに失敗しました、アクセス不可かファイルが存在しません。file={}", self.filepath))
+            return {'CANCELLED'}
+
+        with model:
+            try:
+                lines = self.info_lines(model)
+            except (UnicodeDecodeError, struct.error, common.CM3D2ImportException) as e:
+                self.report(type={'ERROR'}, message=f_tip_("Error reading file at byte 0x{num:02X}", num=model.tell()) + "\n" + str(e))
+                return {'CANCELLED'}
+
+        if "ModelInfo" in context.blend_data.texts:
+            txt = context.blend_data.texts["ModelInfo"]
+            txt.clear()
+        else:
+            txt = context.blend_data.texts.new("ModelInfo")
+        txt.write("\n".join(lines) + "\n")
+        txt['ModelPath'] = self.filepath
+        txt.current_line_index = 0
+        self.report(type={'INFO'}, message=f_tip_("Wrote the model info of {name} to the text \"{text}\"", name=model.name, text=txt.name))
+        return {'FINISHED'}
+
+    @staticmethod
+    def info_lines(model):
+        # 頂点・ウェイト・面のデータは読み飛ばされる
+        lines = [
+            f"name,{model.name}",
+            f"base_bone,{model.base_bone}",
+            f"version,{model.version}",
+            f"vertex_count,{model.vertex_count}",
+            f"mesh_count,{model.mesh_count}",
+        ]
+
+        lines.append(f"bones,{len(model.bones)}")
+        for data in model.bones:
+            lines.append(f"\t{data['name']},{data['parent_name'] or 'None'}")
+
+        lines.append(f"local_bones,{len(model.local_bones)}")
+        for data in model.local_bones:
+            lines.append(f"\t{data['name']}")
+
+        lines.append(f"materials,{len(model.materials)}")
+        for data in model.materials:
+            lines.append(f"\t{data.name},{data.shader1}")
+            for tex_item in data.tex_list:
+                if len(tex_item) > 2:
+                    lines.append(f"\t\ttex,{tex_item[0]},{tex_item[2]}")
+
+        morph_names = model.morph_names
+        lines.append(f"morphs,{len(morph_names)}")
+        for name in morph_names:
+            lines.append(f"\t{name}")
+        return lines
 
 
 # メニューを登録する関数
 def menu_func(self, context):
     self.layout.operator(CNV_OT_import_cm3d2_model.bl_idname, icon_value=common.kiss_icon())
+    self.layout.operator(CNV_OT_inspect_cm3d2_model.bl_idname, icon_value=common.kiss_icon())
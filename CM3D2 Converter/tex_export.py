@@ -1,8 +1,8 @@
 import bpy
 import os
-import struct
 from . import common
 from . import compat
+from .formats import tex
 from .translations.pgettext_functions import *
 
 
@@ -68,9 +68,9 @@ class CNV_OT_export_cm3d2_tex(bpy.types.Operator):
         common.preferences().tex_export_path = self.filepath
 
         try:
-            with common.open_temporary(self.filepath, 'wb', is_backup=self.is_backup) as file:
+            with common.open_temporary(self.filepath, 'wb', is_backup=self.is_backup) as file, common.CM3D2BinaryWriter(file) as writer:
                 version_num = int(self.version)
-                self.write_texture(context, file, version_num)
+                self.write_texture(context, writer, version_num)
             self.report(type={'INFO'}, message="texファイルを出力しました。" + self.filepath)
 
         except common.CM3D2ExportException as e:
@@ -82,7 +82,7 @@ class CNV_OT_export_cm3d2_tex(bpy.types.Operator):
 
         return {'FINISHED'}
 
-    def write_texture(self, context, file, version):
+    def write_texture(self, context, writer, version):
         # とりあえずpngで保存
         img = context.edit_image
         if img.source != 'VIEWER':
@@ -116,24 +116,12 @@ class CNV_OT_export_cm3d2_tex(bpy.types.Operator):
             os.remove(temp_path)
 
         # 本命ファイルに書き込み
-        common.write_str(file, 'CM3D2_TEX')
-        file.write(struct.pack('<i', version))
-        common.write_str(file, self.path)
-        if version >= 1010:
-            if version >= 1011:
-                uv_rects = bpy.types.Scene.MyUVRects if hasattr(bpy.types.Scene, 'MyUVRects') else None
-                num_rects = len(uv_rects) if uv_rects else 0
-                file.write(struct.pack('<i', num_rects))
-                if num_rects > 0:
-                    for uv_rect in uv_rects:
-                        file.write( struct.pack('<4f', uv_rect[0], uv_rect[1], uv_rect[2], uv_rect[3]) )
-
-            width, height = img.size
-            file.write(struct.pack('<i', width))
-            file.write(struct.pack('<i', height))
-            file.write(struct.pack('<i', 5))  # tex_format TODO ダイアログで指定
-        file.write(struct.pack('<i', len(temp_data)))
-        file.write(temp_data)
+        uv_rects = None
+        if version >= 1011:
+            uv_rects = bpy.types.Scene.MyUVRects if hasattr(bpy.types.Scene, 'MyUVRects') else None
+        width, height = img.size
+        texture = tex.Texture(version, self.path, temp_data, tex_format=5, uv_rects=uv_rects, width=width, height=height)  # tex_format TODO ダイアログで指定
+        tex.write_tex(writer, texture)
 
 
 # メニューを登録する関数
@@ -18,7 +18,7 @@ class CNV_OT_import_cm3d2_tex(bpy.types.Operator):
 
     items = [
         ('PACK', "内部にパックする", "", 'PACKAGE', 1),
-        ('PNG', "PNGに変換してPNGを開く", "", 'IMAGE_DATA', 2),
+        ('PNG', "PNGに変換してPNGを開く", "PNGはtexファイルの横ではなく展開キャッシュに保存します", 'IMAGE_DATA', 2),
     ]
     mode = bpy.props.EnumProperty(items=items, name="展開方法", default='PNG')
 
@@ -53,20 +53,20 @@ class CNV_OT_import_cm3d2_tex(bpy.types.Operator):
                 return {'CANCELLED'}
 
             root, ext = os.path.splitext(self.filepath)
-            png_path = root + ".png"
-            is_png_overwrite = os.path.exists(png_path)
-            if self.mode == 'PACK' and is_png_overwrite:
-                png_path += ".temp.png"
-            with open(png_path, 'wb') as png_file:
-                png_file.write(tex_data[-1])
-            bpy.ops.image.open(filepath=png_path)
-            img = context.edit_image
+            if self.mode == 'PACK':
+                # ファイルに書き出さずにパック
+                img = context.blend_data.images.new(os.path.basename(self.filepath), 8, 8)
+                common.pack_tex_image(img, root + ".png", tex_data[-1])
+                space = context.space_data
+                if space and space.type == 'IMAGE_EDITOR':
+                    space.image = img
+            else:
+                # texファイルの横ではなく展開キャッシュに書き出す
+                png_path = common.get_tex_extract_cache().extract(self.filepath, lambda: tex_data[-1])
+                bpy.ops.image.open(filepath=png_path)
+                img = context.edit_image
             img.name = os.path.basename(self.filepath)
             img['cm3d2_path'] = common.get_tex_cm3d2path(root + ".png")
-
-            if self.mode == 'PACK':
-                img.pack(as_png=True)
-                os.remove(png_path)
             return {'FINISHED'}
 
         except:
@@ -0,0 +1,218 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+from . import fileutil
+
+
+class TexPathIndex:
+    """テクスチャ置き場の .tex/.png ファイルの索引
+
+    The index is a tree of directories, each with its mtime, its texture file
+    names and its sub directories, saved as JSON so the next session can use it
+    without touching the disk. refresh() stats every known directory and only
+    lists the ones whose mtime changed (adding or removing a file changes the
+    mtime of its parent directory).
+    """
+    VERSION = 1
+    EXTENSIONS = ('.tex', '.png')
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.trees = {}  # root: {'mtime', 'files', 'dirs'}
+        self.scanned_dir_count = 0
+
+    def load(self):
+        """キャッシュファイルを読み込む (無いか壊れていれば空のまま)"""
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return False
+        self.trees = data.get('roots', {})
+        return True
+
+    def save(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        data = json.dumps({'version': self.VERSION, 'roots': self.trees}, ensure_ascii=False, separators=(',', ':'))
+        with fileutil.TemporaryFileWriter(self.cache_path, 'wb') as file:
+            file.write(data.encode('utf-8'))
+
+    def has_roots(self, roots):
+        return all(root in self.trees for root in roots)
+
+    def refresh(self, roots, max_workers=None):
+        """変更されたフォルダだけを再走査する (ルートごとに並列)"""
+        roots = list(dict.fromkeys(roots))
+        self.scanned_dir_count = 0
+        if not roots:
+            self.trees = {}
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or len(roots)) as executor:
+            results = list(executor.map(self._scan_root, roots))
+        self.trees = {root: tree for root, (tree, scanned) in zip(roots, results) if tree is not None}
+        self.scanned_dir_count = sum(scanned for tree, scanned in results)
+
+    def _scan_root(self, root):
+        counter = [0]
+        return self._scan_dir(root, self.trees.get(root), counter), counter[0]
+
+    def _scan_dir(self, path, node, counter):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        if node and node.get('mtime') == mtime:
+            files = node['files']
+            dir_names = list(node['dirs'])
+        else:
+            files = []
+            dir_names = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if is_dir:
+                            # os.walk と同じくシンボリックリンクのフォルダは辿らない
+                            if not entry.is_symlink():
+                                dir_names.append(entry.name)
+                        elif os.path.splitext(entry.name)[1].lower() in self.EXTENSIONS:
+                            files.append(entry.name)
+            except OSError:
+                return None
+            counter[0] += 1
+
+        old_dirs = node['dirs'] if node else {}
+        dirs = {}
+        for name in dir_names:
+            child = self._scan_dir(os.path.join(path, name), old_dirs.get(name), counter)
+            if child is not None:
+                dirs[name] = child
+        return {'mtime': mtime, 'files': files, 'dirs': dirs}
+
+    def to_dict(self, roots):
+        """小文字のファイル名 -> パスの辞書 (os.walk の順で先に見つけたファイルを優先)"""
+        texpath_dict = {}
+
+        def add_dir(path, node):
+            for name in node['files']:
+                texpath_dict.setdefault(name.lower(), os.path.join(path, name))
+            for name, child in node['dirs'].items():
+                add_dir(os.path.join(path, name), child)
+
+        for root in roots:
+            tree = self.trees.get(root)
+            if tree is not None:
+                add_dir(root, tree)
+        return texpath_dict
+
+
+class TexExtractCache:
+    """texファイルから取り出したPNGのキャッシュ
+
+    Each entry is <cache_dir>/<key>/<name>.png, where key is a hash of the
+    source path, size and mtime, so a changed .tex gets a new entry and the
+    file keeps the name of the texture. A hit touches the file, and the least
+    recently used entries are removed once the total size exceeds max_size,
+    except the ones still in use (images in an open .blend file load their
+    pixels lazily from these paths).
+    """
+
+    def __init__(self, cache_dir, max_size=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._entries = None  # key: [size, mtime]
+
+    @staticmethod
+    def make_key(filepath):
+        stat = os.stat(filepath)
+        source = "{}\0{}\0{}".format(os.path.normcase(os.path.abspath(filepath)), stat.st_size, stat.st_mtime_ns)
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()[:24]
+
+    def get_path(self, filepath, key=None):
+        name = os.path.splitext(os.path.basename(filepath))[0] + ".png"
+        return os.path.join(self.cache_dir, key or self.make_key(filepath), name)
+
+    def extract(self, filepath, load_data, get_in_use=None):
+        """キャッシュ済みのPNGのパスを返す (無ければ load_data() の結果を書き込む、None なら None を返す)
+        get_in_use は削除してはいけないファイルのパスを返す関数 (容量を超えた時だけ呼ぶ)
+        """
+        key = self.make_key(filepath)
+        png_path = self.get_path(filepath, key)
+        if os.path.isfile(png_path):
+            try:
+                os.utime(png_path)
+            except OSError:
+                pass
+            else:
+                entry = self._load_entries().get(key)
+                if entry:
+                    entry[1] = os.stat(png_path).st_mtime_ns
+            return png_path
+
+        data = load_data()
+        if data is None:
+            return None
+        os.makedirs(os.path.dirname(png_path), exist_ok=True)
+        with fileutil.TemporaryFileWriter(png_path, 'wb') as file:
+            file.write(data)
+        self._load_entries()[key] = [len(data), os.stat(png_path).st_mtime_ns]
+        self.evict(keep=key, get_in_use=get_in_use)
+        return png_path
+
+    def _load_entries(self):
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with os.scandir(self.cache_dir) as it:
+                    for entry in it:
+                        if not entry.is_dir():
+                            continue
+                        size, mtime = 0, 0
+                        for file_entry in os.scandir(entry.path):
+                            stat = file_entry.stat()
+                            size += stat.st_size
+                            mtime = max(mtime, stat.st_mtime_ns)
+                        self._entries[entry.name] = [size, mtime]
+            except OSError:
+                pass
+        return self._entries
+
+    def total_size(self):
+        return sum(size for size, mtime in self._load_entries().values())
+
+    def get_key(self, path):
+        """キャッシュ内のファイルのパスならそのエントリのキーを返す (違えば None)"""
+        key_dir = os.path.dirname(os.path.abspath(path))
+        if os.path.normcase(os.path.dirname(key_dir)) != os.path.normcase(os.path.abspath(self.cache_dir)):
+            return None
+        return os.path.basename(key_dir)
+
+    def evict(self, keep=None, get_in_use=None):
+        """合計サイズが max_size 以下になるまで古いものから削除する (使用中のものは残す)"""
+        entries = self._load_entries()
+        total = self.total_size()
+        if total <= self.max_size:
+            return
+        protected = {keep}
+        if get_in_use is not None:
+            protected.update(self.get_key(path) for path in get_in_use())
+        for key, (size, mtime) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_size:
+                break
+            if key in protected:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            del entries[key]
+            total -= size